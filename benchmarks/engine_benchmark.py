@@ -0,0 +1,122 @@
+"""
+Compares the threaded and the asyncio server engines of P2PNetwork.
+
+Starts a node for each engine, opens many concurrent client connections and
+sends a fixed number of commands over every connection, one at a time.
+Reports throughput, latency percentiles and the number of server threads.
+
+Usage:
+    python -m benchmarks.engine_benchmark --clients 500 --requests 20 --command BN
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+from network.p2p import P2PNetwork
+
+
+def wait_for_port(host: str, port: int, timeout: float = 10.0):
+    """Blocks until a TCP server accepts connections on host:port."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server on {host}:{port} did not start")
+
+
+async def run_client(host: str, port: int, command: str, requests: int, latencies: list):
+    """Sends `requests` commands over one connection and records each round trip."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            writer.write(f"{command}\n".encode("utf-8"))
+            await writer.drain()
+            response = await reader.readline()
+            if not response:
+                raise ConnectionError("Server closed the connection")
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, clients: int, requests: int, command: str) -> dict:
+    """Runs all clients concurrently and returns the collected measurements."""
+    latencies = []
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def sample_threads():
+        while not done.wait(0.01):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_client(host, port, command, requests, latencies) for _ in range(clients)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+
+    done.set()
+    sampler.join()
+    return {
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "errors": sum(1 for r in results if isinstance(r, Exception)),
+        "threads": peak_threads[0]
+    }
+
+
+def benchmark_engine(engine: str, host: str, port: int, clients: int, requests: int, command: str) -> dict:
+    """Starts a node with the given engine, runs the load against it and stops it."""
+    node = P2PNetwork(host, port, timeout=30, engine=engine)
+    server_thread = threading.Thread(target=node.start_server, daemon=True)
+    server_thread.start()
+    wait_for_port(host, port)
+
+    try:
+        return asyncio.run(run_load(host, port, clients, requests, command))
+    finally:
+        node.stop_server()
+        server_thread.join(timeout=5)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Returns the value at the given fraction of the sorted list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark P2PNetwork server engines")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65533)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--command", default="BC")
+    parser.add_argument("--engines", nargs="+", default=list(P2PNetwork.ENGINES))
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients x {args.requests} requests of '{args.command}'")
+    print(f"{'engine':<10}{'req/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'peak threads':>14}")
+
+    for engine in args.engines:
+        result = benchmark_engine(engine, args.host, args.port, args.clients, args.requests, args.command)
+        latencies = result["latencies"]
+        throughput = len(latencies) / result["elapsed"] if result["elapsed"] else 0
+        p50 = statistics.median(latencies) * 1000 if latencies else 0
+        p99 = percentile(latencies, 0.99) * 1000 if latencies else 0
+        print(f"{engine:<10}{throughput:>12.0f}{p50:>10.2f}{p99:>10.2f}{result['errors']:>8}{result['threads']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compares ways of turning account rows into protocol JSON.
+
+A temporary database is filled with accounts and read back three ways:
+- dict: sqlite3.Row rows copied with dict(row), serialized with json.dumps
+  (the data layer before BankAccount was used)
+- dataclass: the previous @dataclass BankAccount built from dict(row), with
+  its __post_init__ timestamps, serialized with json.dumps(asdict(...))
+- slots: BankAccount built by the cursor's row factory, serialized with to_json
+
+Reports the time to read and serialize all accounts and the peak memory of
+holding all records at once (as get_all_accounts does).
+
+Usage:
+    python -m benchmarks.model_benchmark --accounts 100000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from datetime import datetime
+
+from db.models import BankAccount
+
+
+@dataclass
+class LegacyBankAccount:
+    """The account model as it was before: a regular dataclass stamping both timestamps."""
+    account_number: int
+    bank_code: str
+    balance: float = 0.0
+    is_active: bool = True
+    created_at: str = None
+    updated_at: str = None
+
+    def __post_init__(self):
+        if not self.created_at:
+            self.created_at = datetime.now().isoformat()
+        self.updated_at = datetime.now().isoformat()
+
+
+QUERY = f"SELECT {BankAccount.SELECT} FROM accounts ORDER BY account_number"
+
+
+def read_dicts(conn: sqlite3.Connection) -> list:
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return [dict(row) for row in cursor.execute(QUERY)]
+
+
+def read_dataclasses(conn: sqlite3.Connection) -> list:
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return [LegacyBankAccount(**dict(row)) for row in cursor.execute(QUERY)]
+
+
+def read_slots(conn: sqlite3.Connection) -> list:
+    cursor = conn.cursor()
+    cursor.row_factory = BankAccount.from_row
+    return cursor.execute(QUERY).fetchall()
+
+
+PATHS = {
+    "dict": (read_dicts, lambda record: json.dumps(record, ensure_ascii=False)),
+    "dataclass": (read_dataclasses, lambda record: json.dumps(asdict(record), ensure_ascii=False)),
+    "slots": (read_slots, BankAccount.to_json)
+}
+
+
+def measure(conn: sqlite3.Connection, name: str) -> dict:
+    read, serialize = PATHS[name]
+
+    started = time.perf_counter()
+    size = sum(len(serialize(record)) for record in read(conn))
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    records = read(conn)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return {"elapsed": elapsed, "peak": peak, "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark account row mapping and serialization")
+    parser.add_argument("--accounts", type=int, default=100000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    conn = sqlite3.connect(os.path.join(directory, "bench.db"))
+    conn.execute("""
+        CREATE TABLE accounts (
+            account_number INTEGER PRIMARY KEY,
+            bank_code TEXT NOT NULL,
+            balance REAL DEFAULT 0.0,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.executemany("INSERT INTO accounts (account_number, bank_code, balance) VALUES (?, '10.0.0.5', ?)",
+                     [(10000 + i, i * 1.25) for i in range(args.accounts)])
+    conn.commit()
+
+    print(f"{args.accounts} accounts")
+    print(f"{'path':<11}{'accounts/s':>12}{'peak MiB':>10}")
+    for name in PATHS:
+        result = measure(conn, name)
+        print(f"{name:<11}{args.accounts / result['elapsed']:>12.0f}{result['peak'] / (1 << 20):>10.1f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compares the read-modify-write posting path with the atomic conditional update.
+
+Several threads withdraw from and deposit to the same accounts of a temporary
+database. The legacy path (SELECT balance, compute in Python, UPDATE, one new
+connection per posting) is reproduced here for comparison with
+DataBase.apply_posting. Reports postings per second and lost updates, i.e. the
+difference between the final balances and the balances implied by the
+postings that reported success.
+
+Usage:
+    python -m benchmarks.posting_benchmark --threads 8 --postings 500 --accounts 4
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db.database import DataBase, PostingError
+
+
+def legacy_posting(db: DataBase, account_number: int, bank_code: str, amount: float):
+    """The posting path as it was before: read, compute in Python, write."""
+    conn = db.get_connection()
+    try:
+        account = conn.execute("""
+            SELECT balance, is_active FROM accounts WHERE account_number = ? AND bank_code = ?
+        """, (account_number, bank_code)).fetchone()
+        if account['balance'] + amount < 0:
+            raise PostingError(PostingError.INSUFFICIENT_FUNDS, "Insufficient funds")
+        conn.execute("""
+            UPDATE accounts SET balance = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE account_number = ? AND bank_code = ?
+        """, (account['balance'] + amount, account_number, bank_code))
+        conn.execute("""
+            INSERT INTO transactions (account_number, bank_code, amount, transaction_type, description)
+            VALUES (?, ?, ?, 'BENCHMARK', 'Legacy posting')
+        """, (account_number, bank_code, abs(amount)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def atomic_posting(db: DataBase, account_number: int, bank_code: str, amount: float):
+    db.apply_posting(account_number, bank_code, amount, 'BENCHMARK', 'Atomic posting')
+
+
+def run(posting, threads: int, postings: int, accounts: int) -> dict:
+    """Runs the workload against a fresh database and returns the measurements."""
+    directory = tempfile.mkdtemp()
+    db = DataBase(os.path.join(directory, "bench.db"))
+    bank_code = "127.0.0.1"
+    numbers = list(range(10001, 10001 + accounts))
+    with db.connection() as conn:
+        conn.executemany("INSERT INTO accounts (account_number, bank_code, balance) VALUES (?, ?, 1000)",
+                         [(n, bank_code) for n in numbers])
+        conn.commit()
+
+    applied = {n: 0.0 for n in numbers}
+    applied_lock = threading.Lock()
+    errors = [0]
+
+    def worker(index: int):
+        for i in range(postings):
+            account_number = numbers[(index + i) % accounts]
+            amount = -3.0 if i % 2 else 2.0
+            try:
+                posting(db, account_number, bank_code, amount)
+            except PostingError:
+                continue
+            except sqlite3.Error:
+                errors[0] += 1
+                continue
+            with applied_lock:
+                applied[account_number] += amount
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with db.connection() as conn:
+        balances = dict(conn.execute("SELECT account_number, balance FROM accounts").fetchall())
+        committed = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    db.close()
+
+    lost = sum(abs(balances[n] - (1000 + applied[n])) for n in numbers)
+    return {"elapsed": elapsed, "committed": committed, "lost": lost, "errors": errors[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the posting path")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--postings", type=int, default=300)
+    parser.add_argument("--accounts", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.postings} postings over {args.accounts} accounts")
+    print(f"{'path':<10}{'postings/s':>12}{'lost amount':>14}{'db errors':>11}")
+    for name, posting in (("legacy", legacy_posting), ("atomic", atomic_posting)):
+        result = run(posting, args.threads, args.postings, args.accounts)
+        throughput = result["committed"] / result["elapsed"]
+        print(f"{name:<10}{throughput:>12.0f}{result['lost']:>14.2f}{result['errors']:>11}")
+
+
+if __name__ == "__main__":
+    main()
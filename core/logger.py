@@ -1,8 +1,14 @@
-import logging 
+import logging
+import logging.handlers
+import atexit
 import configparser
+import gzip
 import os
+import queue
+import shutil
 import sys
-from datetime import datetime
+import threading
+from datetime import date
 
 config = configparser.ConfigParser()
 config.read("config.ini")
@@ -10,31 +16,131 @@ config.read("config.ini")
 # Centralized logging setup for the entire project
 # (reusable in other modules)-
 
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Log file handler rotating by size and at the start of every day.
+
+    The rotated files are gzip-compressed (<file>.1.gz is the newest) and only the
+    newest `backupCount` of them are kept.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self.compress
+        self.day = self.file_day()
+
+    def file_day(self) -> date:
+        """Returns the day the current log file was last written, or today for a new file."""
+        if os.path.exists(self.baseFilename):
+            return date.fromtimestamp(os.path.getmtime(self.baseFilename))
+        return date.today()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if date.today() != self.day and os.path.exists(self.baseFilename):
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.day = date.today()
+
+    @staticmethod
+    def compress(source: str, dest: str):
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the logging thread: records are dropped (and counted) while the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # only the message is merged here; the listener thread formats the line
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_pipeline = {}
+_setup_lock = threading.Lock()
+
+
 def setup_core_logging():
     """
     Initializes the global application logger based on config.ini.
+    Only the first call configures logging; later calls return the same logger.
 
     - Sets logging level (INFO / DEBUG / WARNING / etc.)
     - Creates the log directory if it doesn't exist
-    - Logs both to file and to console
+    - Logs both to file and to console, from one background thread: the calling thread
+      only puts the record on a queue, so logging never waits for the disk or the console
+    - Rotates the log file at [app] max_log_size_mb and daily, keeping [app] max_log_files
+      compressed old files
     """
+    with _setup_lock:
+        if not _pipeline:
+            _start_pipeline()
+    return logging.getLogger(__name__)
+
+
+def _start_pipeline():
     log_level = getattr(logging, config.get("app", "log_level", fallback="INFO"))
     log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     log_dir = config.get("app", "log_dir", fallback="logs")
     os.makedirs(log_dir, exist_ok=True)
-    logging.basicConfig(
-        level=log_level,
-        format=log_format,
-        handlers=[
-            logging.FileHandler(
-                f"{log_dir}/bank_core_{datetime.now().strftime('%Y%m%d')}.log"
-            ),
-            logging.StreamHandler(sys.stdout)
-        ]
+
+    formatter = logging.Formatter(log_format)
+    file_handler = CompressingRotatingFileHandler(
+        os.path.join(log_dir, "bank_core.log"),
+        max_bytes=int(config.getfloat("app", "max_log_size_mb", fallback=10) * 1024 * 1024),
+        backup_count=config.getint("app", "max_log_files", fallback=10)
     )
-    return logging.getLogger(__name__)
+    console_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
 
-logger = setup_core_logging()
+    log_queue = queue.Queue(maxsize=config.getint("app", "log_queue_size", fallback=10000))
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(log_level)
+    root.addHandler(queue_handler)
+
+    _pipeline.update(queue=log_queue, handler=queue_handler, listener=listener)
+    atexit.register(shutdown_logging)
 
 
+def shutdown_logging():
+    """Writes the queued records and stops the background writer."""
+    with _setup_lock:
+        if _pipeline:
+            logging.getLogger().removeHandler(_pipeline['handler'])
+            _pipeline['listener'].stop()
+            _pipeline.clear()
 
+
+def logging_stats():
+    """Returns the number of queued records and of records dropped because the queue was full."""
+    with _setup_lock:
+        if not _pipeline:
+            return {'queued': 0, 'dropped': 0}
+        return {'queued': _pipeline['queue'].qsize(), 'dropped': _pipeline['handler'].dropped}
+
+logger = setup_core_logging()
@@ -1,5 +1,21 @@
 import json
-from typing import Tuple, List, Any
+import re
+from typing import Tuple, List, Any, Callable, Iterable, Iterator, Optional
+
+
+class StreamedResult:
+    """
+    Result of a command that answers with many records.
+
+    The records are sent as JSON lines, one per record, followed by a closing line
+    "<command> <trailer>" so line-oriented clients know where the answer ends.
+    `items` is consumed lazily while formatting, and `trailer` is called afterwards,
+    so it can report values (e.g. a resume position) known only at the end.
+    """
+
+    def __init__(self, items: Iterable[Any], trailer: Callable[[], Any]):
+        self.items = items
+        self.trailer = trailer
 
 
 class BankProtocol:
@@ -19,9 +35,18 @@ class BankProtocol:
         "AB": "get_balance",
         "AR": "remove_account",
         "BA": "bank_amount",
-        "BN": "bank_number_of_clients"
+        "BN": "bank_number_of_clients",
+        "AH": "get_history",
+        "AL": "list_accounts",
+        "AT": "transfer",
+        "AP": "batch_post"
     }
 
+    # commands that accept a trailing "key=<token>" and are answered once per key
+    IDEMPOTENT_COMMANDS = ("AD", "AW", "AT", "AP")
+    KEY_PREFIX = "key="
+    KEY_PATTERN = re.compile(r"[A-Za-z0-9_.:-]{1,128}")
+
     @staticmethod
     def parse_command(data: str) -> Tuple[str, List[str]]:
         """
@@ -41,6 +66,42 @@ class BankProtocol:
         args = parts[1:] if len(parts) > 1 else []
         return command, args
 
+    @staticmethod
+    def parse_request(data: str) -> Tuple[str, List[str], Optional[str]]:
+        """
+        Parses an incoming command string that may end with an idempotency key.
+
+        Args:
+            data: Raw command string, e.g. "AD 10001/10.0.0.1 100 key=7f3a-01".
+
+        Returns:
+            A tuple (command, args, key); `key` is None if the command has no key.
+
+        Raises:
+            ValueError if the key is not 1-128 letters, digits or "_.:-" characters.
+        """
+        command, args = BankProtocol.parse_command(data)
+        if not args or not args[-1].startswith(BankProtocol.KEY_PREFIX):
+            return command, args, None
+        key = args[-1][len(BankProtocol.KEY_PREFIX):]
+        if not BankProtocol.KEY_PATTERN.fullmatch(key):
+            raise ValueError("Invalid idempotency key")
+        return command, args[:-1], key
+
+    @staticmethod
+    def error_message(response: str) -> Optional[str]:
+        """
+        Returns the message of an error response, or None if the response is not an error.
+
+        A response relayed through proxy hops may carry several "ER " prefixes; all are removed.
+        """
+        if not response.startswith("ER"):
+            return None
+        message = response
+        while message.startswith("ER "):
+            message = message[3:]
+        return message.strip()
+
     @staticmethod
     def format_response(command: str, result: Any = None, error: str = None) -> str:
         """
@@ -59,6 +120,8 @@ class BankProtocol:
         """
         if error:
             return f"ER {error}\n"
+        elif isinstance(result, StreamedResult):
+            return "".join(BankProtocol.format_stream(command, result))
         elif result is not None:
             if isinstance(result, (dict, list)):
                 return f"{command} {json.dumps(result, ensure_ascii=False)}\n"
@@ -67,5 +130,23 @@ class BankProtocol:
         else:
             return f"{command}\n"
 
+    @staticmethod
+    def format_stream(command: str, result: StreamedResult) -> Iterator[str]:
+        """
+        Formats a streamed result line by line.
+
+        Args:
+            command: The original command code.
+            result: The streamed result of the command.
+
+        Yields:
+            One JSON line per record, then the closing "<command> <trailer>" line.
+        """
+        for item in result.items:
+            # records such as BankAccount serialize themselves without an intermediate dictionary
+            to_json = getattr(item, "to_json", None)
+            yield f"{to_json() if to_json else json.dumps(item, ensure_ascii=False)}\n"
+        yield BankProtocol.format_response(command, result.trailer())
+
 
 
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class BalanceCache:
+    """
+    Bounded LRU cache of active account balances keyed by (account_number, bank_code).
+
+    A writer calls `stage` inside its transaction, while it holds the database write lock: the
+    entry is dropped and the returned version marks the pending change. Once the transaction
+    committed, the writer stores the new balance with `publish`, which is ignored when a later
+    writer staged the key in the meantime, so cached balances follow commit order and a balance
+    that was rolled back is never served. Readers that missed take a `token()` before querying
+    the database and store the result with `load`, which is ignored when a writer changed the key
+    in the meantime; a slow read can therefore never overwrite a newer balance.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.changed = OrderedDict()
+        self.version = 0
+        self.horizon = -1
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[float]:
+        """Returns the cached balance or None on a miss."""
+        with self.lock:
+            balance = self.entries.get(key)
+            if balance is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return balance
+
+    def token(self) -> int:
+        """Returns a token to pass to `load` for a balance that is about to be read."""
+        with self.lock:
+            return self.version
+
+    def load(self, key: Hashable, balance: float, token: int):
+        """Stores a balance read from the database unless the key changed after `token` was taken."""
+        with self.lock:
+            if self.changed.get(key, self.horizon) >= token:
+                return
+            self._store(key, balance)
+
+    def put(self, key: Hashable, balance: float):
+        """Stores a balance unconditionally."""
+        with self.lock:
+            self._mark_changed(key)
+            self._store(key, balance)
+
+    def stage(self, key: Hashable) -> int:
+        """Drops an account about to be changed by an uncommitted write; returns the version for `publish`."""
+        with self.lock:
+            version = self._mark_changed(key)
+            self.entries.pop(key, None)
+            return version
+
+    def publish(self, key: Hashable, balance: float, version: int):
+        """Stores the balance of a committed write unless the key was staged again after `version`."""
+        with self.lock:
+            if self.changed.get(key) != version:
+                return
+            self._mark_changed(key)
+            self._store(key, balance)
+
+    def invalidate(self, key: Hashable):
+        """Drops an account, e.g. after it was removed or a posting to it failed to commit."""
+        with self.lock:
+            self._mark_changed(key)
+            self.entries.pop(key, None)
+
+    def _store(self, key: Hashable, balance: float):
+        self.entries[key] = balance
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _mark_changed(self, key: Hashable) -> int:
+        version = self.changed[key] = self.version
+        self.changed.move_to_end(key)
+        self.version += 1
+        while len(self.changed) > self.max_entries:
+            # forgetting a change must not let an older read slip in: anything read before it is refused
+            _, self.horizon = self.changed.popitem(last=False)
+        return version
+
+    def stats(self) -> Dict:
+        """Returns size and hit ratio of the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
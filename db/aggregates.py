@@ -0,0 +1,234 @@
+"""
+Per-bank aggregates maintained by triggers.
+
+Usage:
+    python -m db.aggregates verify [--repair] [--db bank.db]
+"""
+import argparse
+import sqlite3
+from typing import Callable, ContextManager, Dict, List
+
+from core.logger import setup_core_logging, config
+
+logger = setup_core_logging()
+
+
+class BankAggregates:
+    """
+    Per-bank totals kept up to date by triggers on the accounts and transactions tables.
+
+    The bank_aggregates table holds account count, active account count, total balance and
+    transaction count for every bank code. Triggers adjust the row in the same transaction as
+    the insert, update or delete that changed the base tables, so every write path (postings,
+    account opening and removal, the group commit writer) keeps it exact without extra code.
+    Minimum and maximum balance are answered from the (bank_code, balance) index.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS bank_aggregates (
+            bank_code TEXT PRIMARY KEY,
+            account_count INTEGER NOT NULL DEFAULT 0,
+            active_count INTEGER NOT NULL DEFAULT 0,
+            total_balance REAL NOT NULL DEFAULT 0.0,
+            transaction_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_accounts_bank_balance ON accounts (bank_code, balance)",
+        """
+        CREATE TRIGGER IF NOT EXISTS aggregates_account_insert AFTER INSERT ON accounts
+        BEGIN
+            INSERT OR IGNORE INTO bank_aggregates (bank_code) VALUES (NEW.bank_code);
+            UPDATE bank_aggregates
+            SET account_count = account_count + 1,
+                active_count = active_count + (NEW.is_active IS 1),
+                total_balance = total_balance + COALESCE(NEW.balance, 0)
+            WHERE bank_code = NEW.bank_code;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS aggregates_account_delete AFTER DELETE ON accounts
+        BEGIN
+            UPDATE bank_aggregates
+            SET account_count = account_count - 1,
+                active_count = active_count - (OLD.is_active IS 1),
+                total_balance = total_balance - COALESCE(OLD.balance, 0)
+            WHERE bank_code = OLD.bank_code;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS aggregates_account_update
+        AFTER UPDATE OF bank_code, balance, is_active ON accounts
+        BEGIN
+            UPDATE bank_aggregates
+            SET account_count = account_count - 1,
+                active_count = active_count - (OLD.is_active IS 1),
+                total_balance = total_balance - COALESCE(OLD.balance, 0)
+            WHERE bank_code = OLD.bank_code;
+            INSERT OR IGNORE INTO bank_aggregates (bank_code) VALUES (NEW.bank_code);
+            UPDATE bank_aggregates
+            SET account_count = account_count + 1,
+                active_count = active_count + (NEW.is_active IS 1),
+                total_balance = total_balance + COALESCE(NEW.balance, 0)
+            WHERE bank_code = NEW.bank_code;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS aggregates_transaction_insert AFTER INSERT ON transactions
+        BEGIN
+            INSERT OR IGNORE INTO bank_aggregates (bank_code) VALUES (NEW.bank_code);
+            UPDATE bank_aggregates SET transaction_count = transaction_count + 1
+            WHERE bank_code = NEW.bank_code;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS aggregates_transaction_delete AFTER DELETE ON transactions
+        BEGIN
+            UPDATE bank_aggregates SET transaction_count = transaction_count - 1
+            WHERE bank_code = OLD.bank_code;
+        END
+        """
+    ]
+
+    RECOMPUTE = """
+        SELECT bank_code,
+               SUM(account_count) AS account_count,
+               SUM(active_count) AS active_count,
+               SUM(total_balance) AS total_balance,
+               SUM(transaction_count) AS transaction_count
+        FROM (
+            SELECT bank_code, COUNT(*) AS account_count,
+                   SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) AS active_count,
+                   COALESCE(SUM(balance), 0) AS total_balance, 0 AS transaction_count
+            FROM accounts GROUP BY bank_code
+            UNION ALL
+            SELECT bank_code, 0, 0, 0, COUNT(*) FROM transactions GROUP BY bank_code
+        )
+        GROUP BY bank_code
+    """
+
+    COLUMNS = ("account_count", "active_count", "total_balance", "transaction_count")
+
+    def __init__(self, connection: Callable[[], ContextManager[sqlite3.Connection]], tolerance: float = 0.005):
+        """
+        Args:
+            connection: Factory of a context manager yielding a database connection.
+            tolerance: Allowed difference of total_balance against the recomputed sum
+                (floating point increments drift slightly from a fresh SUM).
+        """
+        self.connection = connection
+        self.tolerance = tolerance
+
+    def install(self):
+        """Creates the table, index and triggers and backfills the table when it is new."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute("""
+                SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bank_aggregates'
+            """).fetchone()
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            if not exists:
+                self.rebuild(conn)
+                logger.info("Bank aggregates backfilled from the accounts and transactions tables")
+            conn.commit()
+
+    def recompute(self):
+        """Rebuilds the aggregates from the base tables."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self.rebuild(conn)
+            conn.commit()
+
+    def rebuild(self, conn: sqlite3.Connection):
+        """Replaces the aggregates with values recomputed from the base tables inside the caller's transaction."""
+        conn.execute("DELETE FROM bank_aggregates")
+        conn.execute(f"INSERT INTO bank_aggregates (bank_code, {', '.join(self.COLUMNS)}) {self.RECOMPUTE}")
+
+    def verify(self, repair: bool = False) -> List[Dict]:
+        """
+        Compares the maintained aggregates with values recomputed from the base tables.
+
+        Args:
+            repair: Rebuild the aggregates when a mismatch is found.
+
+        Returns:
+            One dictionary per mismatching bank with the stored and the recomputed values;
+            an empty list when the aggregates are consistent.
+        """
+        with self.connection() as conn:
+            stored = {row['bank_code']: dict(row) for row in conn.execute("SELECT * FROM bank_aggregates")}
+            actual = {row['bank_code']: dict(row) for row in conn.execute(self.RECOMPUTE)}
+
+        empty = dict.fromkeys(self.COLUMNS, 0)
+        mismatches = []
+        for bank_code in sorted(set(stored) | set(actual)):
+            have = stored.get(bank_code, empty)
+            want = actual.get(bank_code, empty)
+            if any(have[c] != want[c] for c in self.COLUMNS if c != "total_balance") \
+                    or abs(have["total_balance"] - want["total_balance"]) > self.tolerance:
+                mismatches.append({
+                    'bank_code': bank_code,
+                    'stored': {c: have[c] for c in self.COLUMNS},
+                    'actual': {c: want[c] for c in self.COLUMNS}
+                })
+
+        if mismatches:
+            logger.warning(f"Bank aggregates inconsistent for {len(mismatches)} bank(s)")
+            if repair:
+                self.recompute()
+        return mismatches
+
+    def totals(self) -> Dict:
+        """Returns account count, active account count and total balance summed over all bank codes."""
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT COALESCE(SUM(account_count), 0) AS account_count,
+                       COALESCE(SUM(active_count), 0) AS active_count,
+                       COALESCE(SUM(total_balance), 0) AS total_balance
+                FROM bank_aggregates
+            """).fetchone()
+            return dict(row)
+
+    def bank(self, conn: sqlite3.Connection, bank_code: str) -> Dict:
+        """Returns the aggregates of one bank with min/max balance taken from the index."""
+        row = conn.execute("SELECT * FROM bank_aggregates WHERE bank_code = ?", (bank_code,)).fetchone()
+        stats = dict(row) if row else dict(zip(self.COLUMNS, (0, 0, 0.0, 0)))
+        stats['min_balance'] = conn.execute("""
+            SELECT MIN(balance) FROM accounts WHERE bank_code = ?
+        """, (bank_code,)).fetchone()[0]
+        stats['max_balance'] = conn.execute("""
+            SELECT MAX(balance) FROM accounts WHERE bank_code = ?
+        """, (bank_code,)).fetchone()[0]
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the maintained bank aggregates against the base tables")
+    parser.add_argument("action", choices=("verify",))
+    parser.add_argument("--repair", action="store_true", help="rebuild the aggregates if they are inconsistent")
+    parser.add_argument("--db", default=config.get("database", "path", fallback="bank.db"))
+    args = parser.parse_args()
+
+    from db.database import DataBase
+
+    db = DataBase(args.db)
+    try:
+        mismatches = db.aggregates.verify(repair=args.repair)
+    except sqlite3.Error as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
+
+    for mismatch in mismatches:
+        print(f"{mismatch['bank_code']}: stored {mismatch['stored']}, actual {mismatch['actual']}")
+    if not mismatches:
+        print(f"{args.db}: aggregates consistent")
+    elif args.repair:
+        print(f"{args.db}: aggregates of {len(mismatches)} bank(s) rebuilt")
+    else:
+        raise SystemExit(f"{args.db}: aggregates of {len(mismatches)} bank(s) inconsistent, run with --repair")
+
+
+if __name__ == "__main__":
+    main()
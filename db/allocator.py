@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+from typing import Callable, ContextManager, Dict
+
+
+class AccountNumberAllocator:
+    """
+    Hands out account numbers (10001-99999) without querying the accounts table per account.
+
+    Fresh numbers are reserved in blocks of `block_size`; the end of the last reserved block
+    (the high-water mark) is stored in the account_sequence table, so several nodes or restarts
+    never reserve the same block twice. Numbers of failed creations, and numbers below the mark
+    that were reserved but never used before a restart, are kept in a bitmap over the whole
+    range and are reused first, lowest number first. Closed accounts keep their numbers.
+    """
+
+    FIRST = 10001
+    LAST = 99999
+
+    def __init__(self, connection: Callable[[], ContextManager[sqlite3.Connection]], block_size: int = 100):
+        """
+        Args:
+            connection: Factory of a context manager yielding a database connection.
+            block_size: Number of fresh account numbers reserved per database write.
+        """
+        self.connection = connection
+        self.block_size = max(1, block_size)
+        self.lock = threading.Lock()
+
+        size = self.LAST - self.FIRST + 1
+        self.free = bytearray((size + 7) // 8)
+        self.free_count = 0
+        self.free_hint = 0
+
+        self.next = self.FIRST
+        self.block_end = self.FIRST
+
+        self.blocks = 0
+        self.reused = 0
+
+        self.load()
+
+    def load(self):
+        """Reads the high-water mark and rebuilds the bitmap of free numbers below it."""
+        with self.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS account_sequence (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    high_water INTEGER NOT NULL
+                )
+            """)
+            max_acc = conn.execute("SELECT MAX(account_number) FROM accounts").fetchone()[0]
+            used_end = (max_acc or self.FIRST - 1) + 1
+            conn.execute("INSERT OR IGNORE INTO account_sequence (id, high_water) VALUES (1, ?)", (used_end,))
+            conn.execute("UPDATE account_sequence SET high_water = MAX(high_water, ?) WHERE id = 1", (used_end,))
+            conn.commit()
+            high_water = conn.execute("SELECT high_water FROM account_sequence WHERE id = 1").fetchone()[0]
+
+            with self.lock:
+                for number in range(self.FIRST, min(high_water, self.LAST + 1)):
+                    self._set_free(number)
+                for (number,) in conn.execute("""
+                    SELECT account_number FROM accounts
+                    WHERE account_number BETWEEN ? AND ?
+                """, (self.FIRST, self.LAST)):
+                    self._clear_free(number)
+                self.next = self.block_end = high_water
+
+    def allocate(self) -> int:
+        """
+        Returns an unused account number.
+
+        Raises:
+            ValueError if all numbers of the range are in use.
+            sqlite3.Error if reserving a new block fails.
+        """
+        with self.lock:
+            if self.free_count:
+                self.reused += 1
+                return self._pop_free()
+
+            if self.next >= self.block_end:
+                self._reserve_block()
+
+            number = self.next
+            self.next += 1
+            return number
+
+    def release(self, number: int):
+        """Makes the number of a failed creation available again."""
+        if not self.FIRST <= number <= self.LAST:
+            return
+        with self.lock:
+            self._set_free(number)
+
+    def _reserve_block(self):
+        """Moves the persisted high-water mark forward by one block. Caller holds the lock."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            start = conn.execute("SELECT high_water FROM account_sequence WHERE id = 1").fetchone()[0]
+            end = min(start + self.block_size, self.LAST + 1)
+            conn.execute("UPDATE account_sequence SET high_water = ? WHERE id = 1", (end,))
+            conn.commit()
+
+        if start >= end:
+            raise ValueError("Bank account limit reached")
+        self.next, self.block_end = start, end
+        self.blocks += 1
+
+    def _set_free(self, number: int):
+        index = number - self.FIRST
+        byte, bit = divmod(index, 8)
+        if not self.free[byte] & (1 << bit):
+            self.free[byte] |= 1 << bit
+            self.free_count += 1
+            self.free_hint = min(self.free_hint, byte)
+
+    def _clear_free(self, number: int):
+        index = number - self.FIRST
+        byte, bit = divmod(index, 8)
+        if self.free[byte] & (1 << bit):
+            self.free[byte] &= ~(1 << bit)
+            self.free_count -= 1
+
+    def _pop_free(self) -> int:
+        """Removes and returns the lowest free number. Caller holds the lock and checked free_count."""
+        byte = self.free_hint
+        while not self.free[byte]:
+            byte += 1
+        self.free_hint = byte
+        value = self.free[byte]
+        bit = (value & -value).bit_length() - 1
+        number = self.FIRST + byte * 8 + bit
+        self._clear_free(number)
+        return number
+
+    def stats(self) -> Dict:
+        """Returns allocator counters."""
+        with self.lock:
+            return {
+                'high_water': self.block_end,
+                'next': self.next,
+                'remaining_in_block': self.block_end - self.next,
+                'free': self.free_count,
+                'blocks_reserved': self.blocks,
+                'reused': self.reused
+            }
@@ -0,0 +1,221 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, ContextManager, Dict, Iterator, List
+
+from core.logger import setup_core_logging
+
+logger = setup_core_logging()
+
+
+class TransactionArchive:
+    """
+    Moves old postings out of the transactions table into immutable, compressed segment files.
+
+    A segment holds up to `segment_size` postings, oldest id first, as gzip-compressed JSON lines
+    (segment-<first id>-<last id>.jsonl.gz). Next to it a small JSON index records the id, account
+    and time ranges, the posting count per bank code and the cutoff used for archiving. The index is
+    written last, so a segment without index is incomplete and ignored.
+
+    Archiving reads the candidates without a write lock, writes the segment and then deletes the
+    archived rows in one short transaction per segment. If the process stops between the two steps,
+    the next run deletes the rows of the newest segment again before continuing.
+    """
+
+    def __init__(self, directory: str, connection: Callable[[], ContextManager[sqlite3.Connection]],
+                 write: Callable[[Callable[[sqlite3.Connection], object]], object],
+                 max_age_days: float = 365, segment_size: int = 10000, interval: float = 3600):
+        """
+        Args:
+            directory: Directory of the segment files.
+            connection: Factory of a context manager yielding a database connection.
+            write: Function running a unit of write work in its own committed transaction.
+            max_age_days: Postings older than this are archived.
+            segment_size: Maximum number of postings per segment.
+            interval: Seconds between archiving runs of the background thread.
+        """
+        self.directory = directory
+        self.connection = connection
+        self.write = write
+        self.max_age = timedelta(days=max_age_days)
+        self.segment_size = max(1, segment_size)
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.run_lock = threading.Lock()
+        self.segments = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.runs = 0
+        self.archived = 0
+
+        self.load()
+
+    def load(self):
+        """Reads the indexes of all complete segments."""
+        segments = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith(".index.json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                        segments.append(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Cannot read archive index {name}: {e}")
+        segments.sort(key=lambda s: s['min_id'])
+        with self.lock:
+            self.segments = segments
+
+    def start(self):
+        """Starts archiving in the background every `interval` seconds."""
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="bank-archive", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the background thread after the segment in progress."""
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.archive_once()
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Archiving failed: {e}")
+
+    def archive_once(self, now: datetime = None) -> int:
+        """
+        Archives all postings older than the maximum age.
+
+        Returns:
+            The number of archived postings.
+        """
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - self.max_age).strftime("%Y-%m-%d %H:%M:%S")
+        total = 0
+        with self.run_lock:
+            self._finish_newest()
+            while not self.stop_event.is_set():
+                with self.connection() as conn:
+                    rows = [dict(row) for row in conn.execute("""
+                        SELECT id, account_number, bank_code, amount, transaction_type, description, timestamp
+                        FROM transactions
+                        WHERE timestamp < ?
+                        ORDER BY id
+                        LIMIT ?
+                    """, (cutoff, self.segment_size))]
+                if not rows:
+                    break
+                segment = self._write_segment(rows, cutoff)
+                self._delete(segment)
+                total += len(rows)
+                if len(rows) < self.segment_size:
+                    break
+
+        self.runs += 1
+        self.archived += total
+        if total:
+            logger.info(f"Archived {total} postings older than {cutoff}")
+        return total
+
+    def _write_segment(self, rows: List[Dict], cutoff: str) -> Dict:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"segment-{rows[0]['id']:012d}-{rows[-1]['id']:012d}"
+        data_path = os.path.join(self.directory, f"{name}.jsonl.gz")
+
+        with gzip.open(data_path + ".tmp", "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(data_path + ".tmp", data_path)
+
+        banks = {}
+        for row in rows:
+            banks[row['bank_code']] = banks.get(row['bank_code'], 0) + 1
+        segment = {
+            'file': os.path.basename(data_path),
+            'count': len(rows),
+            'min_id': rows[0]['id'],
+            'max_id': rows[-1]['id'],
+            'min_account': min(row['account_number'] for row in rows),
+            'max_account': max(row['account_number'] for row in rows),
+            'min_time': min(row['timestamp'] for row in rows),
+            'max_time': max(row['timestamp'] for row in rows),
+            'cutoff': cutoff,
+            'banks': banks
+        }
+        index_path = os.path.join(self.directory, f"{name}.index.json")
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(segment, f)
+        os.replace(index_path + ".tmp", index_path)
+
+        with self.lock:
+            self.segments.append(segment)
+        return segment
+
+    def _delete(self, segment: Dict):
+        """Deletes the rows of a written segment from the live table in one short transaction."""
+        def work(conn: sqlite3.Connection) -> int:
+            return conn.execute("""
+                DELETE FROM transactions WHERE id <= ? AND timestamp < ?
+            """, (segment['max_id'], segment['cutoff'])).rowcount
+
+        self.write(work)
+
+    def _finish_newest(self):
+        """Deletes rows left in the live table by a run that stopped after writing its segment."""
+        with self.lock:
+            newest = self.segments[-1] if self.segments else None
+        if newest:
+            self._delete(newest)
+
+    def iter_postings(self, account_number: int, bank_code: str, after_id: int = 0) -> Iterator[Dict]:
+        """
+        Yields archived postings of an account with an id greater than `after_id`, oldest first.
+
+        Args:
+            account_number: The account number.
+            bank_code: The bank code of the account.
+            after_id: Id of the last posting already seen.
+
+        Yields:
+            Dictionaries with id, amount, transaction_type, description and timestamp.
+        """
+        with self.lock:
+            segments = [s for s in self.segments
+                        if s['max_id'] > after_id
+                        and s['min_account'] <= account_number <= s['max_account']
+                        and bank_code in s['banks']]
+
+        for segment in segments:
+            with gzip.open(os.path.join(self.directory, segment['file']), "rt", encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row['id'] <= after_id or row['account_number'] != account_number \
+                            or row['bank_code'] != bank_code:
+                        continue
+                    yield {key: row[key] for key in ('id', 'amount', 'transaction_type', 'description', 'timestamp')}
+
+    def count(self, bank_code: str) -> int:
+        """Returns the number of archived postings of a bank."""
+        with self.lock:
+            return sum(s['banks'].get(bank_code, 0) for s in self.segments)
+
+    def stats(self) -> Dict:
+        """Returns archive counters."""
+        with self.lock:
+            return {
+                'segments': len(self.segments),
+                'postings': sum(s['count'] for s in self.segments),
+                'oldest': self.segments[0]['min_time'] if self.segments else None,
+                'newest': max((s['max_time'] for s in self.segments), default=None),
+                'runs': self.runs,
+                'archived_since_start': self.archived
+            }
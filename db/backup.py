@@ -0,0 +1,355 @@
+"""
+Online backups of the bank database.
+
+Usage:
+    python -m db.backup backup [--db bank.db]
+    python -m db.backup verify <backup file>
+    python -m db.backup restore <backup file> [--db bank.db]
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from core.logger import setup_core_logging, config
+from db.storage import configured_engine
+
+logger = setup_core_logging()
+
+
+class BackupManager:
+    """
+    Takes backups of a live database with SQLite's online backup API.
+
+    The database is copied `pages_per_step` pages at a time with a pause of `step_sleep_ms`
+    between steps, so connections serving clients are never blocked for the whole copy.
+    (If another connection writes during the copy, SQLite restarts it from the first page;
+    restarts are counted in the metrics.) The copy is checked with PRAGMA integrity_check,
+    optionally gzip-compressed and stored with a .sha256 checksum file. Only the newest
+    `max_files` backups are kept. Only the sqlite3 storage engine is covered: with
+    [database] engine = memory the accounts are not in the database file.
+    """
+
+    PREFIX = "bank-"
+    REQUIRED_TABLES = ("accounts", "transactions")
+
+    def __init__(self, db_path: str, directory: str = "backups", interval: float = 86400, max_files: int = 30,
+                 compress: bool = True, backup_on_exit: bool = True, auto_cleanup: bool = True,
+                 pages_per_step: int = 256, step_sleep_ms: float = 5, timeout: float = 5):
+        """
+        Args:
+            db_path: Path of the database to back up.
+            directory: Directory the backups are written to.
+            interval: Seconds between scheduled backups.
+            max_files: Number of backups kept by rotation.
+            compress: Store backups gzip-compressed.
+            backup_on_exit: Take a final backup when the scheduler is stopped.
+            auto_cleanup: Delete backups beyond `max_files`.
+            pages_per_step: Database pages copied per backup step.
+            step_sleep_ms: Pause between two backup steps.
+            timeout: SQLite busy timeout of the source connection.
+        """
+        self.db_path = db_path
+        self.directory = directory
+        self.interval = interval
+        self.max_files = max(1, max_files)
+        self.compress = compress
+        self.backup_on_exit = backup_on_exit
+        self.auto_cleanup = auto_cleanup
+        self.pages_per_step = max(1, pages_per_step)
+        self.step_sleep = step_sleep_ms / 1000
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.run_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.backups = 0
+        self.failures = 0
+        self.restarts = 0
+        self.progress = None
+        self.last_backup = None
+        self.last_duration = None
+        self.last_size = None
+        self.last_pages = None
+        self.last_error = None
+
+    @classmethod
+    def from_config(cls, db_path: str) -> "BackupManager":
+        """
+        Creates a manager from the [backup] section of config.ini.
+        A relative backup_dir is resolved next to the database, like the archive directory.
+        """
+        return cls(
+            db_path,
+            directory=os.path.join(os.path.dirname(os.path.abspath(db_path)),
+                                   config.get("backup", "backup_dir", fallback="backups")),
+            interval=config.getfloat("backup", "backup_interval", fallback=86400),
+            max_files=config.getint("backup", "max_backup_files", fallback=30),
+            compress=config.getboolean("backup", "compress_backups", fallback=True),
+            backup_on_exit=config.getboolean("backup", "backup_on_exit", fallback=True),
+            auto_cleanup=config.getboolean("backup", "auto_cleanup", fallback=True),
+            pages_per_step=config.getint("backup", "pages_per_step", fallback=256),
+            step_sleep_ms=config.getfloat("backup", "step_sleep_ms", fallback=5),
+            timeout=config.getfloat("database", "timeout", fallback=5)
+        )
+
+    def start(self):
+        """Starts taking backups every `interval` seconds in the background."""
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="bank-backup", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the scheduler and takes the exit backup if configured."""
+        if not self.thread:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        if self.backup_on_exit:
+            self.safe_backup()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.safe_backup()
+
+    def safe_backup(self):
+        """Takes a backup and logs instead of raising on failure."""
+        try:
+            self.backup()
+        except (OSError, sqlite3.Error, ValueError) as e:
+            logger.error(f"Backup failed: {e}")
+
+    def backup(self) -> str:
+        """
+        Takes one backup now.
+
+        Returns:
+            Path of the new backup file.
+
+        Raises:
+            sqlite3.Error or OSError if the copy fails, ValueError if the copy fails verification.
+        """
+        with self.run_lock:
+            started = time.monotonic()
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{self.PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db"
+            copy_path = os.path.join(self.directory, name + ".tmp")
+
+            try:
+                pages = self._copy(copy_path)
+                self.verify_database(copy_path)
+
+                path = os.path.join(self.directory, name + (".gz" if self.compress else ""))
+                if self.compress:
+                    with open(copy_path, "rb") as src, gzip.open(path + ".tmp", "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(path + ".tmp", path)
+                    os.remove(copy_path)
+                else:
+                    os.replace(copy_path, path)
+                with open(path + ".sha256", "w") as f:
+                    f.write(f"{self.checksum(path)}  {os.path.basename(path)}\n")
+            except Exception as e:
+                for leftover in (copy_path, copy_path.replace(".tmp", ".gz.tmp")):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                with self.lock:
+                    self.failures += 1
+                    self.last_error = str(e)
+                    self.progress = None
+                raise
+
+            duration = time.monotonic() - started
+            with self.lock:
+                self.backups += 1
+                self.last_backup = path
+                self.last_duration = duration
+                self.last_size = os.path.getsize(path)
+                self.last_pages = pages
+                self.last_error = None
+                self.progress = None
+
+            logger.info(f"Backup {path} written ({pages} pages, {duration:.2f}s)")
+            if self.auto_cleanup:
+                self.rotate()
+            return path
+
+    def _copy(self, copy_path: str) -> int:
+        """Copies the database page step by page step and returns the number of pages."""
+        pages = {'total': 0, 'remaining': None}
+
+        def progress(status, remaining, total):
+            if pages['remaining'] is not None and remaining > pages['remaining']:
+                with self.lock:
+                    self.restarts += 1
+            pages['total'], pages['remaining'] = total, remaining
+            with self.lock:
+                self.progress = (total - remaining) / total if total else 1.0
+
+        source = sqlite3.connect(self.db_path, timeout=self.timeout)
+        target = sqlite3.connect(copy_path)
+        try:
+            with self.lock:
+                self.progress = 0.0
+            source.backup(target, pages=self.pages_per_step, progress=progress, sleep=self.step_sleep)
+            # the copy is a standalone file; it must not depend on a -wal file
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+            source.close()
+        return pages['total']
+
+    def rotate(self) -> List[str]:
+        """Deletes the oldest backups beyond `max_files` and returns their paths."""
+        removed = []
+        for path in self.list_backups()[self.max_files:]:
+            for file in (path, path + ".sha256"):
+                if os.path.exists(file):
+                    os.remove(file)
+            removed.append(path)
+        if removed:
+            logger.info(f"Removed {len(removed)} old backups")
+        return removed
+
+    def list_backups(self) -> List[str]:
+        """Returns the paths of all backups, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name for name in os.listdir(self.directory)
+                 if name.startswith(self.PREFIX) and (name.endswith(".db") or name.endswith(".db.gz"))]
+        return [os.path.join(self.directory, name) for name in sorted(names, reverse=True)]
+
+    @staticmethod
+    def checksum(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def verify_database(cls, path: str):
+        """
+        Checks that a database file is intact and contains the bank tables.
+
+        Raises:
+            ValueError if the check fails.
+        """
+        conn = sqlite3.connect(path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise ValueError(f"Integrity check failed: {result}")
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            missing = [table for table in cls.REQUIRED_TABLES if table not in tables]
+            if missing:
+                raise ValueError(f"Backup is missing tables: {', '.join(missing)}")
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Not a valid database: {e}")
+        finally:
+            conn.close()
+
+    @classmethod
+    def verify(cls, backup_path: str) -> str:
+        """
+        Verifies a backup file: checksum (when the .sha256 file exists), decompression and database integrity.
+
+        Returns:
+            Path of a verified, uncompressed temporary copy; the caller removes it.
+
+        Raises:
+            ValueError if any check fails.
+        """
+        checksum_path = backup_path + ".sha256"
+        if os.path.exists(checksum_path):
+            with open(checksum_path) as f:
+                expected = f.read().split()[0]
+            if cls.checksum(backup_path) != expected:
+                raise ValueError("Checksum mismatch")
+
+        fd, copy_path = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(backup_path)))
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                if backup_path.endswith(".gz"):
+                    with gzip.open(backup_path, "rb") as src:
+                        shutil.copyfileobj(src, dst)
+                else:
+                    with open(backup_path, "rb") as src:
+                        shutil.copyfileobj(src, dst)
+            cls.verify_database(copy_path)
+        except (OSError, EOFError, ValueError) as e:
+            os.remove(copy_path)
+            raise ValueError(f"Backup {backup_path} is not usable: {e}")
+        return copy_path
+
+    @classmethod
+    def restore(cls, backup_path: str, db_path: str):
+        """
+        Replaces the database with a verified backup. The node must not be running.
+        The current database is kept as <db_path>.before-restore.
+
+        Raises:
+            ValueError if the backup fails verification.
+        """
+        copy_path = cls.verify(backup_path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        if os.path.exists(db_path):
+            os.replace(db_path, db_path + ".before-restore")
+        os.replace(copy_path, db_path)
+        logger.info(f"Database {db_path} restored from {backup_path}")
+
+    def stats(self) -> Dict:
+        """Returns backup counters and the metrics of the last backup."""
+        with self.lock:
+            return {
+                'backups': self.backups,
+                'failures': self.failures,
+                'restarts': self.restarts,
+                'in_progress': self.progress,
+                'last_backup': self.last_backup,
+                'last_duration': self.last_duration,
+                'last_size': self.last_size,
+                'last_pages': self.last_pages,
+                'last_error': self.last_error
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up, verify and restore the bank database")
+    parser.add_argument("action", choices=("backup", "verify", "restore"))
+    parser.add_argument("file", nargs="?", help="backup file (verify, restore)")
+    parser.add_argument("--db", default=config.get("database", "path", fallback="bank.db"))
+    args = parser.parse_args()
+
+    if args.action == "backup":
+        if configured_engine() == "memory":
+            raise SystemExit("Cannot back up the memory storage engine, only sqlite3 is supported")
+        print(BackupManager.from_config(args.db).backup())
+        return
+    if not args.file:
+        parser.error(f"{args.action} needs a backup file")
+    try:
+        if args.action == "verify":
+            os.remove(BackupManager.verify(args.file))
+            print(f"{args.file}: OK")
+        else:
+            BackupManager.restore(args.file, args.db)
+            print(f"{args.db} restored from {args.file}")
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Bulk import and export of accounts and opening balances.
+
+Usage:
+    python -m db.bulk export accounts.csv [--active-only]
+    python -m db.bulk import accounts.jsonl [--bank-code 10.0.0.5] [--keep-numbers] [--strict]
+
+The format follows the file extension (.csv or .jsonl) unless --format is given.
+Run imports while the node is stopped or idle: secondary indexes and the aggregate
+triggers are dropped during the load and rebuilt at the end.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from core.logger import setup_core_logging, config
+from db.aggregates import BankAggregates
+from db.allocator import AccountNumberAllocator
+from db.database import DataBase
+
+logger = setup_core_logging()
+
+
+class BulkTransfer:
+    """Imports and exports accounts of a DataBase in large batches."""
+
+    FIELDS = ("account_number", "bank_code", "balance", "is_active", "created_at", "updated_at")
+    SECONDARY_INDEXES = ("idx_accounts_bank_balance", "idx_transactions_account", "idx_transactions_timestamp")
+    LOAD_PRAGMAS = {
+        "synchronous": "OFF",
+        "cache_size": "-65536",
+        "temp_store": "MEMORY"
+    }
+    MAX_ERRORS = 100
+
+    def __init__(self, db: DataBase, batch_size: int = 10000):
+        """
+        Args:
+            db: The database to import into or export from.
+            batch_size: Rows inserted per transaction.
+        """
+        self.db = db
+        self.batch_size = max(1, batch_size)
+
+    @staticmethod
+    def detect_format(path: str, fmt: str = None) -> str:
+        fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown format '{fmt}', use csv or jsonl")
+        return fmt
+
+    def export_accounts(self, path: str, fmt: str = None, active_only: bool = False) -> Dict:
+        """
+        Writes all accounts to a CSV or JSONL file, streaming them from the database.
+
+        Returns:
+            A report with rows, seconds and rows_per_sec.
+        """
+        fmt = self.detect_format(path, fmt)
+        started = time.perf_counter()
+        rows = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS) if fmt == "csv" else None
+            if writer:
+                writer.writeheader()
+            for account in self.db.iter_accounts(active_only=active_only):
+                if writer:
+                    writer.writerow(account.to_dict())
+                else:
+                    f.write(account.to_json() + "\n")
+                rows += 1
+        return self.report(rows, 0, [], time.perf_counter() - started)
+
+    def read_records(self, path: str, fmt: str) -> Iterator[Tuple[int, Dict]]:
+        """Yields (line number, record) pairs of an import file."""
+        with open(path, newline="", encoding="utf-8") as f:
+            if fmt == "csv":
+                for record in csv.DictReader(f):
+                    yield 0, record
+            else:
+                for line_number, line in enumerate(f, 1):
+                    if line.strip():
+                        try:
+                            yield line_number, json.loads(line)
+                        except ValueError:
+                            yield line_number, None
+
+    def validate(self, record: Dict, keep_numbers: bool) -> Tuple[int, float, int]:
+        """
+        Applies the rules of account creation to an imported record.
+
+        Returns:
+            (account number or None, balance, is_active)
+
+        Raises:
+            ValueError with the reason a record is rejected.
+        """
+        if not isinstance(record, dict):
+            raise ValueError("Invalid record")
+
+        try:
+            raw = record.get("balance")
+            balance = float(raw) if raw not in (None, "") else 0.0
+        except (TypeError, ValueError):
+            raise ValueError("Invalid initial balance")
+        if balance != balance or balance in (float("inf"), float("-inf")):
+            raise ValueError("Invalid initial balance")
+        if balance < 0:
+            raise ValueError("Initial balance cannot be negative")
+
+        is_active = record.get("is_active")
+        is_active = 1 if is_active in (None, "") else int(str(is_active).lower() in ("1", "true", "yes"))
+
+        account_number = None
+        if keep_numbers:
+            try:
+                account_number = int(record.get("account_number"))
+            except (TypeError, ValueError):
+                raise ValueError("Invalid account number")
+            if not AccountNumberAllocator.FIRST <= account_number <= AccountNumberAllocator.LAST:
+                raise ValueError("Account number out of range")
+        return account_number, balance, is_active
+
+    def import_accounts(self, path: str, bank_code: str, fmt: str = None, keep_numbers: bool = False,
+                        strict: bool = False) -> Dict:
+        """
+        Loads accounts and opening balances from a CSV or JSONL file.
+
+        Every account gets `bank_code`. Without `keep_numbers` new numbers come from the
+        account number allocator; with it the file's numbers are kept and records whose
+        number is taken are rejected. A positive balance is recorded as an INITIAL_DEPOSIT
+        posting, as for AC.
+
+        Args:
+            path: The import file.
+            bank_code: Bank code of the imported accounts.
+            fmt: "csv" or "jsonl"; taken from the file extension by default.
+            keep_numbers: Keep the account numbers of the file.
+            strict: Stop at the first rejected record instead of skipping it; records before it stay imported.
+
+        Returns:
+            A report with rows, rejected, errors, seconds and rows_per_sec.
+        """
+        fmt = self.detect_format(path, fmt)
+        started = time.perf_counter()
+        imported, rejected, errors = 0, 0, []
+        used = set()
+
+        with self.db.connection() as conn:
+            conn.isolation_level = None
+            try:
+                for name, value in self.LOAD_PRAGMAS.items():
+                    conn.execute(f"PRAGMA {name} = {value}")
+                self.drop_secondary_structures(conn)
+
+                if keep_numbers:
+                    used = {row[0] for row in conn.execute("SELECT account_number FROM accounts")}
+
+                batch = []
+                for position, (line_number, record) in enumerate(self.read_records(path, fmt), 1):
+                    try:
+                        account_number, balance, is_active = self.validate(record, keep_numbers)
+                        if keep_numbers:
+                            if account_number in used:
+                                raise ValueError(f"Account number {account_number} already exists")
+                        else:
+                            account_number = self.db.allocator.allocate()
+                    except ValueError as e:
+                        rejected += 1
+                        if len(errors) < self.MAX_ERRORS:
+                            errors.append({'record': line_number or position, 'error': str(e)})
+                        if strict:
+                            break
+                        continue
+
+                    used.add(account_number)
+                    batch.append((account_number, bank_code, balance, is_active))
+                    if len(batch) >= self.batch_size:
+                        self.insert_batch(conn, batch)
+                        imported += len(batch)
+                        batch = []
+
+                if batch:
+                    self.insert_batch(conn, batch)
+                    imported += len(batch)
+            finally:
+                self.restore_secondary_structures(conn)
+                for name in self.LOAD_PRAGMAS:
+                    conn.execute(f"PRAGMA {name} = {self.db.pragmas.get(name, 'DEFAULT')}")
+                conn.isolation_level = ""
+
+        self.db.allocator.load()
+        report = self.report(imported, rejected, errors, time.perf_counter() - started)
+        logger.info(f"Imported {imported} accounts ({rejected} rejected) at {report['rows_per_sec']:.0f} rows/s")
+        return report
+
+    @staticmethod
+    def insert_batch(conn, batch: List[Tuple[int, str, float, int]]):
+        """Inserts accounts and their opening balance postings in one transaction."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT INTO accounts (account_number, bank_code, balance, is_active)
+                VALUES (?, ?, ?, ?)
+            """, batch)
+            conn.executemany("""
+                INSERT INTO transactions (account_number, bank_code, amount, transaction_type, description)
+                VALUES (?, ?, ?, 'INITIAL_DEPOSIT', 'Imported opening balance')
+            """, [(number, bank_code, balance) for number, bank_code, balance, _ in batch if balance > 0])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def drop_secondary_structures(self, conn):
+        """Drops secondary indexes and aggregate triggers so the load only maintains primary keys."""
+        for index in self.SECONDARY_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        for (trigger,) in conn.execute("""
+            SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'aggregates_%'
+        """).fetchall():
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    def restore_secondary_structures(self, conn):
+        """Recreates the indexes and triggers dropped for the load and recomputes the aggregates."""
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_transactions_account
+            ON transactions (account_number, bank_code, id)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_transactions_timestamp
+            ON transactions (timestamp)
+        """)
+        for statement in BankAggregates.SCHEMA:
+            conn.execute(statement)
+        self.db.aggregates.rebuild(conn)
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def report(rows: int, rejected: int, errors: List[Dict], seconds: float) -> Dict:
+        return {
+            'rows': rows,
+            'rejected': rejected,
+            'errors': errors,
+            'seconds': seconds,
+            'rows_per_sec': rows / seconds if seconds > 0 else 0.0
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export bank accounts")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=("csv", "jsonl"))
+    parser.add_argument("--db", default=config.get("database", "path", fallback="bank.db"))
+    parser.add_argument("--bank-code", default=config.get("bank", "code", fallback="127.0.0.1"))
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--keep-numbers", action="store_true", help="keep the account numbers of the file")
+    parser.add_argument("--strict", action="store_true", help="stop at the first invalid record")
+    parser.add_argument("--active-only", action="store_true", help="export active accounts only")
+    args = parser.parse_args()
+
+    db = DataBase(args.db)
+    try:
+        transfer = BulkTransfer(db, args.batch_size)
+        if args.action == "export":
+            report = transfer.export_accounts(args.file, args.format, args.active_only)
+        else:
+            report = transfer.import_accounts(args.file, args.bank_code, args.format, args.keep_numbers, args.strict)
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
+
+    print(f"{args.action}: {report['rows']} rows in {report['seconds']:.2f}s ({report['rows_per_sec']:.0f} rows/s)")
+    if report['rejected']:
+        print(f"rejected: {report['rejected']}")
+        for error in report['errors']:
+            print(f"  record {error['record']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,49 @@
+import heapq
+import os
 import sqlite3
-from core.logger import setup_core_logging
-from typing import List, Dict, Any
+from contextlib import contextmanager
+from core.logger import setup_core_logging, config
+from db.pool import ConnectionPool
+from db.group_commit import GroupCommitWriter
+from db.allocator import AccountNumberAllocator
+from db.aggregates import BankAggregates
+from db.account_cache import BalanceCache
+from db.archive import TransactionArchive
+from db.storage import AccountStore
+from db.locks import BusyRetry
+from db.models import BankAccount
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 logger = setup_core_logging()
 
-class DataBase:
+
+class PostingError(ValueError):
+    """
+    Raised when a posting cannot be applied to an account.
+    The `reason` attribute tells callers which check failed; for a set of postings
+    applied together, `leg` is the index of the posting that failed.
+    """
+    NOT_FOUND = "not_found"
+    INACTIVE = "inactive"
+    INSUFFICIENT_FUNDS = "insufficient_funds"
+    HAS_FUNDS = "has_funds"
+
+    def __init__(self, reason: str, message: str, leg: int = None):
+        super().__init__(message)
+        self.reason = reason
+        self.leg = leg
+
+
+class DataBase(AccountStore):
     """
     Handles all database operations for the bank system, including account management,
     transactions, known banks, and active connections.
+    It is also the sqlite3 engine of the AccountStore interface.
     """
 
+    OPEN_ATTEMPTS = 10
+
     def __init__(self, db_path: str = "bank.db"):
         """
         Initializes the database with the given path and ensures required tables exist.
@@ -18,11 +52,64 @@ class DataBase:
             db_path: Path to the SQLite database file.
         """
         self.db_path = db_path
+        self.timeout = config.getfloat("database", "timeout", fallback=5)
+        self.pragmas = {
+            "journal_mode": config.get("database", "journal_mode", fallback="WAL"),
+            "synchronous": config.get("database", "synchronous", fallback="NORMAL"),
+            "cache_size": config.get("database", "cache_size", fallback="-2000"),
+            "foreign_keys": config.get("database", "foreign_keys", fallback="ON"),
+            "busy_timeout": config.getint("database", "busy_timeout_ms", fallback=int(self.timeout * 1000))
+        }
+        self.busy_retry = BusyRetry(
+            attempts=config.getint("database", "busy_retries", fallback=5),
+            base_delay_ms=config.getfloat("database", "busy_retry_base_ms", fallback=10),
+            max_delay_ms=config.getfloat("database", "busy_retry_max_ms", fallback=500)
+        )
+        self.supports_returning = sqlite3.sqlite_version_info >= (3, 35, 0)
+        self.fetch_batch_size = config.getint("database", "fetch_batch_size", fallback=500)
+        self.pool = ConnectionPool(
+            self.get_connection,
+            max_size=config.getint("database", "pool_size", fallback=20),
+            timeout=self.timeout
+        )
         self.init_database()
+        self.aggregates = BankAggregates(self.connection)
+        self.aggregates.install()
+        self.allocator = AccountNumberAllocator(
+            self.connection,
+            block_size=config.getint("database", "account_block_size", fallback=100)
+        )
+
+        self.balances = None
+        if config.getboolean("performance", "enable_caching", fallback=True):
+            self.balances = BalanceCache(config.getint("performance", "query_cache_size", fallback=1000))
+            self.warm_up(config.getint("performance", "cache_warmup", fallback=0))
+
+        self.writer = None
+        if config.getboolean("database", "group_commit", fallback=False):
+            self.writer = GroupCommitWriter(
+                self.get_connection,
+                batch_size=config.getint("database", "group_commit_batch_size", fallback=64),
+                max_wait_ms=config.getfloat("database", "group_commit_max_wait_ms", fallback=2)
+            )
+            self.writer.start()
+
+        # segment files live next to the database unless an absolute directory is configured
+        self.archive = TransactionArchive(
+            os.path.join(os.path.dirname(os.path.abspath(db_path)), config.get("archive", "archive_dir", fallback="archive")),
+            self.connection,
+            self.write,
+            max_age_days=config.getfloat("archive", "max_age_days", fallback=365),
+            segment_size=config.getint("archive", "segment_size", fallback=10000),
+            interval=config.getfloat("archive", "interval", fallback=3600)
+        )
+        if config.getboolean("archive", "enable_archive", fallback=False):
+            self.archive.start()
 
     def get_connection(self) -> sqlite3.Connection:
         """
-        Creates and returns a new SQLite database connection.
+        Creates and returns a new SQLite database connection with the [database] PRAGMAs applied.
+        The caller owns the connection and must close it; prefer `connection()` for pooled access.
 
         Returns:
             An SQLite Connection object with row factory set to sqlite3.Row.
@@ -31,13 +118,65 @@ class DataBase:
             sqlite3.Error if the connection cannot be established.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
             conn.row_factory = sqlite3.Row
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
             return conn
         except sqlite3.Error as e:
             logger.error(f"Database connection error: {e}")
             raise
 
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrows a long-lived connection from the pool for the duration of a `with` block.
+        A transaction that is still open when the block exits (e.g. because of an exception)
+        is rolled back before the connection goes back to the pool.
+
+        Yields:
+            A pooled SQLite Connection with row factory set to sqlite3.Row.
+        """
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    def pool_stats(self) -> Dict:
+        """Returns usage counters of the connection pool."""
+        return self.pool.stats()
+
+    def close(self):
+        """Stops the archiver and the group commit writer and closes all pooled connections."""
+        self.archive.stop()
+        if self.writer:
+            self.writer.stop()
+        self.pool.close_all()
+
+    def write(self, work):
+        """
+        Runs a unit of write work `work(conn)` in its own committed transaction and returns its result.
+        With [database] group_commit enabled the unit is handed to the group commit writer,
+        which commits it together with concurrently submitted units.
+        A unit that fails because the database is locked is rolled back and run again
+        after a jittered pause (see BusyRetry), so `work` must not have effects outside
+        the transaction that a second run would repeat wrongly.
+
+        Raises:
+            Whatever `work` raised, or sqlite3.Error if the commit fails.
+        """
+        if self.writer:
+            return self.busy_retry.run(lambda: self.writer.submit(work))
+
+        def attempt():
+            with self.connection() as conn:
+                result = work(conn)
+                conn.commit()
+                return result
+
+        return self.busy_retry.run(attempt)
+
     def init_database(self):
         """
         Creates necessary tables if they do not already exist.
@@ -69,6 +208,14 @@ class DataBase:
                     FOREIGN KEY (account_number) REFERENCES accounts(account_number)
                 )
             """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transactions_account
+                ON transactions (account_number, bank_code, id)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transactions_timestamp
+                ON transactions (timestamp)
+            """)
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS known_banks (
                     bank_code TEXT PRIMARY KEY,
@@ -112,43 +259,387 @@ class DataBase:
         Raises:
             sqlite3.Error if the query fails.
         """
-        conn = self.get_connection()
         try:
-            cursor = conn.cursor()
-            cursor.execute(query, params or ())
-            if fetch:
-                result = cursor.fetchall()
-            else:
-                result = cursor.lastrowid
-            conn.commit()
-            return result
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params or ())
+                if fetch:
+                    result = cursor.fetchall()
+                else:
+                    result = cursor.lastrowid
+                conn.commit()
+                return result
         except sqlite3.Error as e:
-            conn.rollback()
             logger.error(f"Query execution error: {e}")
             raise
-        finally:
-            conn.close()
+
+    def apply_posting(self, account_number: int, bank_code: str, amount: float,
+                      transaction_type: str, description: str) -> float:
+        """
+        Applies a deposit (positive amount) or withdrawal (negative amount) to an active account
+        and records it in the transactions table, both in one short transaction.
+
+        Args:
+            account_number: The account number.
+            bank_code: The bank code of the account.
+            amount: Signed amount; withdrawals never take the balance below zero.
+            transaction_type: Value stored in transactions.transaction_type (e.g. 'DEPOSIT').
+            description: Value stored in transactions.description.
+
+        Returns:
+            The new balance of the account.
+
+        Raises:
+            PostingError if the account is missing, inactive or has insufficient funds.
+            sqlite3.Error if the database operation fails.
+        """
+        key = (account_number, bank_code)
+
+        def work(conn: sqlite3.Connection):
+            balance = self.post(conn, account_number, bank_code, amount, transaction_type, description)
+            return balance, self.balances.stage(key) if self.balances else None
+
+        balance, version = self.write(work)
+        if self.balances:
+            self.balances.publish(key, balance, version)
+        return balance
+
+    def apply_postings(self, postings: List[Tuple[int, str, float, str, str]]) -> List[float]:
+        """
+        Applies several postings in one transaction: either all of them or none.
+
+        Args:
+            postings: (account number, bank code, signed amount, transaction type, description) tuples,
+                applied in order, so a withdrawal may use the funds of an earlier deposit.
+
+        Returns:
+            The balance of the account after each posting.
+
+        Raises:
+            PostingError with `leg` set to the index of the first posting that cannot be applied.
+            sqlite3.Error if the database operation fails.
+        """
+        def work(conn: sqlite3.Connection):
+            balances, final = [], {}
+            for leg, (account_number, bank_code, amount, transaction_type, description) in enumerate(postings):
+                try:
+                    balance = self.post(conn, account_number, bank_code, amount, transaction_type, description)
+                except PostingError as e:
+                    raise PostingError(e.reason, str(e), leg)
+                balances.append(balance)
+                final[(account_number, bank_code)] = balance
+            staged = {key: (balance, self.balances.stage(key)) for key, balance in final.items()} if self.balances else {}
+            return balances, staged
+
+        balances, staged = self.write(work)
+        for key, (balance, version) in staged.items():
+            self.balances.publish(key, balance, version)
+        return balances
+
+    def open_account(self, bank_code: str, balance: float = 0.0) -> int:
+        """
+        Creates a new active account with a number from the account number allocator
+        and records the initial deposit, if any, in the same transaction.
+        A number that turns out to be taken (e.g. by another node sharing the database file)
+        is skipped and the next one is tried.
+
+        Args:
+            bank_code: The bank code of the account.
+            balance: The initial balance.
+
+        Returns:
+            The new account number.
+
+        Raises:
+            ValueError if the account number range is exhausted.
+            sqlite3.Error if the database operation fails.
+        """
+        def work(conn: sqlite3.Connection, account_number: int) -> int:
+            conn.execute("""
+                INSERT INTO accounts (account_number, bank_code, balance, is_active)
+                VALUES (?, ?, ?, 1)
+            """, (account_number, bank_code, balance))
+
+            if balance > 0:
+                conn.execute("""
+                    INSERT INTO transactions
+                    (account_number, bank_code, amount, transaction_type, description)
+                    VALUES (?, ?, ?, 'INITIAL_DEPOSIT', 'Initial deposit')
+                """, (account_number, bank_code, balance))
+
+            return self.balances.stage((account_number, bank_code)) if self.balances else None
+
+        for _ in range(self.OPEN_ATTEMPTS):
+            account_number = self.allocator.allocate()
+            try:
+                version = self.write(lambda conn: work(conn, account_number))
+            except sqlite3.IntegrityError:
+                logger.warning(f"Account number {account_number} is already taken")
+                continue
+            except Exception:
+                self.allocator.release(account_number)
+                raise
+            if self.balances:
+                self.balances.publish((account_number, bank_code), float(balance), version)
+            return account_number
+        raise sqlite3.IntegrityError("No free account number found")
+
+    def remove_account(self, account_number: int, bank_code: str):
+        """
+        Closes an empty account: it is marked inactive and keeps its number and its postings,
+        so the ledger history stays intact and the number is never handed out again.
+
+        Args:
+            account_number: The account number.
+            bank_code: The bank code of the account.
+
+        Raises:
+            PostingError if the account does not exist (or is already closed) or still holds funds.
+            sqlite3.Error if the database operation fails.
+        """
+        def work(conn: sqlite3.Connection):
+            row = conn.execute("""
+                SELECT balance FROM accounts WHERE account_number = ? AND bank_code = ? AND is_active = 1
+            """, (account_number, bank_code)).fetchone()
+            if row is None:
+                raise PostingError(PostingError.NOT_FOUND, "Account not found")
+            if (row['balance'] or 0) > 0:
+                raise PostingError(PostingError.HAS_FUNDS, "Cannot delete bank account containing founds")
+
+            conn.execute("""
+                UPDATE accounts
+                SET is_active = 0, updated_at = CURRENT_TIMESTAMP
+                WHERE account_number = ? AND bank_code = ?
+            """, (account_number, bank_code))
+
+        self.write(work)
+        self.account_removed(account_number, bank_code)
+
+    def account_removed(self, account_number: int, bank_code: str):
+        """
+        Forgets the cached balance of a closed account.
+        Must be called after the removal was committed.
+        """
+        if self.balances:
+            self.balances.invalidate((account_number, bank_code))
+
+    def get_balance(self, account_number: int, bank_code: str) -> Optional[float]:
+        """
+        Returns the balance of an active account, served from the balance cache when possible.
+
+        Args:
+            account_number: The account number.
+            bank_code: The bank code of the account.
+
+        Returns:
+            The balance, or None if the account does not exist or is inactive.
+
+        Raises:
+            sqlite3.Error if the database query fails.
+        """
+        key = (account_number, bank_code)
+        if self.balances:
+            balance = self.balances.get(key)
+            if balance is not None:
+                return balance
+            token = self.balances.token()
+
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT balance FROM accounts
+                WHERE account_number = ? AND bank_code = ? AND is_active = 1
+            """, (account_number, bank_code)).fetchone()
+
+        if row is None:
+            return None
+        if self.balances:
+            self.balances.load(key, row['balance'], token)
+        return row['balance']
+
+    def iter_history(self, account_number: int, bank_code: str, after_id: int = 0,
+                     limit: int = 100) -> Iterator[Dict]:
+        """
+        Yields the postings of an account with an id greater than `after_id`, oldest first.
+
+        Live postings are read with a range seek on the (account_number, bank_code, id) index,
+        so the cost of a page does not grow with the length of the history. Archived postings
+        are merged in by id. Pass the id of the last posting of a page as `after_id` to get the
+        next page.
+
+        Args:
+            account_number: The account number.
+            bank_code: The bank code of the account.
+            after_id: Id of the last posting already seen.
+            limit: Maximum number of postings.
+
+        Yields:
+            Dictionaries with id, amount, transaction_type, description and timestamp.
+        """
+        archived = self.archive.iter_postings(account_number, bank_code, after_id)
+        yield from islice(heapq.merge(archived, self.iter_live_history(account_number, bank_code, after_id, limit),
+                                      key=lambda posting: posting['id']), limit)
+
+    def iter_live_history(self, account_number: int, bank_code: str, after_id: int, limit: int) -> Iterator[Dict]:
+        """Yields postings of an account from the transactions table only; see `iter_history`."""
+        with self.connection() as conn:
+            cursor = conn.execute("""
+                SELECT id, amount, transaction_type, description, timestamp
+                FROM transactions
+                WHERE account_number = ? AND bank_code = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (account_number, bank_code, after_id, limit))
+            for row in cursor:
+                yield dict(row)
+
+    def iter_postings_since(self, since: str, transaction_types: Tuple[str, ...]) -> Iterator[Tuple[int, str, float, str]]:
+        """
+        Yields (account number, bank code, amount, timestamp) of the live postings of the given
+        types made at or after `since`, oldest first, by a range scan of idx_transactions_timestamp.
+        """
+        placeholders = ", ".join("?" * len(transaction_types))
+        with self.connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT account_number, bank_code, amount, timestamp
+                FROM transactions
+                WHERE timestamp >= ? AND transaction_type IN ({placeholders})
+                ORDER BY timestamp, id
+            """, (since, *transaction_types))
+            while True:
+                rows = cursor.fetchmany(self.fetch_batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield tuple(row)
+
+    def account_exists(self, account_number: int, bank_code: str) -> bool:
+        """Returns True if the account exists, active or not."""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT 1 FROM accounts WHERE account_number = ? AND bank_code = ?
+            """, (account_number, bank_code)).fetchone() is not None
+
+    def warm_up(self, limit: int):
+        """Preloads the balance cache with the `limit` most recently updated active accounts."""
+        if not self.balances or limit <= 0:
+            return
+        token = self.balances.token()
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT account_number, bank_code, balance FROM accounts
+                WHERE is_active = 1
+                ORDER BY updated_at DESC
+                LIMIT ?
+            """, (min(limit, self.balances.max_entries),)).fetchall()
+        # oldest first, so the most recently updated accounts end up as the most recently used entries
+        for row in reversed(rows):
+            self.balances.load((row['account_number'], row['bank_code']), row['balance'], token)
+        logger.info(f"Balance cache warmed up with {len(rows)} accounts")
+
+    def post(self, conn: sqlite3.Connection, account_number: int, bank_code: str, amount: float,
+             transaction_type: str, description: str) -> float:
+        """
+        Applies a posting inside the caller's transaction without committing it.
+
+        The balance check and the update are one conditional statement, so concurrent
+        postings can neither lose updates nor both pass the funds check. The balance cache
+        is left to the caller, which stages the account here and publishes the balance once
+        the transaction committed.
+        See `apply_posting` for arguments, return value and exceptions.
+        """
+        if amount >= 0:
+            query = """
+                UPDATE accounts
+                SET balance = balance + ?, updated_at = CURRENT_TIMESTAMP
+                WHERE account_number = ? AND bank_code = ? AND is_active = 1
+            """
+            params = (amount, account_number, bank_code)
+        else:
+            query = """
+                UPDATE accounts
+                SET balance = balance - ?, updated_at = CURRENT_TIMESTAMP
+                WHERE account_number = ? AND bank_code = ? AND is_active = 1 AND balance >= ?
+            """
+            params = (-amount, account_number, bank_code, -amount)
+
+        if self.supports_returning:
+            rows = conn.execute(query + " RETURNING balance", params).fetchall()
+            new_balance = rows[0][0] if rows else None
+        else:
+            cursor = conn.execute(query, params)
+            new_balance = None
+            if cursor.rowcount:
+                new_balance = conn.execute("""
+                    SELECT balance FROM accounts WHERE account_number = ? AND bank_code = ?
+                """, (account_number, bank_code)).fetchone()[0]
+
+        if new_balance is None:
+            raise self.posting_failure(conn, account_number, bank_code)
+        # RETURNING yields the value before the REAL column affinity is applied
+        new_balance = float(new_balance)
+
+        conn.execute("""
+            INSERT INTO transactions (account_number, bank_code, amount, transaction_type, description)
+            VALUES (?, ?, ?, ?, ?)
+        """, (account_number, bank_code, abs(amount), transaction_type, description))
+        return new_balance
+
+    @staticmethod
+    def posting_failure(conn: sqlite3.Connection, account_number: int, bank_code: str) -> PostingError:
+        """Finds out why a conditional posting update matched no row."""
+        account = conn.execute("""
+            SELECT is_active FROM accounts WHERE account_number = ? AND bank_code = ?
+        """, (account_number, bank_code)).fetchone()
+        if account is None:
+            return PostingError(PostingError.NOT_FOUND, "Account not found")
+        if not account['is_active']:
+            return PostingError(PostingError.INACTIVE, "Account is not active")
+        return PostingError(PostingError.INSUFFICIENT_FUNDS, "Insufficient funds")
 
     def get_all_accounts(self) -> List[Dict]:
         """
         Retrieves all accounts from the database.
+        Materializes the whole table; use `iter_accounts` where the bank may be large.
 
         Returns:
             A list of dictionaries, each representing an account.
         """
-        conn = self.get_connection()
-        try:
+        return [account.to_dict() for account in self.iter_accounts()]
+
+    def iter_accounts(self, active_only: bool = False, after: int = 0, limit: int = None) -> Iterator[BankAccount]:
+        """
+        Yields accounts ordered by account number, reading them in `fetch_batch_size` batches.
+        Rows are turned into BankAccount records by the cursor's row factory, without a dict per row.
+
+        Only one batch is held in memory at a time. Pagination is keyset based on the
+        account number (the primary key): pass the last account number of a page as `after`.
+
+        Args:
+            active_only: Skip inactive accounts.
+            after: Only accounts with a greater account number are returned.
+            limit: Maximum number of accounts, None for all.
+
+        Yields:
+            BankAccount records.
+        """
+        query = f"""
+            SELECT {BankAccount.SELECT}
+            FROM accounts
+            WHERE account_number > ?
+        """
+        if active_only:
+            query += " AND is_active = 1"
+        query += " ORDER BY account_number LIMIT ?"
+
+        with self.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT account_number, bank_code, balance, is_active, 
-                       created_at, updated_at
-                FROM accounts
-                ORDER BY account_number
-            """)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-        finally:
-            conn.close()
+            cursor.row_factory = BankAccount.from_row
+            cursor.execute(query, (after, -1 if limit is None else limit))
+            while True:
+                rows = cursor.fetchmany(self.fetch_batch_size)
+                if not rows:
+                    break
+                yield from rows
 
     def get_bank_statistics(self, bank_code: str) -> Dict:
         """
@@ -162,39 +653,57 @@ class DataBase:
             average balance, max/min balance, total transactions, known banks,
             and active banks.
         """
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*) as total_accounts,
-                       SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_accounts,
-                       SUM(balance) as total_balance,
-                       AVG(balance) as avg_balance,
-                       MAX(balance) as max_balance,
-                       MIN(balance) as min_balance
-                FROM accounts
-                WHERE bank_code = ?
-            """, (bank_code,))
-            stats = dict(cursor.fetchone())
-            
-            cursor.execute("""
-                SELECT COUNT(*) as total_transactions
-                FROM transactions
-                WHERE bank_code = ?
-            """, (bank_code,))
-            stats.update(dict(cursor.fetchone()))
-            
-            cursor.execute("""
+        stats = self.account_statistics(bank_code)
+        stats.update(self.known_bank_statistics())
+        return stats
+
+    def account_statistics(self, bank_code: str) -> Dict:
+        """
+        Retrieves the account statistics of a bank (see `get_bank_statistics`).
+        Counts and totals are read from the maintained bank_aggregates row instead of
+        scanning the accounts and transactions tables; total_transactions includes
+        archived postings.
+        """
+        with self.connection() as conn:
+            aggregates = self.aggregates.bank(conn, bank_code)
+            count = aggregates['account_count']
+            stats = {
+                'total_accounts': count,
+                'active_accounts': aggregates['active_count'] if count else None,
+                'total_balance': aggregates['total_balance'] if count else None,
+                'avg_balance': aggregates['total_balance'] / count if count else None,
+                'max_balance': aggregates['max_balance'],
+                'min_balance': aggregates['min_balance'],
+                'total_transactions': aggregates['transaction_count'] + self.archive.count(bank_code)
+            }
+            return stats
+
+    def known_bank_statistics(self) -> Dict:
+        """Returns the number of known banks and of active known banks."""
+        with self.connection() as conn:
+            return dict(conn.execute("""
                 SELECT COUNT(*) as known_banks,
                        SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) as active_banks
                 FROM known_banks
-            """)
-            stats.update(dict(cursor.fetchone()))
-            
-            return stats
-        finally:
-            conn.close()
+            """).fetchone())
+
+    def totals(self) -> Dict:
+        """Returns account_count, active_count and total_balance over all bank codes from the maintained aggregates."""
+        return self.aggregates.totals()
+
+    def storage_stats(self) -> Dict:
+        """Returns the counters of the pool, allocator, caches, writer and archive."""
+        stats = {
+            'db_pool': self.pool_stats(),
+            'account_numbers': self.allocator.stats(),
+            'busy_retry': self.busy_retry.stats()
+        }
+        if self.balances:
+            stats['balance_cache'] = self.balances.stats()
+        if self.writer:
+            stats['group_commit'] = self.writer.stats()
+        stats['archive'] = self.archive.stats()
+        return stats
 
 
 
@@ -0,0 +1,193 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, ContextManager, Dict
+
+from core.logger import setup_core_logging
+from network.remote_cache import SingleFlight
+
+logger = setup_core_logging()
+
+
+class IdempotencyStore:
+    """
+    Remembers the responses of requests sent with an idempotency key and replays them on retries.
+
+    The newest `max_entries` keys of the last `ttl` seconds are held in memory (least recently
+    used evicted first) and persisted to the idempotency_keys table, so a retry reaching a
+    restarted node is still recognized. Concurrent requests with the same key are coalesced:
+    one executes, the others receive its response.
+
+    Only successful responses are remembered. A failed request moved no money, so running its
+    retry again is safe and lets the retry succeed once the cause (e.g. an unreachable bank) is gone.
+    The key is persisted right after the posting, not in its transaction: a crash between the two
+    forgets the key of that one request.
+
+    A request that sends postings to other banks under keys derived from its own (AT, AP) also
+    needs its failed attempts counted: the legs of a failed attempt were applied and reversed
+    under their keys, so a retry must derive new ones (see `failed_attempts`).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            request TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """
+    ATTEMPTS_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS idempotency_attempts (
+            key TEXT PRIMARY KEY,
+            failures INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """
+    PURGE_EVERY = 1000
+
+    def __init__(self, connection: Callable[[], ContextManager[sqlite3.Connection]],
+                 write: Callable[[Callable[[sqlite3.Connection], object]], object],
+                 max_entries: int = 10000, ttl: float = 86400):
+        """
+        Args:
+            connection: Factory of a context manager yielding a database connection.
+            write: Function running a unit of write work in its own committed transaction.
+            max_entries: Maximum number of keys held in memory.
+            ttl: Seconds a key is remembered.
+        """
+        self.connection = connection
+        self.write = write
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.flights = SingleFlight()
+
+        self.stored = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+        self.load()
+
+    def load(self):
+        """Creates the table and loads the keys that have not expired."""
+        with self.connection() as conn:
+            conn.execute(self.SCHEMA)
+            conn.execute(self.ATTEMPTS_SCHEMA)
+            conn.commit()
+            rows = conn.execute("""
+                SELECT key, request, response, created_at
+                FROM idempotency_keys
+                WHERE created_at > ?
+                ORDER BY created_at DESC
+                LIMIT ?
+            """, (time.time() - self.ttl, self.max_entries)).fetchall()
+        with self.lock:
+            self.entries = OrderedDict((row['key'], (row['request'], row['response'], row['created_at']))
+                                       for row in reversed(rows))
+        logger.info(f"Loaded {len(rows)} idempotency keys")
+
+    def run(self, key: str, request: str, execute: Callable[[], str]) -> str:
+        """
+        Returns the remembered response of `key`, or executes the request and remembers its response.
+
+        Args:
+            key: The idempotency key sent by the client.
+            request: The request without the key; a key may only be reused for the same request.
+            execute: Function executing the request and returning the formatted response.
+
+        Raises:
+            ValueError if the key was used for a different request.
+        """
+        response = self.lookup(key, request)
+        if response is not None:
+            return response
+        return self.flights.do(key, lambda: self._execute(key, request, execute))
+
+    def lookup(self, key: str, request: str):
+        """Returns the remembered response of `key`, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.time() - self.ttl:
+                del self.entries[key]
+                return None
+            if entry[0] != request:
+                self.conflicts += 1
+                raise ValueError("Idempotency key was already used for a different request")
+            self.entries.move_to_end(key)
+            self.replayed += 1
+            return entry[1]
+
+    def _execute(self, key: str, request: str, execute: Callable[[], str]) -> str:
+        # a request with the same key may have completed while this one waited to lead
+        response = self.lookup(key, request)
+        if response is not None:
+            return response
+
+        response = execute()
+        if not response.startswith("ER"):
+            self.remember(key, request, response)
+        return response
+
+    def remember(self, key: str, request: str, response: str):
+        """Stores a response in memory and in the idempotency_keys table."""
+        created_at = time.time()
+        with self.lock:
+            self.entries[key] = (request, response, created_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.stored += 1
+            purge = self.stored % self.PURGE_EVERY == 0
+
+        def work(conn: sqlite3.Connection):
+            conn.execute("""
+                INSERT OR REPLACE INTO idempotency_keys (key, request, response, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, request, response, created_at))
+            if purge:
+                conn.execute("DELETE FROM idempotency_keys WHERE created_at <= ?", (created_at - self.ttl,))
+                conn.execute("DELETE FROM idempotency_attempts WHERE updated_at <= ?", (created_at - self.ttl,))
+
+        try:
+            self.write(work)
+        except sqlite3.Error as e:
+            logger.error(f"Cannot persist idempotency key {key}: {e}")
+
+    def failed_attempts(self, key: str) -> int:
+        """Returns the number of failed executions of `key`; the first attempt of a request sees 0."""
+        with self.connection() as conn:
+            row = conn.execute("SELECT failures FROM idempotency_attempts WHERE key = ?", (key,)).fetchone()
+        return row['failures'] if row else 0
+
+    def record_failure(self, key: str):
+        """
+        Counts a failed execution of `key` before its failure is answered, so the retry of the
+        request starts a new attempt. An execution interrupted by a crash is not counted; its
+        retry reuses the keys of the interrupted attempt and completes it.
+
+        Raises:
+            sqlite3.Error if the failure cannot be persisted.
+        """
+        def work(conn: sqlite3.Connection):
+            conn.execute("""
+                INSERT INTO idempotency_attempts (key, failures, updated_at) VALUES (?, 1, ?)
+                ON CONFLICT(key) DO UPDATE SET failures = failures + 1, updated_at = excluded.updated_at
+            """, (key, time.time()))
+
+        self.write(work)
+
+    def stats(self) -> Dict:
+        """Returns key counters."""
+        with self.lock:
+            stats = {
+                'keys': len(self.entries),
+                'stored': self.stored,
+                'replayed': self.replayed,
+                'conflicts': self.conflicts
+            }
+        stats['coalesced'] = self.flights.stats()['coalesced']
+        return stats
@@ -0,0 +1,167 @@
+import calendar
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Tuple
+
+from core.logger import setup_core_logging, config
+
+logger = setup_core_logging()
+
+
+class LimitExceeded(ValueError):
+    """Raised when a posting would exceed a daily limit of its account."""
+
+
+class DailyLimits:
+    """
+    Sliding-window limits on the number and total amount of an account's postings.
+
+    For every account the postings of the last `window` seconds are kept in memory as
+    (time, amount) pairs together with their running sum, so a check only drops expired
+    pairs and compares two numbers. The window slides: a posting counts for exactly 24 hours
+    after it was made, not until midnight. The counters are rebuilt from the ledger at startup.
+
+    Callers serialize `check` and `record` of one account (P2PNetwork holds the account lock),
+    so two postings cannot both pass the check for the last free slot.
+    """
+
+    WINDOW = 86400
+    TRANSACTION_TYPES = ("DEPOSIT", "WITHDRAWAL", "TRANSFER_IN", "TRANSFER_OUT")
+    SWEEP_EVERY = 10000
+
+    def __init__(self, max_transactions: int = 0, max_amount: float = 0, window: float = WINDOW):
+        """
+        Args:
+            max_transactions: Maximum postings per account in the window, 0 for no limit.
+            max_amount: Maximum total amount per account in the window, 0 for no limit.
+            window: Length of the window in seconds.
+        """
+        self.max_transactions = max_transactions
+        self.max_amount = max_amount
+        self.window = window
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.records = 0
+
+        self.checks = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls) -> "DailyLimits":
+        """Creates the limits from the [transactions] section of config.ini."""
+        return cls(
+            max_transactions=config.getint("transactions", "max_daily_transactions", fallback=0),
+            max_amount=config.getfloat("transactions", "max_daily_amount", fallback=0)
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_transactions > 0 or self.max_amount > 0
+
+    def rebuild(self, postings: Iterable[Tuple[int, str, float, str]]):
+        """
+        Replaces the counters with the postings of the current window.
+
+        Args:
+            postings: (account number, bank code, amount, UTC timestamp) of the postings made since
+                `since()`, oldest first, as returned by AccountStore.iter_postings_since.
+        """
+        windows = {}
+        count = 0
+        for account_number, bank_code, amount, timestamp in postings:
+            entry = windows.setdefault((account_number, bank_code), [deque(), 0.0])
+            entry[0].append((calendar.timegm(time.strptime(timestamp, "%Y-%m-%d %H:%M:%S")), abs(amount)))
+            entry[1] += abs(amount)
+            count += 1
+        with self.lock:
+            self.windows = windows
+        logger.info(f"Daily limits rebuilt from {count} postings of {len(windows)} accounts")
+
+    def since(self) -> str:
+        """Returns the UTC timestamp where the current window starts."""
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - self.window))
+
+    def _current(self, key: Tuple[int, str], now: float):
+        """Returns the window of an account with expired postings dropped. Caller holds the lock."""
+        entry = self.windows.get(key)
+        if entry is None:
+            return None
+        postings, cutoff = entry[0], now - self.window
+        while postings and postings[0][0] <= cutoff:
+            entry[1] -= postings.popleft()[1]
+        if not postings:
+            del self.windows[key]
+            return None
+        return entry
+
+    def check(self, account_number: int, bank_code: str, amount: float, postings: int = 1):
+        """
+        Checks that `postings` more postings of together `amount` keep the account within its limits.
+
+        Raises:
+            LimitExceeded naming the limit that would be exceeded.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.checks += 1
+            entry = self._current((account_number, bank_code), time.time())
+            count, total = (len(entry[0]), entry[1]) if entry else (0, 0.0)
+            if self.max_transactions > 0 and count + postings > self.max_transactions:
+                self.rejected += 1
+                raise LimitExceeded(f"Daily transaction limit of {self.max_transactions} reached")
+            if self.max_amount > 0 and total + abs(amount) > self.max_amount:
+                self.rejected += 1
+                raise LimitExceeded(f"Daily amount limit of ${self.max_amount:,.2f} exceeded "
+                                    f"(${self.max_amount - total:,.2f} left)")
+
+    def record(self, account_number: int, bank_code: str, amount: float):
+        """Counts an applied posting."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self.lock:
+            entry = self._current((account_number, bank_code), now)
+            if entry is None:
+                entry = self.windows[(account_number, bank_code)] = [deque(), 0.0]
+            entry[0].append((now, abs(amount)))
+            entry[1] += abs(amount)
+            self.records += 1
+            if self.records % self.SWEEP_EVERY == 0:
+                for key in list(self.windows):
+                    self._current(key, now)
+
+    def release(self, account_number: int, bank_code: str, amount: float):
+        """Stops counting the newest posting of `amount`, e.g. a transfer leg that was reversed."""
+        if not self.enabled:
+            return
+        amount = abs(amount)
+        with self.lock:
+            entry = self.windows.get((account_number, bank_code))
+            if entry is None:
+                return
+            postings = entry[0]
+            for index in range(len(postings) - 1, -1, -1):
+                if postings[index][1] == amount:
+                    del postings[index]
+                    entry[1] -= amount
+                    break
+            if not postings:
+                del self.windows[(account_number, bank_code)]
+
+    def forget(self, account_number: int, bank_code: str):
+        """Drops the counters of a removed account, whose number may be reused."""
+        with self.lock:
+            self.windows.pop((account_number, bank_code), None)
+
+    def stats(self) -> Dict:
+        """Returns the limits and check counters."""
+        with self.lock:
+            return {
+                'max_transactions': self.max_transactions,
+                'max_amount': self.max_amount,
+                'tracked_accounts': len(self.windows),
+                'checks': self.checks,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,161 @@
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Tuple, TypeVar
+
+from core.logger import setup_core_logging
+
+logger = setup_core_logging()
+
+T = TypeVar("T")
+
+
+class AccountLocks:
+    """
+    Striped per-account locks.
+
+    An account maps to one of `stripes` locks by the hash of its key, so operations on the
+    same account run one after another while operations on different accounts rarely wait
+    for each other. The number of locks stays fixed however many accounts exist.
+    """
+
+    def __init__(self, stripes: int = 64):
+        """
+        Args:
+            stripes: Number of locks the accounts are spread over.
+        """
+        self.stripes = [threading.Lock() for _ in range(max(1, stripes))]
+        self.stats_lock = threading.Lock()
+
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stripe(self, account_number: int, bank_code: str) -> int:
+        return hash((account_number, bank_code)) % len(self.stripes)
+
+    @contextmanager
+    def hold(self, account_number: int, bank_code: str) -> Iterator[None]:
+        """Holds the lock of an account for the duration of a `with` block."""
+        index = self.stripe(account_number, bank_code)
+        self._acquire(index)
+        try:
+            yield
+        finally:
+            self.stripes[index].release()
+
+    @contextmanager
+    def hold_many(self, accounts: Iterable[Tuple[int, str]]) -> Iterator[None]:
+        """
+        Holds the locks of several accounts for the duration of a `with` block.
+        Stripes are taken in ascending order, so two callers never wait for each other crosswise.
+        """
+        indexes = sorted({self.stripe(account_number, bank_code) for account_number, bank_code in accounts})
+        acquired = []
+        try:
+            for index in indexes:
+                self._acquire(index)
+                acquired.append(index)
+            yield
+        finally:
+            for index in reversed(acquired):
+                self.stripes[index].release()
+
+    def _acquire(self, index: int):
+        lock = self.stripes[index]
+        waited = 0.0
+        if not lock.acquire(blocking=False):
+            started = time.monotonic()
+            lock.acquire()
+            waited = time.monotonic() - started
+
+        with self.stats_lock:
+            self.acquisitions += 1
+            if waited:
+                self.contended += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def stats(self) -> Dict:
+        """Returns acquisition and wait counters; wait times are in milliseconds."""
+        with self.stats_lock:
+            return {
+                'stripes': len(self.stripes),
+                'acquisitions': self.acquisitions,
+                'contended': self.contended,
+                'wait_total_ms': self.wait_total * 1000,
+                'wait_avg_ms': self.wait_total * 1000 / self.contended if self.contended else 0.0,
+                'wait_max_ms': self.wait_max * 1000
+            }
+
+
+class BusyRetry:
+    """
+    Retries a unit of database work that failed because the database was locked.
+
+    SQLite's busy timeout already waits for the lock inside a statement; this covers the cases it
+    cannot (a deferred transaction upgraded to a write, a lock held longer than the timeout). The
+    pause before attempt n is a random time up to `base_delay_ms` * 2^n, capped at `max_delay_ms`,
+    so threads that failed together do not retry together.
+    """
+
+    BUSY_MESSAGES = ("database is locked", "database table is locked", "database is busy")
+
+    def __init__(self, attempts: int = 5, base_delay_ms: float = 10, max_delay_ms: float = 500):
+        """
+        Args:
+            attempts: Retries after the first attempt.
+            base_delay_ms: Upper bound of the first pause.
+            max_delay_ms: Upper bound of any pause.
+        """
+        self.attempts = max(0, attempts)
+        self.base_delay = base_delay_ms / 1000
+        self.max_delay = max_delay_ms / 1000
+        self.lock = threading.Lock()
+
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+
+    @classmethod
+    def is_busy(cls, error: sqlite3.Error) -> bool:
+        return isinstance(error, sqlite3.OperationalError) and str(error).lower() in cls.BUSY_MESSAGES
+
+    def run(self, work: Callable[[], T]) -> T:
+        """
+        Calls `work` until it succeeds, fails for another reason or the attempts are used up.
+
+        Raises:
+            Whatever the last attempt raised.
+        """
+        for attempt in range(self.attempts + 1):
+            try:
+                result = work()
+            except sqlite3.OperationalError as e:
+                if not self.is_busy(e):
+                    raise
+                if attempt == self.attempts:
+                    with self.lock:
+                        self.exhausted += 1
+                    logger.error(f"Database still locked after {self.attempts} retries")
+                    raise
+                with self.lock:
+                    self.retries += 1
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            if attempt:
+                with self.lock:
+                    self.recovered += 1
+            return result
+
+    def stats(self) -> Dict:
+        """Returns retry counters."""
+        with self.lock:
+            return {
+                'retries': self.retries,
+                'recovered': self.recovered,
+                'exhausted': self.exhausted
+            }
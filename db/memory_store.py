@@ -0,0 +1,684 @@
+import bisect
+import heapq
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.logger import setup_core_logging
+from db.allocator import AccountNumberAllocator
+from db.database import PostingError
+from db.models import BankAccount
+from db.storage import AccountStore
+
+logger = setup_core_logging()
+
+
+class Journal:
+    """
+    Append-only journal of JSON lines with batched fsync.
+
+    Records are appended to an in-memory buffer in the order the store accepted them. A caller then
+    waits in `wait` until its record is durable; the first waiting thread writes and fsyncs everything
+    buffered so far, so concurrent callers share one fsync.
+
+    When a write fails, the partly written batch is cut off the file again and every record appended
+    so far fails; `failures` is increased, so the store can drop the changes it staged for them.
+    Later records are written normally. Only when the file cannot be cut back is the journal unusable.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.file = open(path, "ab", buffering=0)
+        self.size = os.path.getsize(path)
+        self.condition = threading.Condition()
+        self.buffer = []
+        self.appended = 0
+        self.durable = 0
+        self.failed = 0
+        self.failures = 0
+        self.flushing = False
+        self.error = None
+        self.broken = None
+
+        self.flushes = 0
+        self.records = 0
+
+    def append(self, record: Dict, epoch: int) -> int:
+        """
+        Buffers a record and returns its position for `wait`.
+
+        Args:
+            record: The record.
+            epoch: The `failures` count the record was prepared under.
+
+        Raises:
+            sqlite3.OperationalError if a write failed since (the record may depend on a lost one)
+            or the journal is unusable.
+        """
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self.condition:
+            if self.broken:
+                raise sqlite3.OperationalError(f"Journal is unusable: {self.broken}")
+            if epoch != self.failures:
+                raise sqlite3.OperationalError(f"Journal write failed: {self.error}")
+            self.buffer.append(line)
+            self.appended += 1
+            return self.appended
+
+    def wait(self, position: int):
+        """
+        Blocks until the record at `position` is written (and fsynced).
+
+        Raises:
+            sqlite3.OperationalError if writing the record failed.
+        """
+        with self.condition:
+            while self.durable < position:
+                if position <= self.failed:
+                    raise sqlite3.OperationalError(f"Journal write failed: {self.error}")
+                if self.broken:
+                    raise sqlite3.OperationalError(f"Journal is unusable: {self.broken}")
+                if self.flushing:
+                    self.condition.wait()
+                    continue
+                self.flushing = True
+                lines, self.buffer = self.buffer, []
+                target = self.appended
+                self.condition.release()
+                try:
+                    data = memoryview(b"".join(lines))
+                    while data:
+                        data = data[self.file.write(data):]
+                    if self.fsync:
+                        os.fsync(self.file.fileno())
+                except OSError as e:
+                    error = e
+                else:
+                    error = None
+                finally:
+                    self.condition.acquire()
+                self.flushing = False
+                if error:
+                    self._fail(error)
+                else:
+                    self.durable = target
+                    self.size += sum(len(line) for line in lines)
+                    self.flushes += 1
+                    self.records += len(lines)
+                self.condition.notify_all()
+
+    def _fail(self, error: OSError):
+        """Fails every record appended so far after a write error. Caller holds the condition."""
+        logger.error(f"Journal write failed: {error}")
+        try:
+            self.file.truncate(self.size)
+        except OSError as e:
+            logger.error(f"Cannot cut the failed write off {self.path}: {e}")
+            self.broken = e
+        self.error = error
+        self.failed = self.appended
+        self.buffer = []
+        self.failures += 1
+
+    def pause(self):
+        """Waits for a running write and keeps further writes from starting until `resume`."""
+        with self.condition:
+            while self.flushing:
+                self.condition.wait()
+            self.flushing = True
+
+    def resume(self):
+        with self.condition:
+            self.flushing = False
+            self.condition.notify_all()
+
+    def truncate(self):
+        """Empties the journal after a snapshot. Caller paused the journal and applied everything written."""
+        with self.condition:
+            self.file.truncate(0)
+            self.size = 0
+            if self.fsync:
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        with self.condition:
+            self.file.close()
+
+    def stats(self) -> Dict:
+        with self.condition:
+            return {
+                'flushes': self.flushes,
+                'records': self.records,
+                'average_batch': self.records / self.flushes if self.flushes else 0.0,
+                'buffered': len(self.buffer),
+                'failures': self.failures
+            }
+
+
+class _Account:
+    __slots__ = ("balance", "is_active", "created_at", "updated_at")
+
+    def __init__(self, balance: float, is_active: int, created_at: str, updated_at: str):
+        self.balance = balance
+        self.is_active = is_active
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+
+class MemoryAccountStore(AccountStore):
+    """
+    Account store that keeps accounts and postings in memory.
+
+    A change is checked and appended to <path>.journal under one lock, so the journal order is
+    the order of the changes; the caller is answered once its record is durable (fsync batched
+    across concurrent callers). Only then is the change applied to the state that readers see.
+    Until that point it is only staged: later changes are checked against the staged accounts,
+    and when the journal write fails the staged changes are dropped.
+
+    Every `snapshot_every` records a snapshot is taken: the accounts go to <path>.snapshot and the
+    postings made since the previous snapshot to a new <path>.postings.<seq> segment, then the
+    journal is emptied; writes wait while the snapshot is taken. On startup the snapshot is loaded
+    and the journal replayed; a torn last line is discarded.
+
+    Only the postings made since the last snapshot are held in memory. A segment stores its
+    postings grouped by account, and its index (<segment>.index) the byte range of every account,
+    so the history of an account reads just its ranges. The memory kept per account is one range
+    per segment it appears in, not one entry per posting.
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 10000, fsync: bool = True):
+        """
+        Args:
+            path: Path prefix of the journal, snapshot and posting segment files.
+            snapshot_every: Number of journal records after which a snapshot is taken.
+            fsync: fsync the journal before answering.
+        """
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.snapshot_path = path + ".snapshot"
+        self.snapshot_every = max(1, snapshot_every)
+        self.fsync = fsync
+        self.lock = threading.RLock()
+
+        # state seen by readers: contains only journaled changes
+        self.accounts = {}
+        self.postings = {}  # made since the last snapshot
+        self.history = {}  # byte ranges of older postings in the segments
+        self.banks = {}
+        self.extremes = {}
+        self.next_number = AccountNumberAllocator.FIRST
+        self.next_posting_id = 1
+        self.seq = 0
+        self.since_snapshot = 0
+        self.snapshots = 0
+        self.segments = []
+
+        # changes appended to the journal but not yet durable
+        self.pending = deque()
+        self.staged = {}
+        self.staged_refs = {}
+
+        self.load()
+        self.journal = Journal(self.journal_path, fsync)
+        self.epoch = self.journal.failures
+        self._reset_staged()
+
+    # ---- persistence ----
+
+    def load(self):
+        """Loads the snapshot and the indexes of its posting segments and replays the journal."""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.seq = snapshot['seq']
+            self.next_number = snapshot['next_number']
+            self.next_posting_id = snapshot['next_posting_id']
+            for number, bank_code, balance, is_active, created_at, updated_at in snapshot['accounts']:
+                self._add_account(number, bank_code, balance, is_active, created_at, updated_at)
+            for bank_code, count in snapshot['transactions'].items():
+                self.banks.setdefault(bank_code, [0, 0, 0.0, 0])[3] = count
+            self.segments = snapshot['segments']
+            for segment in self.segments:
+                with open(self._segment_path(segment['file']) + ".index", encoding="utf-8") as f:
+                    for number, bank_code, offset, length, last_id in json.load(f):
+                        self.history.setdefault((number, bank_code), []).append(
+                            (segment['file'], offset, length, last_id))
+
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            good = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Discarding torn record at the end of {self.journal_path}")
+                        break
+                    good += len(line)
+                    if record['seq'] > self.seq:
+                        self._apply(record)
+                        replayed += 1
+            if good != os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good)
+        self.since_snapshot = replayed
+        logger.info(f"Memory store loaded: {len(self.accounts)} accounts, {replayed} journal records replayed")
+
+    def snapshot(self):
+        """
+        Writes the accounts and the postings made since the previous snapshot, then empties the journal.
+        A failed snapshot is logged and leaves the journal as it is.
+        """
+        with self.lock:
+            self.journal.pause()
+            try:
+                self._sync()
+                segments, ranges = list(self.segments), []
+                if self.postings:
+                    segment, ranges = self._write_segment(f"{os.path.basename(self.path)}.postings.{self.seq}")
+                    segments.append(segment)
+                state = {
+                    'seq': self.seq,
+                    'next_number': self.next_number,
+                    'next_posting_id': self.next_posting_id,
+                    'accounts': [[n, b, a.balance, a.is_active, a.created_at, a.updated_at]
+                                 for (n, b), a in self.accounts.items()],
+                    'transactions': {bank_code: bank[3] for bank_code, bank in self.banks.items()},
+                    'segments': segments
+                }
+                self._write_file(self.snapshot_path, json.dumps(state, separators=(",", ":")).encode("utf-8"))
+                # the postings are on disk now and leave memory
+                for number, bank_code, offset, length, last_id in ranges:
+                    self.history.setdefault((number, bank_code), []).append(
+                        (segments[-1]['file'], offset, length, last_id))
+                self.segments, self.postings = segments, {}
+                self.snapshots += 1
+                self.journal.truncate()
+                self.since_snapshot = 0
+            except OSError as e:
+                logger.error(f"Snapshot of {self.path} failed: {e}")
+            finally:
+                self.journal.resume()
+
+    def _write_segment(self, name: str) -> Tuple[Dict, List]:
+        """
+        Writes the postings held in memory to a segment grouped by account, and its index.
+        Returns the segment entry of the snapshot and the (number, bank code, offset, length,
+        last posting id) range of every account. Caller holds the lock.
+        """
+        lines, ranges, offset, times = [], [], 0, []
+        for (number, bank_code), postings in sorted(self.postings.items()):
+            length = 0
+            for posting_id, amount, transaction_type, description, timestamp in postings:
+                line = (json.dumps([number, bank_code, posting_id, amount, transaction_type, description, timestamp],
+                                   ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+                lines.append(line)
+                length += len(line)
+                times.append(timestamp)
+            ranges.append([number, bank_code, offset, length, postings[-1][0]])
+            offset += length
+
+        path = self._segment_path(name)
+        self._write_file(path, b"".join(lines))
+        self._write_file(path + ".index", json.dumps(ranges, separators=(",", ":")).encode("utf-8"))
+        return {'file': name, 'count': len(lines), 'min_time': min(times), 'max_time': max(times)}, ranges
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(os.path.dirname(self.path), name)
+
+    def _read_segment(self, name: str, offset: int = 0, length: int = None) -> Iterator[List]:
+        """Yields the posting rows stored in a byte range of a segment (the whole segment by default)."""
+        with open(self._segment_path(name), "rb") as f:
+            f.seek(offset)
+            data = f.read() if length is None else f.read(length)
+        for line in data.splitlines():
+            yield json.loads(line)
+
+    def _write_file(self, path: str, data: bytes):
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _commit(self, record: Dict) -> int:
+        """Appends a checked record to the journal and stages it. Caller holds the lock."""
+        record['seq'] = self.next_seq
+        position = self.journal.append(record, self.epoch)
+        self.next_seq += 1
+        self._stage(record)
+        self.pending.append((position, record))
+        return position
+
+    def _durable(self, position: int):
+        """Waits for the journal, applies the durable records and takes a snapshot when it is due."""
+        self.journal.wait(position)
+        with self.lock:
+            self._sync()
+            if self.since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    def _sync(self):
+        """
+        Applies the pending records that became durable, in journal order, and drops the staged
+        changes lost with a failed journal write. Caller holds the lock.
+        """
+        durable = self.journal.durable
+        while self.pending and self.pending[0][0] <= durable:
+            _, record = self.pending.popleft()
+            self._apply(record)
+            self.since_snapshot += 1
+            for key in self._keys(record):
+                self.staged_refs[key] -= 1
+                if not self.staged_refs[key]:
+                    del self.staged_refs[key]
+                    del self.staged[key]
+        if self.journal.failures != self.epoch:
+            # everything still pending was appended before the failure and failed with it
+            self.epoch = self.journal.failures
+            self._reset_staged()
+
+    def _reset_staged(self):
+        self.pending.clear()
+        self.staged.clear()
+        self.staged_refs.clear()
+        self.next_seq = self.seq + 1
+        self.next_staged_number = self.next_number
+        self.next_staged_posting_id = self.next_posting_id
+
+    @staticmethod
+    def _keys(record: Dict) -> set:
+        if record['op'] == "batch":
+            return {(number, bank_code) for number, bank_code, *_ in record['postings']}
+        return {(record['n'], record['b'])}
+
+    def _view(self, key) -> Optional[_Account]:
+        """Returns an account with the staged changes, for checking the next change. Caller holds the lock."""
+        account = self.staged.get(key)
+        return account if account is not None else self.accounts.get(key)
+
+    def _stage(self, record: Dict):
+        op = record['op']
+        if op == "batch":
+            postings = [(n, b, posting_id, amount) for n, b, posting_id, amount, *_ in record['postings']]
+        elif op in ("open", "post") and record.get('id'):
+            postings = [(record['n'], record['b'], record['id'], record['amt'])]
+        else:
+            postings = []
+
+        for key in self._keys(record):
+            if key not in self.staged:
+                account = self.accounts.get(key)
+                self.staged[key] = _Account(0.0, 1, record['ts'], record['ts']) if account is None else \
+                    _Account(account.balance, account.is_active, account.created_at, account.updated_at)
+            self.staged_refs[key] = self.staged_refs.get(key, 0) + 1
+        if op == "open":
+            self.next_staged_number = max(self.next_staged_number, record['n'] + 1)
+        elif op == "remove":
+            self.staged[(record['n'], record['b'])].is_active = 0
+        for number, bank_code, posting_id, amount in postings:
+            self.staged[(number, bank_code)].balance += amount
+            self.next_staged_posting_id = max(self.next_staged_posting_id, posting_id + 1)
+
+    def _apply(self, record: Dict):
+        op = record['op']
+        self.seq = max(self.seq, record['seq'])
+        if op == "batch":
+            for number, bank_code, posting_id, amount, transaction_type, description in record['postings']:
+                self._post(number, bank_code, posting_id, amount, transaction_type, description, record['ts'])
+            return
+
+        key = (record['n'], record['b'])
+        if op == "open":
+            self._add_account(record['n'], record['b'], 0.0, 1, record['ts'], record['ts'])
+            self.next_number = max(self.next_number, record['n'] + 1)
+        if op in ("open", "post") and record.get('id'):
+            self._post(record['n'], record['b'], record['id'], record['amt'], record['type'], record['desc'], record['ts'])
+        elif op == "remove":
+            account = self.accounts[key]
+            self.banks[key[1]][1] -= account.is_active == 1
+            account.is_active = 0
+            account.updated_at = record['ts']
+
+    def _post(self, number: int, bank_code: str, posting_id: int, amount: float,
+              transaction_type: str, description: str, timestamp: str):
+        key = (number, bank_code)
+        account = self.accounts[key]
+        self._set_balance(key, account, account.balance + amount)
+        account.updated_at = timestamp
+        self._add_posting(number, bank_code, posting_id, abs(amount), transaction_type, description, timestamp)
+        self.next_posting_id = max(self.next_posting_id, posting_id + 1)
+
+    def _add_account(self, number: int, bank_code: str, balance: float, is_active: int,
+                     created_at: str, updated_at: str):
+        self.accounts[(number, bank_code)] = _Account(balance, is_active, created_at, updated_at)
+        bank = self.banks.setdefault(bank_code, [0, 0, 0.0, 0])
+        bank[0] += 1
+        bank[1] += is_active == 1
+        bank[2] += balance
+        self._track_balance(number, bank_code, balance)
+
+    def _add_posting(self, number: int, bank_code: str, posting_id: int, amount: float,
+                     transaction_type: str, description: str, timestamp: str):
+        self.postings.setdefault((number, bank_code), []).append(
+            (posting_id, amount, transaction_type, description, timestamp))
+        self.banks.setdefault(bank_code, [0, 0, 0.0, 0])[3] += 1
+
+    def _set_balance(self, key, account: _Account, balance: float):
+        self.banks[key[1]][2] += balance - account.balance
+        account.balance = balance
+        self._track_balance(key[0], key[1], balance)
+
+    def _track_balance(self, number: int, bank_code: str, balance: float):
+        """
+        Records a new balance in the bank's min and max heaps. Entries of older balances are
+        dropped lazily by `_balance_range`; the heaps are rebuilt when they grow to twice the
+        number of accounts.
+        """
+        low, high = self.extremes.setdefault(bank_code, ([], []))
+        heapq.heappush(low, (balance, number))
+        heapq.heappush(high, (-balance, number))
+        if len(low) > 2 * self.banks[bank_code][0] + 64:
+            low[:] = [(account.balance, n) for (n, b), account in self.accounts.items() if b == bank_code]
+            high[:] = [(-value, n) for value, n in low]
+            heapq.heapify(low)
+            heapq.heapify(high)
+
+    def _balance_range(self, bank_code: str) -> Tuple[Optional[float], Optional[float]]:
+        """Returns the lowest and highest balance of the bank's accounts. Caller holds the lock."""
+        low, high = self.extremes.get(bank_code, ([], []))
+        while low and self.accounts[(low[0][1], bank_code)].balance != low[0][0]:
+            heapq.heappop(low)
+        while high and self.accounts[(high[0][1], bank_code)].balance != -high[0][0]:
+            heapq.heappop(high)
+        return (low[0][0] if low else None), (-high[0][0] if high else None)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    # ---- AccountStore ----
+
+    def open_account(self, bank_code: str, balance: float = 0.0) -> int:
+        with self.lock:
+            self._sync()
+            if self.next_staged_number > AccountNumberAllocator.LAST:
+                raise ValueError("Bank account limit reached")
+            number = self.next_staged_number
+
+            record = {'op': "open", 'n': number, 'b': bank_code, 'ts': self._now()}
+            if balance > 0:
+                record.update(id=self.next_staged_posting_id, amt=float(balance), type="INITIAL_DEPOSIT",
+                              desc="Initial deposit")
+            position = self._commit(record)
+        self._durable(position)
+        return number
+
+    def apply_posting(self, account_number: int, bank_code: str, amount: float,
+                      transaction_type: str, description: str) -> float:
+        key = (account_number, bank_code)
+        with self.lock:
+            self._sync()
+            account = self._view(key)
+            if account is None:
+                raise PostingError(PostingError.NOT_FOUND, "Account not found")
+            if account.is_active != 1:
+                raise PostingError(PostingError.INACTIVE, "Account is not active")
+            if amount < 0 and account.balance < -amount:
+                raise PostingError(PostingError.INSUFFICIENT_FUNDS, "Insufficient funds")
+
+            position = self._commit({'op': "post", 'n': account_number, 'b': bank_code,
+                                     'id': self.next_staged_posting_id, 'amt': float(amount),
+                                     'type': transaction_type, 'desc': description, 'ts': self._now()})
+            balance = self.staged[key].balance
+        self._durable(position)
+        return balance
+
+    def apply_postings(self, postings: List[Tuple[int, str, float, str, str]]) -> List[float]:
+        with self.lock:
+            self._sync()
+            balances, results, legs = {}, [], []
+            for leg, (account_number, bank_code, amount, transaction_type, description) in enumerate(postings):
+                key = (account_number, bank_code)
+                account = self._view(key)
+                if account is None:
+                    raise PostingError(PostingError.NOT_FOUND, "Account not found", leg)
+                if account.is_active != 1:
+                    raise PostingError(PostingError.INACTIVE, "Account is not active", leg)
+                balance = balances.get(key, account.balance)
+                if amount < 0 and balance < -amount:
+                    raise PostingError(PostingError.INSUFFICIENT_FUNDS, "Insufficient funds", leg)
+                balances[key] = balance + amount
+                results.append(balances[key])
+                legs.append([account_number, bank_code, self.next_staged_posting_id + leg, float(amount),
+                             transaction_type, description])
+
+            position = self._commit({'op': "batch", 'postings': legs, 'ts': self._now()})
+        self._durable(position)
+        return results
+
+    def get_balance(self, account_number: int, bank_code: str) -> Optional[float]:
+        account = self.accounts.get((account_number, bank_code))
+        if account is None or account.is_active != 1:
+            return None
+        return account.balance
+
+    def account_exists(self, account_number: int, bank_code: str) -> bool:
+        return (account_number, bank_code) in self.accounts
+
+    def remove_account(self, account_number: int, bank_code: str):
+        with self.lock:
+            self._sync()
+            account = self._view((account_number, bank_code))
+            if account is None or account.is_active != 1:
+                raise PostingError(PostingError.NOT_FOUND, "Account not found")
+            if account.balance > 0:
+                raise PostingError(PostingError.HAS_FUNDS, "Cannot delete bank account containing founds")
+            position = self._commit({'op': "remove", 'n': account_number, 'b': bank_code, 'ts': self._now()})
+        self._durable(position)
+
+    def iter_accounts(self, active_only: bool = False, after: int = 0, limit: int = None) -> Iterator[BankAccount]:
+        with self.lock:
+            keys = sorted(key for key, account in self.accounts.items()
+                          if key[0] > after and (not active_only or account.is_active == 1))
+            if limit is not None:
+                keys = keys[:limit]
+            rows = [(key, self.accounts[key]) for key in keys]
+        for (number, bank_code), account in rows:
+            yield BankAccount(number, bank_code, account.balance, account.is_active, account.created_at, account.updated_at)
+
+    def iter_history(self, account_number: int, bank_code: str, after_id: int = 0,
+                     limit: int = 100) -> Iterator[Dict]:
+        with self.lock:
+            ranges = [r for r in self.history.get((account_number, bank_code), ()) if r[3] > after_id]
+            postings = self.postings.get((account_number, bank_code), [])
+            start = bisect.bisect_right(postings, (after_id, float("inf")))
+            page = postings[start:start + limit]
+
+        # segments are immutable, so they are read without the lock
+        count = 0
+        for name, offset, length, _ in ranges:
+            for _, _, posting_id, amount, transaction_type, description, timestamp in \
+                    self._read_segment(name, offset, length):
+                if posting_id <= after_id:
+                    continue
+                if count == limit:
+                    return
+                count += 1
+                yield self._history_row(posting_id, amount, transaction_type, description, timestamp)
+        for posting in page[:limit - count]:
+            yield self._history_row(*posting)
+
+    @staticmethod
+    def _history_row(posting_id: int, amount: float, transaction_type: str, description: str,
+                     timestamp: str) -> Dict:
+        return {
+            'id': posting_id,
+            'amount': amount,
+            'transaction_type': transaction_type,
+            'description': description,
+            'timestamp': timestamp
+        }
+
+    def iter_postings_since(self, since: str, transaction_types: Tuple[str, ...]) -> Iterator[Tuple[int, str, float, str]]:
+        with self.lock:
+            segments = [segment['file'] for segment in self.segments if segment['max_time'] >= since]
+            postings = [(timestamp, posting_id, number, bank_code, amount)
+                        for (number, bank_code), account_postings in self.postings.items()
+                        for posting_id, amount, transaction_type, _, timestamp in account_postings
+                        if timestamp >= since and transaction_type in transaction_types]
+        for name in segments:
+            postings.extend((timestamp, posting_id, number, bank_code, amount)
+                            for number, bank_code, posting_id, amount, transaction_type, _, timestamp
+                            in self._read_segment(name)
+                            if timestamp >= since and transaction_type in transaction_types)
+        postings.sort()
+        for timestamp, _, number, bank_code, amount in postings:
+            yield number, bank_code, amount, timestamp
+
+    def totals(self) -> Dict:
+        with self.lock:
+            return {
+                'account_count': sum(bank[0] for bank in self.banks.values()),
+                'active_count': sum(bank[1] for bank in self.banks.values()),
+                'total_balance': sum(bank[2] for bank in self.banks.values())
+            }
+
+    def account_statistics(self, bank_code: str) -> Dict:
+        with self.lock:
+            count, active, total, transactions = self.banks.get(bank_code, (0, 0, 0.0, 0))
+            min_balance, max_balance = self._balance_range(bank_code)
+        return {
+            'total_accounts': count,
+            'active_accounts': active if count else None,
+            'total_balance': total if count else None,
+            'avg_balance': total / count if count else None,
+            'max_balance': max_balance,
+            'min_balance': min_balance,
+            'total_transactions': transactions
+        }
+
+    def storage_stats(self) -> Dict:
+        with self.lock:
+            stats = {
+                'accounts': len(self.accounts),
+                'postings': sum(bank[3] for bank in self.banks.values()),
+                'postings_in_memory': sum(len(p) for p in self.postings.values()),
+                'journal_records': self.since_snapshot,
+                'pending': len(self.pending),
+                'snapshots': self.snapshots,
+                'posting_segments': len(self.segments)
+            }
+        stats['journal'] = self.journal.stats()
+        return {'memory_store': stats}
+
+    def close(self):
+        """Takes a final snapshot and closes the journal."""
+        self.snapshot()
+        self.journal.close()
@@ -1,35 +1,105 @@
-from dataclasses import dataclass, asdict
+import json
+import math
+import sqlite3
 from datetime import datetime
+from json.encoder import encode_basestring
+from typing import Dict, Tuple
+
+
+def _json_string(value: str) -> str:
+    return "null" if value is None else encode_basestring(value)
+
+
+def _json_scalar(value) -> str:
+    # repr of an int or a finite float is already JSON; json.dumps handles the rest
+    # and raises ValueError for inf and nan instead of writing invalid JSON
+    if type(value) is int or (type(value) is float and math.isfinite(value)):
+        return repr(value)
+    return json.dumps(value, allow_nan=False)
+
 
-@dataclass
 class BankAccount:
     """
     Represents a bank account with account number, bank code, balance, and status.
-    Automatically tracks creation and last update timestamps.
+
+    Instances are slotted (no per-instance __dict__), so large listings stay small, and are
+    built straight from query rows by `from_row`, which can serve as a cursor's row factory.
+    Timestamps are kept as read from the database; a missing one is set to the current time
+    only when it is first read.
     """
-    account_number: int
-    bank_code: str
-    balance: float = 0.0
-    is_active: bool = True
-    created_at: str = None
-    updated_at: str = None
-
-    def __post_init__(self):
-        """
-        Initializes timestamps after the dataclass is created.
-        Sets `created_at` if not provided and always updates `updated_at` to current time.
-        """
-        if not self.created_at:
-            self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
 
-    def to_dict(self):
+    __slots__ = ("account_number", "bank_code", "balance", "is_active", "_created_at", "_updated_at")
+
+    # column order expected by `from_row`
+    COLUMNS = ("account_number", "bank_code", "balance", "is_active", "created_at", "updated_at")
+    SELECT = ", ".join(COLUMNS)
+
+    def __init__(self, account_number: int, bank_code: str, balance: float = 0.0, is_active: int = 1,
+                 created_at: str = None, updated_at: str = None):
+        self.account_number = account_number
+        self.bank_code = bank_code
+        self.balance = balance
+        self.is_active = is_active
+        self._created_at = created_at
+        self._updated_at = updated_at
+
+    @classmethod
+    def from_row(cls, cursor: sqlite3.Cursor, row: Tuple) -> "BankAccount":
+        """Row factory building an account from a row of `SELECT BankAccount.SELECT ...`."""
+        return cls(*row)
+
+    @property
+    def created_at(self) -> str:
+        if self._created_at is None:
+            self._created_at = datetime.now().isoformat()
+        return self._created_at
+
+    @created_at.setter
+    def created_at(self, value: str):
+        self._created_at = value
+
+    @property
+    def updated_at(self) -> str:
+        if self._updated_at is None:
+            self._updated_at = self.created_at
+        return self._updated_at
+
+    @updated_at.setter
+    def updated_at(self, value: str):
+        self._updated_at = value
+
+    def __eq__(self, other) -> bool:
+        # compares the stored values; unset timestamps are compared as unset, not filled in
+        if not isinstance(other, BankAccount):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self) -> int:
+        # the account's identity; equal records always share it
+        return hash((self.account_number, self.bank_code))
+
+    def __repr__(self) -> str:
+        return (f"BankAccount(account_number={self.account_number!r}, bank_code={self.bank_code!r}, "
+                f"balance={self.balance!r}, is_active={self.is_active!r})")
+
+    def to_dict(self) -> Dict:
         """
         Converts the BankAccount instance to a dictionary.
 
         Returns:
             A dictionary representation of the BankAccount.
         """
-        return asdict(self)
-
+        return {
+            'account_number': self.account_number,
+            'bank_code': self.bank_code,
+            'balance': self.balance,
+            'is_active': self.is_active,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
 
+    def to_json(self) -> str:
+        """Serializes the account to the JSON object sent by the protocol, without an intermediate dictionary."""
+        return (f'{{"account_number": {_json_scalar(self.account_number)}, "bank_code": {_json_string(self.bank_code)}, '
+                f'"balance": {_json_scalar(self.balance)}, "is_active": {_json_scalar(self.is_active)}, '
+                f'"created_at": {_json_string(self.created_at)}, "updated_at": {_json_string(self.updated_at)}}}')
@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived SQLite connections.
+
+    Connections are created lazily by `factory` (which applies the configured PRAGMAs once)
+    and handed out to one thread at a time. Released connections are reused LIFO so the
+    hottest connection keeps its page cache warm. At most `max_size` connections exist.
+    """
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection], max_size: int = 20, timeout: float = 5):
+        """
+        Args:
+            factory: Function creating a new configured connection.
+            max_size: Maximum number of open connections.
+            timeout: Seconds to wait for a free connection when all are in use.
+        """
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+
+        self.idle = []
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+        self.created = 0
+        self.acquired = 0
+        self.waits = 0
+        self.peak_in_use = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Returns an idle connection or creates a new one.
+
+        Raises:
+            sqlite3.OperationalError if no connection becomes free within the timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                self.waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    raise sqlite3.OperationalError("Connection pool exhausted")
+
+            self.acquired += 1
+            if self.idle:
+                conn = self.idle.pop()
+                self._track_usage()
+                return conn
+
+            self.size += 1
+            self._track_usage()
+
+        try:
+            conn = self.factory()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+        with self.condition:
+            self.created += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Returns a connection to the pool, rolling back a transaction left open."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+
+        if self.closed:
+            self.discard(conn)
+            return
+
+        with self.condition:
+            self.idle.append(conn)
+            self.condition.notify()
+
+    def discard(self, conn: sqlite3.Connection):
+        """Closes a broken connection instead of returning it to the pool."""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def close_all(self):
+        """Closes all idle connections. Connections in use are closed when released afterwards."""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def _track_usage(self):
+        in_use = self.size - len(self.idle)
+        self.peak_in_use = max(self.peak_in_use, in_use)
+
+    def stats(self) -> Dict:
+        """Returns usage counters of the pool."""
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'peak_in_use': self.peak_in_use,
+                'max_size': self.max_size,
+                'created': self.created,
+                'acquired': self.acquired,
+                'reused': self.acquired - self.created,
+                'waits': self.waits
+            }
@@ -0,0 +1,102 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.logger import setup_core_logging, config
+from db.models import BankAccount
+
+logger = setup_core_logging()
+
+
+class AccountStore(ABC):
+    """
+    Storage engine of the account ledger: accounts, their balances and postings.
+
+    P2PNetwork serves AC, AD, AW, AB, AR, AH, AL, BA and BN only through this interface.
+    Engines ([database] engine):
+    - sqlite3: DataBase, accounts and postings in SQLite tables
+    - memory: MemoryAccountStore, accounts in memory, persisted by a journal and snapshots
+
+    Failed postings raise PostingError. Storage failures raise sqlite3.Error with both
+    engines, so callers handle them alike.
+    """
+
+    @abstractmethod
+    def open_account(self, bank_code: str, balance: float = 0.0) -> int:
+        """Creates an active account with a free number, records the initial deposit and returns the number."""
+
+    @abstractmethod
+    def apply_posting(self, account_number: int, bank_code: str, amount: float,
+                      transaction_type: str, description: str) -> float:
+        """Applies a deposit (positive amount) or withdrawal (negative amount) and returns the new balance."""
+
+    @abstractmethod
+    def apply_postings(self, postings: List[Tuple[int, str, float, str, str]]) -> List[float]:
+        """Applies (account number, bank code, amount, type, description) postings all or none; PostingError.leg names the failed one."""
+
+    @abstractmethod
+    def get_balance(self, account_number: int, bank_code: str) -> Optional[float]:
+        """Returns the balance of an active account, or None if it does not exist or is inactive."""
+
+    @abstractmethod
+    def account_exists(self, account_number: int, bank_code: str) -> bool:
+        """Returns True if the account exists, active or not."""
+
+    @abstractmethod
+    def remove_account(self, account_number: int, bank_code: str):
+        """Closes an empty active account, keeping its number and postings; raises PostingError if it is missing or has funds."""
+
+    @abstractmethod
+    def iter_accounts(self, active_only: bool = False, after: int = 0, limit: int = None) -> Iterator[BankAccount]:
+        """Yields BankAccount records with a number greater than `after`, ordered by account number."""
+
+    @abstractmethod
+    def iter_history(self, account_number: int, bank_code: str, after_id: int = 0,
+                     limit: int = 100) -> Iterator[Dict]:
+        """Yields postings of an account with an id greater than `after_id`, oldest first."""
+
+    @abstractmethod
+    def iter_postings_since(self, since: str, transaction_types: Tuple[str, ...]) -> Iterator[Tuple[int, str, float, str]]:
+        """Yields (account number, bank code, amount, timestamp) of postings of the given types made at or after `since`, oldest first."""
+
+    @abstractmethod
+    def totals(self) -> Dict:
+        """Returns account_count, active_count and total_balance over all bank codes."""
+
+    @abstractmethod
+    def account_statistics(self, bank_code: str) -> Dict:
+        """Returns total/active accounts, total/avg/max/min balance and total transactions of a bank."""
+
+    @abstractmethod
+    def storage_stats(self) -> Dict:
+        """Returns engine specific counters for the node statistics."""
+
+    @abstractmethod
+    def close(self):
+        """Releases the resources of the engine."""
+
+
+def configured_engine() -> str:
+    """Returns the [database] engine from config.ini (sqlite3 or memory)."""
+    return config.get("database", "engine", fallback="sqlite3").strip().lower()
+
+
+def open_account_store(db) -> AccountStore:
+    """
+    Returns the account store selected by [database] engine.
+
+    Args:
+        db: The node's DataBase; it is the sqlite3 engine itself and is also used
+            by the other engines' nodes for known banks and connections.
+    """
+    engine = configured_engine()
+    if engine == "memory":
+        from db.memory_store import MemoryAccountStore
+
+        return MemoryAccountStore(
+            config.get("database", "memory_path", fallback="bank.mem"),
+            snapshot_every=config.getint("database", "snapshot_every", fallback=10000),
+            fsync=config.getboolean("database", "journal_fsync", fallback=True)
+        )
+    if engine != "sqlite3":
+        logger.warning(f"Unknown storage engine '{engine}', using sqlite3")
+    return db
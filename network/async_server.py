@@ -0,0 +1,184 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from core.logger import setup_core_logging, config
+from network.framing import LineBuffer
+
+logger = setup_core_logging()
+
+
+class AsyncBankServer:
+    """
+    asyncio-based server engine for a P2PNetwork node.
+
+    Serves the same BankProtocol commands as the threaded engine, but keeps every
+    client session as a coroutine on one event loop instead of one thread per socket.
+    Command execution (SQLite work, proxying) is blocking, so it is handed to a bounded
+    thread pool executor sized by [performance] max_worker_threads.
+    At most `node.max_clients` sessions are served at once; the node's overload policy
+    decides whether further clients wait for a slot or are rejected with "ER Server busy".
+    """
+
+    BUSY_RESPONSE = "ER Server busy\n"
+
+    def __init__(self, node, max_workers: int = None):
+        """
+        Args:
+            node: The P2PNetwork instance whose commands are served.
+            max_workers: Size of the executor for blocking command execution.
+        """
+        self.node = node
+        self.max_workers = max_workers or config.getint("performance", "max_worker_threads", fallback=20)
+        self.executor = None
+        self.loop = None
+        self.server = None
+        self._stop_event = None
+        self._stop_requested = False
+        self._writers = set()
+        self._slots = None
+
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.active_sessions = 0
+        self.waiting = 0
+        self.peak_queue_depth = 0
+
+    def run(self):
+        """Runs the event loop until `stop()` is called. Blocks the calling thread."""
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """Starts listening and serves clients until the stop event is set."""
+        self._stop_event = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.node.max_clients)
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bank-worker")
+
+        try:
+            self.server = await asyncio.start_server(
+                self.handle_client,
+                self.node.host,
+                self.node.port,
+                reuse_address=True,
+                backlog=self.node.listen_backlog
+            )
+            self.node.is_running = True
+
+            logger.info(f"P2P Bank server started on {self.node.host}:{self.node.port} (asyncio engine)")
+            self.node.send_monitor("INFO", f"Server started on {self.node.host}:{self.node.port}")
+
+            if not self._stop_requested:
+                await self._stop_event.wait()
+        finally:
+            if self.server:
+                self.server.close()
+            for writer in list(self._writers):
+                writer.close()
+            if self.server:
+                await self.server.wait_closed()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        """Requests the event loop to shut down. Safe to call from any thread."""
+        self._stop_requested = True
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._stop_event.set)
+        except RuntimeError:
+            pass
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Admits a new client according to the overload policy and serves its session."""
+        if self._slots.locked():
+            if self.node.overload_policy == "reject":
+                self.rejected += 1
+                writer.write(self.BUSY_RESPONSE.encode("utf-8"))
+                writer.close()
+                logger.warning(f"Rejected connection from {writer.get_extra_info('peername')}: server busy")
+                return
+
+            self.waiting += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.waiting)
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self.accepted += 1
+        self.active_sessions += 1
+        try:
+            await self.serve_session(reader, writer)
+        finally:
+            self.active_sessions -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def serve_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Coroutine counterpart of P2PNetwork.handle_client.
+        Keeps its wire behavior: newline-terminated commands, pipelined commands answered in order
+        with one write, EOF closes the session and an idle client is dropped after the node timeout.
+        """
+        client_ip, client_port = writer.get_extra_info("peername")[:2]
+        connection_id = self.node.register_connection(writer, client_ip, client_port)
+        self._writers.add(writer)
+
+        lines = LineBuffer(self.node.max_command_length)
+
+        try:
+            while self.node.is_running:
+
+                raw = await asyncio.wait_for(reader.read(self.node.buffer_size), self.node.timeout)
+
+                try:
+                    commands = lines.feed(raw) if raw else lines.flush()
+                except ValueError as e:
+                    writer.write(self.node.protocol.format_response('', error=str(e)).encode("utf-8"))
+                    await writer.drain()
+                    break
+
+                if commands:
+                    responses = await self.loop.run_in_executor(
+                        self.executor, self.node.serve_commands, commands, connection_id, client_ip
+                    )
+
+                    writer.write("".join(responses).encode("utf-8"))
+                    await writer.drain()
+
+                    for response in responses:
+                        self.node.log_response(connection_id, response)
+
+                if not raw:
+                    break
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Connection timeout with {connection_id}")
+            self.node.send_gui_message("WARNING", f"Timeout: {connection_id}")
+
+        except Exception as e:
+            logger.error(f"Error handling client {connection_id}: {e}")
+            self.node.send_gui_message("ERROR", f"Client error {connection_id}: {e}")
+
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+            self.node.unregister_connection(connection_id)
+
+    def stats(self) -> dict:
+        """Returns admission counters in the same shape as SessionScheduler.stats()."""
+        return {
+            'policy': self.node.overload_policy,
+            'workers': self.max_workers,
+            'max_clients': self.node.max_clients,
+            'active_sessions': self.active_sessions,
+            'queue_depth': self.waiting,
+            'peak_queue_depth': self.peak_queue_depth,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'completed': self.completed
+        }
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict
+
+
+class BankUnavailable(ValueError):
+    """Raised instead of forwarding a request to a bank that is known to be unreachable; the request was not sent."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding the forwarding path to one remote bank.
+
+    - closed:    requests pass; outcomes are recorded in a sliding window of the last `window_size` calls
+    - open:      the failure rate reached `failure_rate` (after at least `min_calls` calls);
+                 requests fail fast without touching the network for `open_seconds`
+    - half-open: after `open_seconds` a single probe request is let through;
+                 success closes the breaker, failure opens it again
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, failure_rate: float = 0.5, window_size: int = 10, min_calls: int = 3,
+                 open_seconds: float = 30, on_state_change: Callable[[str, str, str], None] = None):
+        """
+        Args:
+            name: Identifier of the guarded target (the bank code).
+            failure_rate: Fraction of failed calls in the window that opens the breaker.
+            window_size: Number of most recent calls considered.
+            min_calls: Minimum number of calls in the window before the rate is evaluated.
+            open_seconds: How long the breaker stays open before a probe is allowed.
+            on_state_change: Called with (name, old_state, new_state) after every transition.
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.open_seconds = open_seconds
+        self.on_state_change = on_state_change
+
+        self.state = self.CLOSED
+        self.outcomes = deque(maxlen=max(self.min_calls, window_size))
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Returns True if a request may be sent to the target now."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                transition = self._set_state(self.HALF_OPEN)
+            elif self.state == self.HALF_OPEN and not self.probe_in_flight:
+                transition = None
+            else:
+                self.rejected += 1
+                return False
+            self.probe_in_flight = True
+
+        self._notify(transition)
+        return True
+
+    def record_success(self):
+        """Records a call that reached the target."""
+        with self.lock:
+            self.outcomes.append(True)
+            transition = None
+            if self.state != self.CLOSED:
+                self.outcomes.clear()
+                transition = self._set_state(self.CLOSED)
+            self.probe_in_flight = False
+        self._notify(transition)
+
+    def record_failure(self):
+        """Records a call that failed because the target was unreachable."""
+        with self.lock:
+            self.outcomes.append(False)
+            transition = None
+            if self.state == self.HALF_OPEN or self._failure_rate_exceeded():
+                self.opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    transition = self._set_state(self.OPEN)
+            self.probe_in_flight = False
+        self._notify(transition)
+
+    def _failure_rate_exceeded(self) -> bool:
+        if len(self.outcomes) < self.min_calls:
+            return False
+        failures = sum(1 for ok in self.outcomes if not ok)
+        return failures / len(self.outcomes) >= self.failure_rate
+
+    def _set_state(self, state: str):
+        old_state, self.state = self.state, state
+        return old_state, state
+
+    def _notify(self, transition):
+        if transition and self.on_state_change:
+            self.on_state_change(self.name, *transition)
+
+    def stats(self) -> Dict:
+        """Returns the current state and window of the breaker."""
+        with self.lock:
+            return {
+                'state': self.state,
+                'calls': len(self.outcomes),
+                'failures': sum(1 for ok in self.outcomes if not ok),
+                'rejected': self.rejected
+            }
+
+
+class BreakerRegistry:
+    """Creates and holds one CircuitBreaker per remote bank."""
+
+    def __init__(self, **breaker_options):
+        """
+        Args:
+            breaker_options: Keyword arguments passed to every CircuitBreaker.
+        """
+        self.breaker_options = breaker_options
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        """Returns the breaker for the given bank, creating it on first use."""
+        with self.lock:
+            breaker = self.breakers.get(name)
+            if breaker is None:
+                breaker = self.breakers[name] = CircuitBreaker(name, **self.breaker_options)
+            return breaker
+
+    def stats(self) -> Dict:
+        """Returns the state of every breaker, keyed by bank."""
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
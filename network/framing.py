@@ -0,0 +1,58 @@
+from typing import List
+
+
+class LineBuffer:
+    """
+    Reassembles newline-terminated protocol commands from a byte stream.
+
+    TCP delivers a stream, not messages: one read may contain part of a command
+    or several pipelined commands. Received bytes are appended to one reusable
+    buffer and every complete line is returned, in order, as a decoded command.
+    """
+
+    def __init__(self, max_line_length: int = 65536):
+        """
+        Args:
+            max_line_length: Largest accepted command in bytes; protects against
+                             clients that never send a newline.
+        """
+        self.max_line_length = max_line_length
+        self.buffer = bytearray()
+
+    def feed(self, data) -> List[str]:
+        """
+        Appends received bytes and returns all commands completed by them.
+
+        Args:
+            data: Bytes (or a memoryview) just read from the socket.
+
+        Returns:
+            The complete commands, stripped of whitespace; empty lines are skipped.
+
+        Raises:
+            ValueError if an unterminated command exceeds max_line_length.
+            UnicodeDecodeError if a command is not valid UTF-8.
+        """
+        self.buffer += data
+
+        end = self.buffer.rfind(b"\n")
+        if end < 0:
+            if len(self.buffer) > self.max_line_length:
+                self.buffer.clear()
+                raise ValueError("Command too long")
+            return []
+
+        lines = self.buffer[:end].split(b"\n")
+        del self.buffer[:end + 1]
+
+        if len(self.buffer) > self.max_line_length:
+            self.buffer.clear()
+            raise ValueError("Command too long")
+
+        return [command for command in (line.decode("utf-8").strip() for line in lines) if command]
+
+    def flush(self) -> List[str]:
+        """Returns the unterminated remainder as a last command, e.g. when the client closes."""
+        command = self.buffer.decode("utf-8").strip()
+        self.buffer.clear()
+        return [command] if command else []
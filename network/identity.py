@@ -0,0 +1,149 @@
+import ipaddress
+import os
+import re
+import socket
+import threading
+
+from core.logger import setup_core_logging, config
+
+logger = setup_core_logging()
+
+
+class NodeIdentity:
+    """
+    Resolves the bank code (the node's IP address) once at startup.
+
+    Resolution order:
+    1. [bank] code_mode = static: the configured [bank] code is used as is
+    2. the server is bound to a specific non-loopback address: that address (multi-interface hosts)
+    3. the local address of the route towards [bank] probe_address (no packet is sent)
+    4. the first non-loopback address of the host name, then 127.0.0.1
+
+    The resolved code is written back to [bank] code in config.ini in the background,
+    and only when it differs from the stored value. Only the code line is rewritten; the rest
+    of the file, its comments and its line endings are kept.
+    """
+
+    WILDCARD_HOSTS = ("", "0.0.0.0", "::")
+    SECTION = re.compile(r"\s*\[([^]]+)\]")
+    CODE_OPTION = re.compile(r"(\s*)code\s*[=:]\s*(.*?)\s*$", re.IGNORECASE)
+
+    def __init__(self, host: str = "0.0.0.0", config_path: str = "config.ini"):
+        """
+        Args:
+            host: The address the server binds to.
+            config_path: Path of the config file the code is persisted to.
+        """
+        self.host = host
+        self.config_path = config_path
+        self.mode = config.get("bank", "code_mode", fallback="auto").strip().lower()
+        self.configured_code = config.get("bank", "code", fallback="").strip()
+        self.probe_address = config.get("bank", "probe_address", fallback="8.8.8.8").strip()
+        self.persist_thread = None
+
+        self.code = self.resolve()
+        if self.code != self.configured_code:
+            self.persist_async(self.code)
+
+    def resolve(self) -> str:
+        """Determines the bank code according to the resolution order."""
+        if self.mode == "static" and self.configured_code:
+            return self.configured_code
+        if self.host not in self.WILDCARD_HOSTS and not self.is_loopback(self.host):
+            return self.host
+        return self.probe_local_ip() or self.host_name_ip() or "127.0.0.1"
+
+    def probe_local_ip(self) -> str:
+        """Returns the local address used to reach the probe address, or None."""
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect((self.probe_address, 80))
+                return s.getsockname()[0]
+        except OSError:
+            return None
+
+    @staticmethod
+    def is_loopback(host: str) -> bool:
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return host == "localhost"
+
+    @staticmethod
+    def host_name_ip() -> str:
+        """Returns the first non-loopback IPv4 address of the host name, or None."""
+        try:
+            infos = socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)
+        except OSError:
+            return None
+        for info in infos:
+            ip = info[4][0]
+            if not ipaddress.ip_address(ip).is_loopback:
+                return ip
+        return None
+
+    def persist_async(self, code: str):
+        """Writes the code to config.ini on a background thread."""
+        if "bank" in config.sections():
+            config.set("bank", "code", code)
+        self.persist_thread = threading.Thread(target=self.persist, args=(code,), name="bank-identity", daemon=True)
+        self.persist_thread.start()
+
+    def persist(self, code: str):
+        """Saves the code as [bank] code in config.ini, replacing the file atomically."""
+        try:
+            try:
+                with open(self.config_path, "r", encoding="utf-8", newline="") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                content = ""
+            updated = self.with_code(content, code)
+            if updated == content:
+                return
+            with open(self.config_path + ".tmp", "w", encoding="utf-8", newline="") as f:
+                f.write(updated)
+            os.replace(self.config_path + ".tmp", self.config_path)
+            logger.info(f"Bank code {code} saved to {self.config_path}")
+        except (OSError, UnicodeError) as e:
+            logger.error(f"Cannot save bank code: {e}")
+
+    @classmethod
+    def with_code(cls, content: str, code: str) -> str:
+        """
+        Returns the config file `content` with `code` as [bank] code.
+
+        The code line is replaced in place, or added after the last option of [bank]
+        (a [bank] section is appended if there is none). All other lines stay unchanged
+        and new lines use the line ending of the file.
+        """
+        newline = "\r\n" if "\r\n" in content else "\n"
+        lines = content.splitlines(keepends=True)
+        section, insert_at = None, None
+        for index, line in enumerate(lines):
+            header = cls.SECTION.match(line)
+            if header:
+                if section == "bank":
+                    break
+                section = header.group(1).strip()
+                if section == "bank":
+                    insert_at = index + 1
+                continue
+            if section != "bank":
+                continue
+            option = cls.CODE_OPTION.match(line)
+            if option:
+                if option.group(2) == code:
+                    return content
+                ending = line[len(line.rstrip("\r\n")):]
+                lines[index] = f"{option.group(1)}code = {code}{ending}"
+                return "".join(lines)
+            if line.strip() and not line.lstrip().startswith(("#", ";")):
+                insert_at = index + 1
+
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += newline
+        if insert_at is None:
+            lines += [f"[bank]{newline}", f"code = {code}{newline}"]
+        else:
+            lines.insert(insert_at, f"code = {code}{newline}")
+        return "".join(lines)
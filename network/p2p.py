@@ -1,13 +1,24 @@
 import socket
 import sqlite3
-import threading
 import queue
 from datetime import datetime
 from typing import Tuple, List, Dict
 
-from db.database import DataBase
-from core.protocol import BankProtocol
-from core.logger import setup_core_logging
+from db.database import DataBase, PostingError
+from db.storage import open_account_store
+from db.locks import AccountLocks
+from db.limits import DailyLimits, LimitExceeded
+from db.idempotency import IdempotencyStore
+from network.transfers import Leg, PostingCoordinator, TransferFailed
+from db.backup import BackupManager
+from core.protocol import BankProtocol, StreamedResult
+from network.scheduler import SessionScheduler
+from network.framing import LineBuffer
+from network.pool import ConnectFailed, RemoteConnectionPool
+from network.breaker import BankUnavailable, BreakerRegistry, CircuitBreaker
+from network.remote_cache import SingleFlight, TTLCache
+from network.identity import NodeIdentity
+from core.logger import setup_core_logging, logging_stats, config
 
 logger = setup_core_logging()
 
@@ -19,10 +30,15 @@ class P2PNetwork:
     Supports proxying commands to other bank nodes.
     """
 
-    def __init__(self, host: str = "0.0.0.0", port: int = 65525, monitor_queue = None, timeout: int = 5):
+    ENGINES = ("threads", "asyncio")
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 65525, monitor_queue = None, timeout: int = 5,
+                 engine: str = None, db_path: str = "bank.db", config_path: str = "config.ini"):
         """
         Initializes the P2P node with host, port, timeout, and optional monitor queue.
         Sets up the database, protocol handler, and active connections.
+        The server engine ("threads" or "asyncio") defaults to [network] engine in config.ini.
+        The database is opened at `db_path`; the resolved bank code is saved to the config file at `config_path`.
         """
         self.host = host
         self.port = port
@@ -30,7 +46,69 @@ class P2PNetwork:
         self.timeout = timeout
         self.is_running = False
 
-        self.db = DataBase()
+        self.engine = (engine or config.get("network", "engine", fallback="threads")).strip().lower()
+        if self.engine not in self.ENGINES:
+            logger.warning(f"Unknown server engine '{self.engine}', falling back to threads")
+            self.engine = "threads"
+        self.async_server = None
+
+        self.thread_pool_size = config.getint("performance", "thread_pool_size", fallback=10)
+        self.max_clients = config.getint("network", "max_clients", fallback=50)
+        self.listen_backlog = config.getint("network", "listen_backlog", fallback=128)
+        self.overload_policy = config.get("network", "overload_policy", fallback="queue").strip().lower()
+        self.scheduler = None
+
+        self.buffer_size = config.getint("network", "buffer_size", fallback=4096)
+        self.max_command_length = config.getint("network", "max_command_length", fallback=65536)
+
+        self.remote_pool = RemoteConnectionPool(
+            timeout=self.timeout,
+            max_idle=config.getint("p2p", "pool_max_idle", fallback=4),
+            idle_timeout=config.getfloat("p2p", "pool_idle_timeout", fallback=4),
+            keep_alive=config.getboolean("network", "keep_alive", fallback=True)
+        )
+        self.breakers = BreakerRegistry(
+            failure_rate=config.getfloat("p2p", "breaker_failure_rate", fallback=0.5),
+            window_size=config.getint("p2p", "breaker_window_size", fallback=10),
+            min_calls=config.getint("p2p", "breaker_min_calls", fallback=3),
+            open_seconds=config.getfloat("p2p", "breaker_open_seconds", fallback=30),
+            on_state_change=self.on_breaker_state_change
+        )
+
+        self.balance_flights = SingleFlight()
+        self.remote_balance_cache = None
+        if config.getboolean("p2p", "cache_remote_balances", fallback=False):
+            self.remote_balance_cache = TTLCache(
+                max_entries=config.getint("performance", "query_cache_size", fallback=1000),
+                ttl=config.getfloat("performance", "cache_ttl", fallback=300)
+            )
+
+        self.db = DataBase(db_path)
+        self.accounts = open_account_store(self.db)
+        self.account_locks = AccountLocks(config.getint("database", "lock_stripes", fallback=64))
+        self.limits = DailyLimits.from_config()
+        self.max_batch_postings = config.getint("transactions", "max_batch_postings", fallback=2000)
+        self.transfers = PostingCoordinator(
+            self.apply_local_legs,
+            self.reverse_local_legs,
+            self.proxy_command,
+            retries=config.getint("transactions", "transfer_leg_retries", fallback=2)
+        )
+        self.idempotency = IdempotencyStore(
+            self.db.connection,
+            self.db.write,
+            max_entries=config.getint("transactions", "idempotency_max_keys", fallback=10000),
+            ttl=config.getfloat("transactions", "idempotency_ttl", fallback=86400)
+        )
+        if self.limits.enabled:
+            self.limits.rebuild(self.accounts.iter_postings_since(self.limits.since(), DailyLimits.TRANSACTION_TYPES))
+        self.backups = None
+        if config.getboolean("backup", "enable_backup", fallback=False):
+            if self.accounts is self.db:
+                self.backups = BackupManager.from_config(self.db.db_path)
+            else:
+                # the accounts live in the memory engine's snapshot and journal, not in the database file
+                logger.warning("Backups are disabled: [backup] only supports the sqlite3 storage engine")
         self.protocol = BankProtocol()
         self.server_socket = None
         self.active_connections = {}
@@ -39,47 +117,58 @@ class P2PNetwork:
         
         self.gui_message_queue = monitor_queue
         
-        self.bank_code = self.get_local_ip()
+        self.identity = NodeIdentity(self.host, config_path)
+        self.bank_code = self.identity.code
         
         logger.info(f"Bank node initialized: {self.bank_code}:{self.port}")
 
     def get_local_ip(self) -> str:
         """
         Returns the local IP address of the machine.
-        Saves the IP as the bank code in config.ini.
+        The address is resolved once by NodeIdentity when the node is created.
         """
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(('8.8.8.8', 80))
-            ip = s.getsockname()[0]
-            s.close()
-            
-            import configparser
-            config = configparser.ConfigParser()
-            config.read("config.ini")
-            if "bank" not in config.sections():
-                config.add_section("bank")
-            config.set("bank", "code", ip)
-            with open("config.ini", "w") as f:
-                config.write(f)
-            
-            return ip
-        except:
-            return '127.0.0.1'
+        return self.identity.code
 
     def start_server(self):
         """
-        Starts the TCP server for the bank node.
-        Accepts incoming client connections and handles them in separate threads.
+        Starts the TCP server for the bank node using the configured engine.
+        The threaded engine accepts incoming client connections and hands them to a fixed pool
+        of session workers, the asyncio engine serves all clients from a single event loop.
+        Both admit at most [network] max_clients sessions and apply [network] overload_policy beyond that.
         """
+        if self.backups:
+            self.backups.start()
+
+        if self.engine == "asyncio":
+            from network.async_server import AsyncBankServer
+
+            self.async_server = AsyncBankServer(self)
+            try:
+                self.async_server.run()
+            except Exception as e:
+                logger.error(f"Failed to start server: {e}")
+                self.send_gui_message("ERROR", f"Failed to start server: {e}")
+                raise
+            finally:
+                self.stop_server()
+            return
+
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         
         try:
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(10)
+            self.server_socket.listen(self.listen_backlog)
             self.server_socket.settimeout(1)
             self.is_running = True
+
+            self.scheduler = SessionScheduler(
+                self.handle_client,
+                workers=self.thread_pool_size,
+                max_clients=self.max_clients,
+                policy=self.overload_policy
+            )
+            self.scheduler.start()
             
             logger.info(f"P2P Bank server started on {self.host}:{self.port}")
             self.send_monitor("INFO", f"Server started on {self.host}:{self.port}")
@@ -88,13 +177,8 @@ class P2PNetwork:
                 try:
                     client_socket, address = self.server_socket.accept()
                     client_socket.settimeout(self.timeout)
-                    
-                    thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, address),
-                        daemon=True
-                    )
-                    thread.start()
+
+                    self.scheduler.submit(client_socket, address, should_wait=lambda: self.is_running)
                     
                 except socket.timeout:
                     continue
@@ -116,12 +200,23 @@ class P2PNetwork:
         self.is_running = False
         if self.server_socket:
             self.server_socket.close()
-        
-        for conn_id, conn_info in list(self.active_connections.items()):
-            try:
-                conn_info['socket'].close()
-            except:
-                pass
+
+        if self.scheduler:
+            self.scheduler.shutdown()
+
+        self.remote_pool.close_all()
+
+        if self.backups:
+            self.backups.stop()
+
+        if self.async_server:
+            self.async_server.stop()
+        else:
+            for conn_id, conn_info in list(self.active_connections.items()):
+                try:
+                    conn_info['socket'].close()
+                except:
+                    pass
         
         self.active_connections.clear()
         logger.info("Server stopped")
@@ -130,46 +225,37 @@ class P2PNetwork:
     def handle_client(self, client_socket: socket.socket, address: Tuple[str, int]):
         """
         Handles communication with a connected client.
-        Receives commands, processes them, sends responses, and updates connection status.
+        Receives newline-terminated commands, processes them, sends responses, and updates connection status.
+        All commands completed by one read are executed in order and answered with a single sendall.
         """
         client_ip, client_port = address
-        connection_id = f"{client_ip}:{client_port}"
+        connection_id = self.register_connection(client_socket, client_ip, client_port)
 
-        self.active_connections[connection_id] = {
-            'socket': client_socket,
-            'ip': client_ip,
-            'port': client_port,
-            'connected_at': datetime.now().isoformat(),
-            'status': 'active'
-        }
-
-        self.send_monitor("CONNECTION", f"New connection: {connection_id}")
-        logger.info(f"New connection from {connection_id}")
+        lines = LineBuffer(self.max_command_length)
+        recv_buffer = bytearray(self.buffer_size)
+        recv_view = memoryview(recv_buffer)
 
         try:
             while self.is_running:
 
-                raw = client_socket.recv(1024)
+                received = client_socket.recv_into(recv_buffer)
 
-                if not raw:
+                try:
+                    commands = lines.feed(recv_view[:received]) if received else lines.flush()
+                except ValueError as e:
+                    client_socket.sendall(self.protocol.format_response('', error=str(e)).encode("utf-8"))
                     break
 
-                data = raw.decode("utf-8").strip()
-
-                if data == "":
-                    continue
+                if commands:
+                    responses = self.serve_commands(commands, connection_id, client_ip)
 
-                logger.info(f"Received from {connection_id}: {data}")
-                self.send_gui_message("COMMAND", f"{connection_id}: {data}")
+                    client_socket.sendall("".join(responses).encode("utf-8"))
 
-                response = self.process_command(data, client_ip)
+                    for response in responses:
+                        self.log_response(connection_id, response)
 
-                client_socket.sendall(response.encode("utf-8"))
-
-                logger.info(f"Sent to {connection_id}: {response.strip()}")
-                self.send_gui_message("RESPONSE", f"{connection_id}: {response.strip()}")
-
-                self.active_connections[connection_id]["status"] = "active"
+                if not received:
+                    break
 
         except socket.timeout:
             logger.warning(f"Connection timeout with {connection_id}")
@@ -181,19 +267,68 @@ class P2PNetwork:
 
         finally:
             client_socket.close()
+            self.unregister_connection(connection_id)
+
+    def register_connection(self, client_socket, client_ip: str, client_port: int) -> str:
+        """
+        Registers a new client connection and notifies the monitor.
+        Shared by both server engines; `client_socket` is whatever object the engine closes on shutdown.
+        Returns the connection id.
+        """
+        connection_id = f"{client_ip}:{client_port}"
+
+        self.active_connections[connection_id] = {
+            'socket': client_socket,
+            'ip': client_ip,
+            'port': client_port,
+            'connected_at': datetime.now().isoformat(),
+            'status': 'active'
+        }
 
-            if connection_id in self.active_connections:
-                del self.active_connections[connection_id]
+        self.send_monitor("CONNECTION", f"New connection: {connection_id}")
+        logger.info(f"New connection from {connection_id}")
+        return connection_id
 
-            logger.info(f"Connection closed: {connection_id}")
-            self.send_gui_message("CONNECTION", f"Closed: {connection_id}")
+    def unregister_connection(self, connection_id: str):
+        """Removes a closed client connection and notifies the monitor."""
+        if connection_id in self.active_connections:
+            del self.active_connections[connection_id]
+
+        logger.info(f"Connection closed: {connection_id}")
+        self.send_gui_message("CONNECTION", f"Closed: {connection_id}")
+
+    def serve_command(self, data: str, connection_id: str, client_ip: str) -> str:
+        """
+        Logs a received command, executes it and returns the response string.
+        This is the blocking part of a client session; the asyncio engine runs it in its executor.
+        """
+        logger.info(f"Received from {connection_id}: {data}")
+        self.send_gui_message("COMMAND", f"{connection_id}: {data}")
+
+        return self.process_command(data, client_ip)
+
+    def serve_commands(self, commands: List[str], connection_id: str, client_ip: str) -> List[str]:
+        """Executes pipelined commands strictly in order and returns their responses."""
+        return [self.serve_command(data, connection_id, client_ip) for data in commands]
+
+    def log_response(self, connection_id: str, response: str):
+        """Logs a response after it has been sent and marks the connection as active."""
+        logger.info(f"Sent to {connection_id}: {response.strip()}")
+        self.send_gui_message("RESPONSE", f"{connection_id}: {response.strip()}")
+
+        if connection_id in self.active_connections:
+            self.active_connections[connection_id]["status"] = "active"
 
     def process_command(self, command_str: str, client_ip: str = None) -> str:
         """
         Parses and executes a command received from a client.
         Returns the formatted response string.
+        A posting command with an idempotency key is executed once per key; retries get the first response.
         """
-        command, args = self.protocol.parse_command(command_str)
+        try:
+            command, args, key = self.protocol.parse_request(command_str)
+        except ValueError as e:
+            return self.protocol.format_response('', error=str(e))
         
         if command not in self.protocol.COMMANDS:
             return self.protocol.format_response('', error="Unknown command")
@@ -203,9 +338,21 @@ class P2PNetwork:
         
         if not handler:
             return self.protocol.format_response('', error="Command not implemented")
-        
+
+        if key is None:
+            return self.execute_command(command, handler, args, client_ip)
+        if command not in self.protocol.IDEMPOTENT_COMMANDS:
+            return self.protocol.format_response('', error=f"{command} does not accept an idempotency key")
+        try:
+            return self.idempotency.run(key, " ".join([command] + args), lambda: self.execute_command(
+                command, handler, args, client_ip, idempotency_key=key))
+        except ValueError as e:
+            return self.protocol.format_response('', error=str(e))
+
+    def execute_command(self, command: str, handler, args: List[str], client_ip: str = None, **options) -> str:
+        """Calls the handler of a parsed command and returns the formatted response string."""
         try:
-            result = handler(*args, client_ip=client_ip)
+            result = handler(*args, client_ip=client_ip, **options)
             return self.protocol.format_response(command, result)
         except ValueError as e:
             return self.protocol.format_response('', error=str(e))
@@ -229,66 +376,42 @@ class P2PNetwork:
         :param client_ip: IP of the client
         :return: Number of created account
         """
-        conn = self.db.get_connection()
         try:
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT MAX(account_number) FROM accounts")
-            max_acc = cursor.fetchone()[0]
-            new_account = (max_acc or 10000) + 1
-            
-            if new_account > 99999:
-                self.send_gui_message("ERROR", "Bank account limit reached")
-                logger.info("ER Bank account limit reached")
-                raise ValueError("ER Bank account limit reached")
-            
-            try:
-                balance = float(initial_balance) if initial_balance else 0.0
-                if balance < 0:
-                    self.send_gui_message("ERROR", "Initial balance cannot be negative")
-                    logger.info("ER Initial balance cannot be negative")
-                    raise ValueError("ER Initial balance cannot be negative")
-            except ValueError:
-                self.send_gui_message("ERROR", "Invalid initial balance")
-                logger.info("ER Invalid initial balance")
-                raise ValueError("ER Invalid initial balance")
-            
-            cursor.execute("""
-                INSERT INTO accounts (account_number, bank_code, balance, is_active)
-                VALUES (?, ?, ?, 1)
-            """, (new_account, self.bank_code, balance))
-            
-            if balance > 0:
-                cursor.execute("""
-                    INSERT INTO transactions 
-                    (account_number, bank_code, amount, transaction_type, description)
-                    VALUES (?, ?, ?, 'INITIAL_DEPOSIT', 'Initial deposit')
-                """, (new_account, self.bank_code, balance))
-            
-            conn.commit()
-            
-            account_info = f"{new_account}/{self.bank_code}"
+            balance = float(initial_balance) if initial_balance else 0.0
+            if balance < 0:
+                self.send_gui_message("ERROR", "Initial balance cannot be negative")
+                logger.info("ER Initial balance cannot be negative")
+                raise ValueError("ER Initial balance cannot be negative")
+        except ValueError:
+            self.send_gui_message("ERROR", "Invalid initial balance")
+            logger.info("ER Invalid initial balance")
+            raise ValueError("ER Invalid initial balance")
 
-            logger.info(f"Account created: {account_info} with balance ${balance:,.2f}")
-            self.send_gui_message("ACCOUNT", f"Created: {account_info}")
-            
-            return account_info
-            
+        try:
+            new_account = self.accounts.open_account(self.bank_code, balance)
         except sqlite3.Error as e:
-            conn.rollback()
-
             logger.error(f"Create account error: {e}")
             raise ValueError("Cannot create account")
-        finally:
-            conn.close()
+        except ValueError as e:
+            self.send_gui_message("ERROR", str(e))
+            logger.info(f"ER {e}")
+            raise ValueError(f"ER {e}")
+
+        account_info = f"{new_account}/{self.bank_code}"
+
+        logger.info(f"Account created: {account_info} with balance ${balance:,.2f}")
+        self.send_gui_message("ACCOUNT", f"Created: {account_info}")
+
+        return account_info
 
     # AD
-    def deposit(self, account_info: str, amount_str: str, client_ip: str = None) -> None:
+    def deposit(self, account_info: str, amount_str: str, client_ip: str = None, idempotency_key: str = None) -> None:
         """
         Deposits an amount into the account
         :param account_info: String in format number/bank code
         :param amount_str: Amount to be deposited into the account
         :param client_ip: IP of the client
+        :param idempotency_key: key of the client's request, forwarded when the command is proxied
         :return: If the user enters a different bank, it calls the method proxy_command
         """
         if '/' not in account_info:
@@ -299,7 +422,7 @@ class P2PNetwork:
         account_number_str, bank_code = account_info.split('/', 1)
         
         if bank_code != self.bank_code:
-            return self.proxy_command('AD', account_info, amount_str, bank_code)
+            return self.proxy_posting('AD', account_info, amount_str, bank_code, idempotency_key)
         
         try:
             account_number = int(account_number_str)
@@ -318,57 +441,36 @@ class P2PNetwork:
             logger.error("ER Invalid account number or amount format")
             raise ValueError("ER Invalid account number or amount format")
         
-        conn = self.db.get_connection()
         try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT balance, is_active FROM accounts 
-                WHERE account_number = ? AND bank_code = ?
-            """, (account_number, bank_code))
-            
-            account = cursor.fetchone()
-            if not account:
-                self.send_gui_message("ERROR", "Account not found")
-                logger.error("ER Account not found")
-                raise ValueError("ER Account not found")
-            if not account['is_active']:
-                self.send_gui_message("ERROR", "Account is not active")
-                logger.error("ER Account is not active")
-                raise ValueError("ER Account is not active")
-            
-            new_balance = account['balance'] + amount
-            cursor.execute("""
-                UPDATE accounts 
-                SET balance = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE account_number = ? AND bank_code = ?
-            """, (new_balance, account_number, bank_code))
-            
-            cursor.execute("""
-                INSERT INTO transactions (account_number, bank_code, amount, transaction_type, description)
-                VALUES (?, ?, ?, 'DEPOSIT', 'Deposit from network')
-            """, (account_number, bank_code, amount))
-            
-            conn.commit()
-            
+            with self.account_locks.hold(account_number, bank_code):
+                self.limits.check(account_number, bank_code, amount)
+                self.accounts.apply_posting(account_number, bank_code, amount, 'DEPOSIT', 'Deposit from network')
+                self.limits.record(account_number, bank_code, amount)
+
             logger.info(f"Deposited ${amount:,.2f} to account {account_info}")
             self.send_gui_message("TRANSACTION", f"Deposit: {account_info} +${amount:,.2f}")
-            
+
+        except LimitExceeded as e:
+            self.send_gui_message("ERROR", str(e))
+            logger.info(f"ER {e}: deposit to {account_info}")
+            raise
+        except PostingError as e:
+            self.send_gui_message("ERROR", str(e))
+            logger.error(f"ER {e}")
+            raise ValueError(f"ER {e}")
         except sqlite3.Error as e:
-            conn.rollback()
             self.send_gui_message("ERROR", "Deposit error")
             logger.error(f"Deposit error: {e}")
             raise ValueError("Transaction failed")
-        finally:
-            conn.close()
 
     # AW
-    def withdraw(self, account_info: str, amount_str: str, client_ip: str = None) -> None:
+    def withdraw(self, account_info: str, amount_str: str, client_ip: str = None, idempotency_key: str = None) -> None:
         """
         Withdraws an amount from the account
         :param account_info: String in format number/bank code
         :param amount_str: Amount to withdraw from the account
         :param client_ip: IP of the client
+        :param idempotency_key: key of the client's request, forwarded when the command is proxied
         :return: If the user enters a different bank, it calls the method proxy_command
         """
         if '/' not in account_info:
@@ -379,7 +481,7 @@ class P2PNetwork:
         account_number_str, bank_code = account_info.split('/', 1)
         
         if bank_code != self.bank_code:
-            return self.proxy_command('AW', account_info, amount_str, bank_code)
+            return self.proxy_posting('AW', account_info, amount_str, bank_code, idempotency_key)
         
         try:
             account_number = int(account_number_str)
@@ -392,47 +494,172 @@ class P2PNetwork:
         except ValueError:
             raise ValueError("Invalid account number or amount format")
         
-        conn = self.db.get_connection()
         try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT balance, is_active FROM accounts 
-                WHERE account_number = ? AND bank_code = ?
-            """, (account_number, bank_code))
-            
-            account = cursor.fetchone()
-            if not account:
-                raise ValueError("Account not found")
-            if not account['is_active']:
-                raise ValueError("Account is not active")
-            
-            if account['balance'] < amount:
-                raise ValueError("Insufficient funds")
-            
-            new_balance = account['balance'] - amount
-            cursor.execute("""
-                UPDATE accounts 
-                SET balance = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE account_number = ? AND bank_code = ?
-            """, (new_balance, account_number, bank_code))
-        
-            cursor.execute("""
-                INSERT INTO transactions (account_number, bank_code, amount, transaction_type, description)
-                VALUES (?, ?, ?, 'WITHDRAWAL', 'Withdrawal from network')
-            """, (account_number, bank_code, amount))
-            
-            conn.commit()
-            
+            with self.account_locks.hold(account_number, bank_code):
+                self.limits.check(account_number, bank_code, amount)
+                self.accounts.apply_posting(account_number, bank_code, -amount, 'WITHDRAWAL', 'Withdrawal from network')
+                self.limits.record(account_number, bank_code, amount)
+
             logger.info(f"Withdrew ${amount:,.2f} from account {account_info}")
             self.send_gui_message("TRANSACTION", f"Withdrawal: {account_info} -${amount:,.2f}")
-            
+
+        except LimitExceeded as e:
+            self.send_gui_message("ERROR", str(e))
+            logger.info(f"ER {e}: withdrawal from {account_info}")
+            raise
         except sqlite3.Error as e:
-            conn.rollback()
             logger.error(f"Withdraw error: {e}")
             raise ValueError("Transaction failed")
-        finally:
-            conn.close()
+
+    # AT
+    def transfer(self, from_account: str, to_account: str, amount_str: str, client_ip: str = None,
+                 idempotency_key: str = None) -> None:
+        """
+        Moves an amount from one account to another, all or nothing
+        :param from_account: account to withdraw from, in format number/bank code
+        :param to_account: account to deposit to, in format number/bank code
+        :param amount_str: amount to transfer
+        :param client_ip: IP of the client
+        :param idempotency_key: key of the client's request; the legs at other banks get keys derived from it
+        :return: None; a failed transfer leaves both accounts unchanged
+        """
+        try:
+            amount = float(amount_str)
+        except ValueError:
+            raise ValueError("ER Invalid amount format")
+        if not 0 < amount <= 1000000:
+            raise ValueError("ER Amount must be positive and at most $1,000,000")
+        if from_account == to_account:
+            raise ValueError("ER Cannot transfer to the same account")
+
+        legs = [
+            self.parse_leg(1, from_account, -amount, 'TRANSFER_OUT', f"Transfer to {to_account}"),
+            self.parse_leg(2, to_account, amount, 'TRANSFER_IN', f"Transfer from {from_account}")
+        ]
+        try:
+            self.execute_legs(legs, idempotency_key)
+        except TransferFailed as e:
+            self.send_gui_message("ERROR", f"Transfer {from_account} -> {to_account} failed: {e}")
+            logger.info(f"ER Transfer {from_account} -> {to_account} failed: {e}")
+            raise ValueError(f"Transfer failed: {e.leg.account_info + ': ' if e.leg else ''}{e}")
+
+        logger.info(f"Transferred ${amount:,.2f} from {from_account} to {to_account}")
+        self.send_gui_message("TRANSACTION", f"Transfer: {from_account} -> {to_account} ${amount:,.2f}")
+
+    # AP
+    def batch_post(self, *postings: str, client_ip: str = None, idempotency_key: str = None) -> int:
+        """
+        Applies many deposits and withdrawals in one request, all or nothing
+        :param postings: postings in format number/bank code=signed amount, e.g. 10001/10.0.0.5=-25.50;
+                         applied in order
+        :param client_ip: IP of the client
+        :param idempotency_key: key of the client's request; the legs at other banks get keys derived from it
+        :return: number of applied postings
+        """
+        if not postings:
+            raise ValueError("ER Batch contains no postings")
+        if len(postings) > self.max_batch_postings:
+            raise ValueError(f"ER Batch contains more than {self.max_batch_postings} postings")
+
+        legs = []
+        for number, posting in enumerate(postings, 1):
+            account_info, _, amount_str = posting.rpartition("=")
+            try:
+                amount = float(amount_str)
+            except ValueError:
+                raise ValueError(f"ER Invalid posting {number}: {posting}")
+            if not account_info or amount == 0 or abs(amount) > 1000000:
+                raise ValueError(f"ER Invalid posting {number}: {posting}")
+            legs.append(self.parse_leg(number, account_info, amount, 'DEPOSIT' if amount > 0 else 'WITHDRAWAL',
+                                       'Batch posting'))
+
+        try:
+            self.execute_legs(legs, idempotency_key)
+        except TransferFailed as e:
+            self.send_gui_message("ERROR", f"Batch posting failed: {e}")
+            logger.info(f"ER Batch posting failed: {e}")
+            if e.leg:
+                raise ValueError(f"Batch posting failed at posting {e.leg.number} ({e.leg.account_info}): {e}")
+            raise ValueError(f"Batch posting failed: {e}")
+
+        logger.info(f"Applied batch of {len(legs)} postings")
+        self.send_gui_message("TRANSACTION", f"Batch: {len(legs)} postings")
+        return len(legs)
+
+    def parse_leg(self, number: int, account_info: str, amount: float, transaction_type: str,
+                  description: str) -> Leg:
+        """Parses the account of a transfer or batch leg and tells whether it is held by this bank."""
+        if '/' not in account_info:
+            raise ValueError(f"ER Invalid account format in posting {number}. Use: account_number/bank_code")
+        account_number_str, bank_code = account_info.split('/', 1)
+        try:
+            account_number = int(account_number_str)
+        except ValueError:
+            raise ValueError(f"ER Invalid account number in posting {number}")
+        return Leg(number, account_info, account_number, bank_code, amount, transaction_type, description,
+                   bank_code == self.bank_code)
+
+    def execute_legs(self, legs: List[Leg], idempotency_key: str = None):
+        """
+        Applies the legs of a transfer or batch through the posting coordinator.
+        A failed attempt is counted under the request's key, so the retry of the request sends its
+        remote legs under new keys instead of replaying the answers of legs that were reversed.
+        Raises TransferFailed.
+        """
+        if not idempotency_key:
+            self.transfers.execute(legs)
+            return
+        try:
+            attempt = self.idempotency.failed_attempts(idempotency_key)
+        except sqlite3.Error as e:
+            logger.error(f"Cannot read the attempts of key {idempotency_key}: {e}")
+            raise TransferFailed("Transaction failed")
+        try:
+            self.transfers.execute(legs, idempotency_key, attempt)
+        except TransferFailed:
+            try:
+                self.idempotency.record_failure(idempotency_key)
+            except sqlite3.Error as e:
+                logger.error(f"Cannot count the failed attempt of key {idempotency_key}, "
+                             f"a retry with this key resends the same legs: {e}")
+            raise
+
+    def apply_local_legs(self, legs: List[Leg]):
+        """
+        Applies the local legs of a transfer or batch in one transaction, within the daily limits.
+        Raises PostingError (with the failed leg), LimitExceeded or ValueError.
+        """
+        totals = {}
+        for leg in legs:
+            count, amount = totals.get((leg.account_number, leg.bank_code), (0, 0.0))
+            totals[(leg.account_number, leg.bank_code)] = (count + 1, amount + abs(leg.amount))
+
+        with self.account_locks.hold_many(totals):
+            for (account_number, bank_code), (count, amount) in totals.items():
+                self.limits.check(account_number, bank_code, amount, count)
+            try:
+                self.accounts.apply_postings([(leg.account_number, leg.bank_code, leg.amount, leg.transaction_type,
+                                               leg.description) for leg in legs])
+            except sqlite3.Error as e:
+                logger.error(f"Batch posting error: {e}")
+                raise ValueError("Transaction failed")
+            for leg in legs:
+                self.limits.record(leg.account_number, leg.bank_code, leg.amount)
+
+    def reverse_local_legs(self, legs: List[Leg]):
+        """
+        Reverses local legs applied by `apply_local_legs` after a later leg failed,
+        and gives their postings back to the daily limits.
+        """
+        with self.account_locks.hold_many((leg.account_number, leg.bank_code) for leg in legs):
+            try:
+                self.accounts.apply_postings([(leg.account_number, leg.bank_code, -leg.amount, 'REVERSAL',
+                                               f"Reversal of {leg.transaction_type.lower()}") for leg in reversed(legs)])
+            except sqlite3.Error as e:
+                raise ValueError(f"Database error: {e}")
+            for leg in legs:
+                self.limits.release(leg.account_number, leg.bank_code, leg.amount)
+
     # AB
     def get_balance(self, account_info: str, client_ip: str = None) -> str:
         """
@@ -449,7 +676,7 @@ class P2PNetwork:
         account_number_str, bank_code = account_info.split('/', 1)
         
         if bank_code != self.bank_code:
-            return self.proxy_command('AB', account_info, None, bank_code)
+            return self.remote_balance(account_info, bank_code)
         
         try:
             account_number = int(account_number_str)
@@ -458,29 +685,19 @@ class P2PNetwork:
             logger.error("ER Invalid account number")
             raise ValueError("ER Invalid account number")
         
-        conn = self.db.get_connection()
         try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT balance FROM accounts 
-                WHERE account_number = ? AND bank_code = ? AND is_active = 1
-            """, (account_number, bank_code))
-            
-            account = cursor.fetchone()
-            if not account:
-                self.send_gui_message("ERROR", "Account not found or inactive")
-                logger.error("ER Account not found or inactive")
-                raise ValueError("ER Account not found or inactive")
-            
-            return str(account['balance'])
-            
+            balance = self.accounts.get_balance(account_number, bank_code)
         except sqlite3.Error as e:
             self.send_gui_message("ERROR", "Get balance error")
             logger.error(f"ER Get balance error: {e}")
             raise ValueError("ER Database query failed")
-        finally:
-            conn.close()
+
+        if balance is None:
+            self.send_gui_message("ERROR", "Account not found or inactive")
+            logger.error("ER Account not found or inactive")
+            raise ValueError("ER Account not found or inactive")
+
+        return str(balance)
 
     def bank_amount(self, client_ip: str = None):
         """
@@ -488,48 +705,31 @@ class P2PNetwork:
         :param client_ip: IP of the client
         :return: amount of the bank accounts
         """
-        con = self.db.get_connection()
-
         try:
-            cursor = con.cursor()
-            cursor.execute("""SELECT SUM(balance) FROM accounts""")
-            amount = cursor.fetchone()[0]
-            if amount is None:
-                amount = 0
-            return amount
+            return self.accounts.totals()['total_balance']
 
         except sqlite3.Error as e:
             self.send_gui_message("ERROR", "Bank amount query error")
             logger.error(f"ER Bank amount query error: {e}")
             raise ValueError("ER Database query failed")
 
-        finally:
-            con.close()
-
     def bank_number_of_clients(self, client_ip: str = None):
         """
         gets the number of bank accounts
         :param client_ip: IP of the client
-        :return: count of accounts in the bank
+        :return: count of active accounts in the bank
         """
-        con = self.db.get_connection()
         try:
-            cursor = con.cursor()
-            cursor.execute("""SELECT COUNT(*) FROM accounts""")
-            count = cursor.fetchone()[0]
-            return count
+            return self.accounts.totals()['active_count']
 
         except sqlite3.Error as e:
             self.send_gui_message("ERROR", "Bank number query error")
             logger.error(f"ER Bank number query error: {e}")
             raise ValueError("ER Database query failed")
 
-        finally:
-            con.close()
-
     def remove_account(self, account_info: str, client_ip: str = None):
         """
-        Removes an account from the bank
+        Removes an account from the bank; the account is closed and its postings are kept
         :param account_info: string in format number/bank code
         :param client_ip: IP of the client
         :return: result of the operation
@@ -541,70 +741,162 @@ class P2PNetwork:
 
         account_number_str, bank_code = account_info.split("/", 1)
 
-        if bank_code != self.get_local_ip():
+        if bank_code != self.bank_code:
             #return self.proxy_command('AR', account_info, None, bank_code)
             self.send_gui_message("ERROR", "Invalid bank code")
             logger.debug("ER Invalid bank code")
             raise ValueError("ER Invalid bank code")
 
-        con = self.db.get_connection()
-
+        account_number = int(account_number_str)
         try:
-            cursor = con.cursor()
-            account_number = int(account_number_str)
-
-            cursor.execute(""" SELECT balance FROM accounts WHERE account_number = ? AND bank_code = ? """, (account_number, bank_code))
-            row = cursor.fetchone()
-            if row is None:
-                self.send_gui_message("ERROR", "Account not found")
-                logger.debug("ER Account not found")
-                raise ValueError("ER Account not found")
-
-            balance = row[0]
-            if balance is None:
-                balance = 0
+            with self.account_locks.hold(account_number, bank_code):
+                self.accounts.remove_account(account_number, bank_code)
+                self.limits.forget(account_number, bank_code)
+            self.send_gui_message("INFO", f"Account removed successfully")
 
-            if balance > 0:
+        except PostingError as e:
+            if e.reason == PostingError.HAS_FUNDS:
                 self.send_gui_message("ERROR", "ER Cannot delete bank account containing founds")
                 logger.debug("ER Cannot delete bank account containing founds")
                 raise Exception("ER Cannot delete bank account containing founds")
+            self.send_gui_message("ERROR", "Account not found")
+            logger.debug("ER Account not found")
+            raise ValueError("ER Account not found")
+        except sqlite3.Error as e:
+            logger.error(f"ER Account remove failed: {e}")
+            self.send_gui_message("ERROR", "ER Account remove failed")
+            raise ValueError("ER Database query failed")
 
-            cursor.execute("""
-                DELETE from accounts
-                WHERE account_number = ? AND bank_code = ?
-                """, (account_number, bank_code))
+    # AH
+    def get_history(self, account_info: str, after_id: str = "0", limit: str = None,
+                    client_ip: str = None) -> StreamedResult:
+        """
+        Gets one page of the postings of an account, oldest first
+        :param account_info: string in format number/bank code
+        :param after_id: id of the last posting of the previous page, 0 for the first page
+        :param limit: maximum number of postings, [transactions] history_page_size by default
+        :param client_ip: IP of the client
+        :return: postings as JSON lines followed by "AH {"count": n, "next": id}";
+                 "next" is the after_id of the next page, or null after the last page
+        """
+        if "/" not in account_info:
+            self.send_gui_message("ERROR", "Bank account info must contain '/' character")
+            logger.error("ER Bank account info must contain '/' character")
+            raise ValueError("ER Bank account info must contain '/' character")
 
-            con.commit()
-            self.send_gui_message("INFO", f"Account removed successfully")
+        account_number_str, bank_code = account_info.split("/", 1)
+
+        if bank_code != self.bank_code:
+            self.send_gui_message("ERROR", "Invalid bank code")
+            logger.debug("ER Invalid bank code")
+            raise ValueError("ER Invalid bank code")
 
+        max_limit = config.getint("transactions", "history_max_page_size", fallback=1000)
+        try:
+            account_number = int(account_number_str)
+            after = int(after_id)
+            page_size = int(limit) if limit else config.getint("transactions", "history_page_size", fallback=100)
+            if after < 0 or not 0 < page_size <= max_limit:
+                raise ValueError
+        except ValueError:
+            self.send_gui_message("ERROR", "Invalid history request")
+            logger.error("ER Invalid history request")
+            raise ValueError(f"ER Invalid history request. Use: AH account/bank [after_id] [limit <= {max_limit}]")
+
+        try:
+            if not self.accounts.account_exists(account_number, bank_code):
+                self.send_gui_message("ERROR", "Account not found")
+                logger.debug("ER Account not found")
+                raise ValueError("ER Account not found")
         except sqlite3.Error as e:
-            con.rollback()
-            logger.error(f"ER Account remove failed: {e}")
-            self.send_gui_message("ERROR", "ER Account remove failed")
+            logger.error(f"ER History query error: {e}")
             raise ValueError("ER Database query failed")
 
-        finally:
-            con.close()
+        page = {'count': 0, 'next': None}
+
+        def postings():
+            for posting in self.accounts.iter_history(account_number, bank_code, after, page_size):
+                page['count'] += 1
+                page['next'] = posting['id']
+                yield posting
+            if page['count'] < page_size:
+                page['next'] = None
+
+        return StreamedResult(postings(), lambda: page)
 
     def get_statistics(self, client_ip: str = None) -> Dict:
-      """Returns statistics about the bank, including active connections and bank code."""
-        stats = self.db.get_bank_statistics(self.bank_code)
+        """Returns statistics about the bank, including active connections and bank code."""
+        stats = self.accounts.account_statistics(self.bank_code)
+        stats.update(self.db.known_bank_statistics())
         
         stats['active_connections'] = len(self.active_connections)
         stats['bank_code'] = self.bank_code
         stats['port'] = self.port
         stats['is_running'] = self.is_running
+        stats['scheduler'] = self.get_scheduler_stats()
+        stats['proxy_pool'] = self.remote_pool.stats()
+        stats['breakers'] = self.breakers.stats()
+        stats['remote_balances'] = self.get_remote_balance_stats()
+        stats.update(self.accounts.storage_stats())
+        stats['account_locks'] = self.account_locks.stats()
+        stats['daily_limits'] = self.limits.stats()
+        stats['idempotency'] = self.idempotency.stats()
+        stats['logging'] = logging_stats()
+        if self.backups:
+            stats['backup'] = self.backups.stats()
         
         return stats
     
-    def list_accounts(self, client_ip: str = None) -> List[Dict]:
-        """Returns a list of all accounts in the bank."""
-        return self.db.get_all_accounts()
+    # AL
+    def list_accounts(self, *args, client_ip: str = None) -> StreamedResult:
+        """
+        Lists one page of the accounts in the bank ordered by account number
+        Usage: AL [all|active] [after_account] [limit]
+        :param args: optional filter ("all" by default), account number to resume after
+                     and page size ([database] account_page_size by default)
+        :param client_ip: IP of the client
+        :return: accounts as JSON lines followed by "AL {"count": n, "next": account}";
+                 "next" resumes the listing, null after the last page
+        """
+        args = list(args)
+        active_only = False
+        if args and args[0].lower() in ("all", "active"):
+            active_only = args.pop(0).lower() == "active"
+
+        max_limit = config.getint("database", "account_max_page_size", fallback=10000)
+        try:
+            if len(args) > 2:
+                raise ValueError
+            after = int(args[0]) if args else 0
+            page_size = int(args[1]) if len(args) > 1 else config.getint("database", "account_page_size", fallback=1000)
+            if after < 0 or not 0 < page_size <= max_limit:
+                raise ValueError
+        except ValueError:
+            self.send_gui_message("ERROR", "Invalid account list request")
+            logger.error("ER Invalid account list request")
+            raise ValueError(f"ER Invalid account list request. Use: AL [all|active] [after_account] [limit <= {max_limit}]")
+
+        page = {'count': 0, 'next': None}
+
+        def accounts():
+            for account in self.accounts.iter_accounts(active_only, after, page_size):
+                page['count'] += 1
+                page['next'] = account.account_number
+                yield account
+            if page['count'] < page_size:
+                page['next'] = None
+
+        return StreamedResult(accounts(), lambda: page)
     
-    def proxy_command(self, command: str, account_info: str, amount: str = None, target_bank: str = None) -> str:
+    def proxy_command(self, command: str, account_info: str, amount: str = None, target_bank: str = None,
+                      idempotency_key: str = None) -> str:
         """
         Forwards a command to another bank node.
-        Handles TCP connection and returns the response.
+        Uses a pooled keep-alive connection to the bank and returns the response.
+        Fails fast while the circuit breaker of an unreachable bank is open.
+        An idempotency key is forwarded with the command, which makes the command safe to resend.
+        Raises BankUnavailable when the command was not sent (circuit open or no connection),
+        ValueError when it failed in any other way and may have reached the bank.
         """
         try:
             if ':' in target_bank:
@@ -613,22 +905,37 @@ class P2PNetwork:
             else:
                 bank_ip = target_bank
                 bank_port = 65525
-            
-            proxy_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            proxy_socket.settimeout(self.timeout)
-            
-            proxy_socket.connect((bank_ip, bank_port))
-            
+        except ValueError:
+            logger.error(f"Proxy command error: invalid bank code {target_bank}")
+            raise ValueError("Proxy operation failed")
+
+        breaker = self.breakers.get(target_bank)
+        if not breaker.allow():
+            logger.warning(f"Proxy {command} to {target_bank} rejected: circuit open")
+            raise BankUnavailable(f"Bank {target_bank} is unavailable")
+
+        try:
+            if command in ('AD', 'AW') and self.remote_balance_cache:
+                self.remote_balance_cache.invalidate(account_info)
+
             if amount:
                 cmd_data = f"{command} {account_info} {amount}\n"
             else:
                 cmd_data = f"{command} {account_info}\n"
+            if idempotency_key:
+                cmd_data = f"{cmd_data[:-1]} {self.protocol.KEY_PREFIX}{idempotency_key}\n"
             
-            proxy_socket.sendall(cmd_data.encode('utf-8'))
-            
-            response = proxy_socket.recv(1024).decode('utf-8').strip()
-            
-            proxy_socket.close()
+            try:
+                response = self.remote_pool.request((bank_ip, bank_port), cmd_data,
+                                                    idempotent=(command == 'AB' or idempotency_key is not None))
+            except Exception:
+                # any failed call is an outcome, so a half-open probe always ends here
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+
+            if command in ('AD', 'AW') and self.remote_balance_cache:
+                self.remote_balance_cache.invalidate(account_info)
             
             self.add_known_bank(target_bank, bank_ip, bank_port)
             
@@ -637,6 +944,9 @@ class P2PNetwork:
             
             return response
             
+        except ConnectFailed as e:
+            logger.error(f"Proxy error to {target_bank}: {e}")
+            raise BankUnavailable(f"Cannot connect to bank {target_bank}")
         except socket.error as e:
             logger.error(f"Proxy error to {target_bank}: {e}")
             raise ValueError(f"Cannot connect to bank {target_bank}")
@@ -644,6 +954,51 @@ class P2PNetwork:
             logger.error(f"Proxy command error: {e}")
             raise ValueError("Proxy operation failed")
 
+    def proxy_posting(self, command: str, account_info: str, amount: str, target_bank: str,
+                      idempotency_key: str = None) -> str:
+        """
+        Forwards AD or AW to the bank holding the account and returns its response.
+        An error response of that bank is raised as ValueError, so the posting fails here too
+        and its idempotency key is not remembered as a success.
+        """
+        response = self.proxy_command(command, account_info, amount, target_bank, idempotency_key)
+        error = self.protocol.error_message(response)
+        if error is not None:
+            raise ValueError(error)
+        return response
+
+    def on_breaker_state_change(self, bank_code: str, old_state: str, new_state: str):
+        """Marks a bank inactive in known_banks when its circuit opens."""
+        logger.warning(f"Circuit for bank {bank_code}: {old_state} -> {new_state}")
+        self.send_gui_message("PROXY", f"Bank {bank_code} circuit {new_state}")
+
+        if new_state == CircuitBreaker.OPEN:
+            try:
+                self.set_bank_active(bank_code, False)
+            except sqlite3.Error as e:
+                logger.error(f"Cannot mark bank {bank_code} inactive: {e}")
+
+    def remote_balance(self, account_info: str, bank_code: str) -> str:
+        """
+        Gets the balance of an account at another bank.
+        Concurrent identical lookups share one proxied AB request; with [p2p] cache_remote_balances
+        enabled, successful answers are cached for [performance] cache_ttl seconds.
+        """
+        cache = self.remote_balance_cache
+        if cache:
+            cached = cache.get(account_info)
+            if cached is not None:
+                return cached
+            token = cache.token()
+
+        response = self.balance_flights.do(
+            account_info, lambda: self.proxy_command('AB', account_info, None, bank_code)
+        )
+
+        if cache and response.startswith('AB'):
+            cache.put(account_info, response, token)
+        return response
+
     def proxy_deposit(self, account_info: str, amount: float) -> str:
         """Proxies a deposit command to another bank node."""
         account_number_str, bank_code = account_info.split('/', 1)
@@ -678,20 +1033,46 @@ class P2PNetwork:
     
     def get_bank_statistics(self) -> Dict:
         """Returns statistics about the bank, including active connections and status."""
-        stats = self.db.get_bank_statistics(self.bank_code)
+        stats = self.accounts.account_statistics(self.bank_code)
+        stats.update(self.db.known_bank_statistics())
         stats['bank_code'] = self.bank_code
         stats['active_connections'] = len(self.active_connections)
         stats['is_running'] = self.is_running
+        stats['scheduler'] = self.get_scheduler_stats()
+        stats['proxy_pool'] = self.remote_pool.stats()
+        stats['breakers'] = self.breakers.stats()
+        stats['remote_balances'] = self.get_remote_balance_stats()
+        stats.update(self.accounts.storage_stats())
+        stats['account_locks'] = self.account_locks.stats()
+        stats['daily_limits'] = self.limits.stats()
+        stats['idempotency'] = self.idempotency.stats()
+        stats['logging'] = logging_stats()
+        if self.backups:
+            stats['backup'] = self.backups.stats()
+        return stats
+
+    def get_remote_balance_stats(self) -> Dict:
+        """Returns coalescing and cache counters of remote AB lookups."""
+        stats = {'flights': self.balance_flights.stats()}
+        if self.remote_balance_cache:
+            stats['cache'] = self.remote_balance_cache.stats()
         return stats
+
+    def get_scheduler_stats(self) -> Dict:
+        """Returns admission counters (queue depth, rejections, ...) of the running server engine."""
+        if self.async_server:
+            return self.async_server.stats()
+        if self.scheduler:
+            return self.scheduler.stats()
+        return {}
     
     def get_all_accounts(self) -> List[Dict]:
         """Returns all accounts stored in the database."""
-        return self.db.get_all_accounts()
+        return [account.to_dict() for account in self.accounts.iter_accounts()]
     
     def get_known_banks(self) -> List[Dict]:
         """Returns the list of known banks and their connection info."""
-        conn = self.db.get_connection()
-        try:
+        with self.db.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT bank_code, ip_address, port, last_seen, is_active
@@ -700,13 +1081,10 @@ class P2PNetwork:
             """)
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
-        finally:
-            conn.close()
     
     def add_known_bank(self, bank_code: str, ip_address: str, port: int):
         """Adds or updates a known bank in the database."""
-        conn = self.db.get_connection()
-        try:
+        with self.db.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT OR REPLACE INTO known_banks
@@ -714,9 +1092,16 @@ class P2PNetwork:
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP, 1)
             """, (bank_code, ip_address, port))
             conn.commit()
-        finally:
-            conn.close()
     
+    def set_bank_active(self, bank_code: str, is_active: bool):
+        """Updates the is_active flag of a known bank."""
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE known_banks SET is_active = ? WHERE bank_code = ?
+            """, (1 if is_active else 0, bank_code))
+            conn.commit()
+
     def get_active_connections(self) -> List[Dict]:
         """Returns a list of all currently active client connections."""
         connections = []
@@ -0,0 +1,205 @@
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+
+from core.logger import setup_core_logging
+from network.framing import LineBuffer
+
+logger = setup_core_logging()
+
+
+class ConnectFailed(OSError):
+    """Raised when no connection to the target could be opened, so the request was not sent."""
+
+
+class PooledConnection:
+    """A keep-alive socket to a remote bank together with its read buffer."""
+
+    def __init__(self, sock: socket.socket, target: Tuple[str, int]):
+        self.socket = sock
+        self.target = target
+        self.lines = LineBuffer()
+        self.last_used = time.monotonic()
+        self.uses = 0
+
+    def is_healthy(self, idle_timeout: float) -> bool:
+        """
+        Checks an idle connection before it is reused.
+        A connection is dropped when it idled too long (the remote bank closes idle clients)
+        or when the socket is readable, which means the peer closed it or sent unsolicited data.
+        """
+        if time.monotonic() - self.last_used > idle_timeout:
+            return False
+        try:
+            readable, _, _ = select.select([self.socket], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def request(self, line: str, buffer_size: int = 4096) -> str:
+        """Sends one command line and reads exactly one response line."""
+        self.socket.sendall(line.encode("utf-8"))
+        while True:
+            data = self.socket.recv(buffer_size)
+            if not data:
+                raise ConnectionError(f"Connection closed by {self.target[0]}:{self.target[1]}")
+            responses = self.lines.feed(data)
+            if responses:
+                self.last_used = time.monotonic()
+                self.uses += 1
+                return responses[0]
+
+    def close(self):
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+class RemoteConnectionPool:
+    """
+    Per-target pool of persistent TCP connections used to forward commands to other banks.
+
+    A connection is checked out by exactly one thread for the duration of a request and
+    returned afterwards, so pooled sockets are safe to use from concurrent handler threads.
+    At most `max_idle` connections per bank are kept; idle ones are health checked before reuse.
+    A new connection is tried once: the request thread never sleeps between connect attempts,
+    backing off from an unreachable bank is left to its circuit breaker.
+    """
+
+    def __init__(self, timeout: float = 5, max_idle: int = 4, idle_timeout: float = 4, keep_alive: bool = True):
+        """
+        Args:
+            timeout: Connect and read timeout in seconds.
+            max_idle: Maximum number of idle connections kept per target bank.
+            idle_timeout: Seconds after which an idle connection is not reused anymore.
+            keep_alive: Enables TCP keep-alive on pooled sockets.
+        """
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.keep_alive = keep_alive
+
+        self.idle = {}
+        self.lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.failed_connects = 0
+
+    def connect(self, target: Tuple[str, int]) -> PooledConnection:
+        """
+        Opens a new connection to the target.
+
+        Raises:
+            ConnectFailed if the target cannot be reached within the timeout.
+        """
+        try:
+            sock = socket.create_connection(target, timeout=self.timeout)
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if self.keep_alive:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            except OSError:
+                sock.close()
+                raise
+        except OSError as e:
+            with self.lock:
+                self.failed_connects += 1
+            logger.warning(f"Connect to {target[0]}:{target[1]} failed: {e}")
+            raise ConnectFailed(f"Cannot connect to {target[0]}:{target[1]}: {e}") from e
+        with self.lock:
+            self.created += 1
+        return PooledConnection(sock, target)
+
+    def acquire(self, target: Tuple[str, int]) -> PooledConnection:
+        """Checks out a healthy idle connection to the target or opens a new one."""
+        while True:
+            with self.lock:
+                connections = self.idle.get(target)
+                connection = connections.pop() if connections else None
+            if connection is None:
+                return self.connect(target)
+            if connection.is_healthy(self.idle_timeout):
+                with self.lock:
+                    self.reused += 1
+                return connection
+            self.discard(connection)
+
+    def release(self, connection: PooledConnection):
+        """Returns a connection after a successful request; closes it if the pool is full."""
+        with self.lock:
+            connections = self.idle.setdefault(connection.target, deque())
+            if len(connections) < self.max_idle:
+                connections.append(connection)
+                return
+        self.discard(connection)
+
+    def discard(self, connection: PooledConnection):
+        """Closes a connection that must not be reused."""
+        connection.close()
+        with self.lock:
+            self.discarded += 1
+
+    def request(self, target: Tuple[str, int], line: str, idempotent: bool = False) -> str:
+        """
+        Sends one command line to the target bank and returns its response line.
+
+        Args:
+            target: (ip, port) of the remote bank.
+            line: The newline-terminated command.
+            idempotent: Whether the command may be resent. A reused connection can turn out to be
+                        closed by the peer only after the command was written; only idempotent
+                        commands are then retried on a fresh connection.
+
+        Raises:
+            ConnectFailed if the bank cannot be reached and the command was not sent.
+            OSError if the connection failed after the command may have been sent.
+        """
+        connection = self.acquire(target)
+        try:
+            response = connection.request(line)
+        except OSError as e:
+            self.discard(connection)
+            if not (idempotent and connection.uses > 0):
+                raise
+            try:
+                connection = self.connect(target)
+            except ConnectFailed:
+                # the command may have reached the bank over the closed connection
+                raise e
+            try:
+                response = connection.request(line)
+            except Exception:
+                self.discard(connection)
+                raise
+        except Exception:
+            self.discard(connection)
+            raise
+
+        self.release(connection)
+        return response
+
+    def close_all(self):
+        """Closes all idle connections."""
+        with self.lock:
+            connections = [c for idle in self.idle.values() for c in idle]
+            self.idle.clear()
+        for connection in connections:
+            connection.close()
+
+    def stats(self) -> Dict:
+        """Returns connection counters of the pool."""
+        with self.lock:
+            return {
+                'idle': sum(len(idle) for idle in self.idle.values()),
+                'targets': len(self.idle),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'failed_connects': self.failed_connects
+            }
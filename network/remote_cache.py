@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls.
+
+    The first caller for a key executes the function; callers arriving while it runs
+    wait for it and receive the same result (or the same exception).
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Runs `fn` once for all concurrent callers with the same key and returns its result."""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self.calls[key] = self._Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': len(self.calls)}
+
+
+class TTLCache:
+    """
+    Bounded cache whose entries expire after `ttl` seconds; least recently used entries are evicted first.
+
+    Values loaded by a slow call must not overwrite an invalidation that happened meanwhile,
+    so `put` takes the token returned by `token()` before the call started.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 300):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.invalidated = OrderedDict()
+        self.invalidations = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        """Returns the cached value or None if it is missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def token(self) -> int:
+        """Returns a token to pass to `put` for a value that is about to be loaded."""
+        with self.lock:
+            return self.invalidations
+
+    def put(self, key: Hashable, value, token: int = None):
+        """Stores a value unless the key was invalidated after `token` was taken."""
+        with self.lock:
+            if token is not None and self.invalidated.get(key, -1) >= token:
+                return
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Drops a cached value, e.g. after a posting to the same account."""
+        with self.lock:
+            self.entries.pop(key, None)
+            self.invalidated[key] = self.invalidations
+            self.invalidated.move_to_end(key)
+            self.invalidations += 1
+            while len(self.invalidated) > self.max_entries:
+                self.invalidated.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,155 @@
+import queue
+import socket
+import threading
+from typing import Callable, Dict, Tuple
+
+from core.logger import setup_core_logging
+
+logger = setup_core_logging()
+
+
+class SessionScheduler:
+    """
+    Fixed-size worker pool for client sessions of the threaded server engine.
+
+    Accepted sockets are put into a queue and served by `workers` long-lived threads,
+    so a traffic spike never turns into unbounded thread creation. At most `max_clients`
+    sessions are admitted (being served or queued); beyond that the overload policy decides:
+    - "queue":  the accept loop waits for a free slot, further clients wait in the listen backlog
+    - "reject": the client immediately receives "ER Server busy" and is disconnected
+    """
+
+    POLICIES = ("queue", "reject")
+    BUSY_RESPONSE = "ER Server busy\n"
+
+    def __init__(self, handler: Callable[[socket.socket, Tuple[str, int]], None], workers: int = 10,
+                 max_clients: int = 50, policy: str = "queue"):
+        """
+        Args:
+            handler: Function serving one client session, e.g. P2PNetwork.handle_client.
+            workers: Number of worker threads ([performance] thread_pool_size).
+            max_clients: Maximum number of sessions being served or waiting ([network] max_clients).
+            policy: Overload behavior, "queue" or "reject".
+        """
+        if policy not in self.POLICIES:
+            logger.warning(f"Unknown overload policy '{policy}', falling back to queue")
+            policy = "queue"
+
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_clients = max(self.workers, max_clients)
+        self.policy = policy
+
+        self.sessions = queue.Queue()
+        self.slots = threading.BoundedSemaphore(self.max_clients)
+        self.threads = []
+        self.lock = threading.Lock()
+        self.is_running = False
+
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.active_sessions = 0
+        self.peak_queue_depth = 0
+
+    def start(self):
+        """Starts the worker threads."""
+        self.is_running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"bank-session-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Session scheduler started: {self.workers} workers, "
+                    f"{self.max_clients} max clients, policy {self.policy}")
+
+    def submit(self, client_socket: socket.socket, address: Tuple[str, int], should_wait: Callable[[], bool] = None) -> bool:
+        """
+        Admits an accepted client socket.
+
+        Args:
+            client_socket: The accepted client socket.
+            address: The client address.
+            should_wait: For the "queue" policy, called while waiting for a free slot;
+                         waiting stops when it returns False.
+
+        Returns:
+            True if the session was queued for a worker, False if it was rejected.
+        """
+        if not self.slots.acquire(blocking=False):
+            if self.policy == "reject" or not self._wait_for_slot(should_wait):
+                self._reject(client_socket, address)
+                return False
+
+        self.sessions.put((client_socket, address))
+        with self.lock:
+            self.accepted += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.sessions.qsize())
+        return True
+
+    def _wait_for_slot(self, should_wait) -> bool:
+        """Blocks the accept loop until an admitted session finishes."""
+        while self.is_running and (should_wait is None or should_wait()):
+            if self.slots.acquire(timeout=1):
+                return True
+        return False
+
+    def _reject(self, client_socket: socket.socket, address: Tuple[str, int]):
+        """Answers an overflow client with a busy error and closes the socket."""
+        with self.lock:
+            self.rejected += 1
+        try:
+            client_socket.sendall(self.BUSY_RESPONSE.encode("utf-8"))
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+        logger.warning(f"Rejected connection from {address[0]}:{address[1]}: server busy")
+
+    def _worker(self):
+        """Worker loop: takes queued sessions and serves them one at a time."""
+        while self.is_running:
+            try:
+                item = self.sessions.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            with self.lock:
+                self.active_sessions += 1
+            try:
+                self.handler(*item)
+            except Exception as e:
+                logger.error(f"Session worker error: {e}")
+            finally:
+                with self.lock:
+                    self.active_sessions -= 1
+                    self.completed += 1
+                self.slots.release()
+
+    def shutdown(self):
+        """Stops the workers and closes sessions that are still waiting in the queue."""
+        self.is_running = False
+
+        while True:
+            try:
+                client_socket, address = self.sessions.get_nowait()
+            except queue.Empty:
+                break
+            client_socket.close()
+            self.slots.release()
+
+        self.threads.clear()
+
+    def stats(self) -> Dict:
+        """Returns admission counters of the scheduler."""
+        with self.lock:
+            return {
+                'policy': self.policy,
+                'workers': self.workers,
+                'max_clients': self.max_clients,
+                'active_sessions': self.active_sessions,
+                'queue_depth': self.sessions.qsize(),
+                'peak_queue_depth': self.peak_queue_depth,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'completed': self.completed
+            }
@@ -0,0 +1,167 @@
+import hashlib
+import uuid
+from typing import Callable, List
+
+from core.logger import setup_core_logging
+from core.protocol import BankProtocol
+from network.breaker import BankUnavailable
+
+logger = setup_core_logging()
+
+
+class Leg:
+    """One posting of a transfer or batch: a signed amount on a local or remote account."""
+
+    __slots__ = ("number", "account_info", "account_number", "bank_code", "amount",
+                 "transaction_type", "description", "local")
+
+    def __init__(self, number: int, account_info: str, account_number: int, bank_code: str, amount: float,
+                 transaction_type: str, description: str, local: bool):
+        self.number = number
+        self.account_info = account_info
+        self.account_number = account_number
+        self.bank_code = bank_code
+        self.amount = amount
+        self.transaction_type = transaction_type
+        self.description = description
+        self.local = local
+
+
+class TransferFailed(ValueError):
+    """Raised when a set of postings could not be applied; `leg` is the failed leg, if one is known."""
+
+    def __init__(self, message: str, leg: Leg = None):
+        super().__init__(message)
+        self.leg = leg
+
+
+class PostingCoordinator:
+    """
+    Applies a set of postings spread over local and remote accounts as one operation.
+
+    Local legs are applied together in one transaction by `apply_local`. Remote legs are sent
+    as AD/AW through `proxy` and cannot join that transaction, so they follow a reservation and
+    compensation flow:
+
+    1. remote withdrawals reserve the money at the other banks,
+    2. the local legs are applied all or none,
+    3. remote deposits hand the money over.
+
+    When a step fails, the legs already applied are reversed in the opposite order (remote
+    legs with the opposite command, local legs in one reversal transaction) and the operation
+    fails. Every remote leg carries an idempotency key derived from the request's key and the
+    attempt, so a leg whose answer was lost can be resent without applying it twice, while the
+    retry of a failed request sends its legs anew rather than getting the remembered answers
+    of the legs that were reversed. A leg that could not be
+    sent (BankUnavailable from `proxy`) simply fails and is not resent. A remote leg that was
+    sent but still has no answer after the retries is neither counted as applied nor reversed;
+    it is logged with its key for manual settlement.
+    """
+
+    def __init__(self, apply_local: Callable[[List[Leg]], None], reverse_local: Callable[[List[Leg]], None],
+                 proxy: Callable[[str, str, str, str, str], str], retries: int = 2):
+        """
+        Args:
+            apply_local: Applies local legs all or none; raises ValueError (PostingError with `leg`) on failure.
+            reverse_local: Reverses local legs applied by `apply_local`.
+            proxy: proxy_command(command, account_info, amount, bank_code, idempotency_key); raises
+                BankUnavailable if the command was not sent, ValueError if its answer was lost.
+            retries: Resends of a remote leg whose answer was lost.
+        """
+        self.apply_local = apply_local
+        self.reverse_local = reverse_local
+        self.proxy = proxy
+        self.retries = max(0, retries)
+
+    def execute(self, legs: List[Leg], key: str = None, attempt: int = 0):
+        """
+        Applies all legs or none of them.
+
+        Args:
+            legs: The postings, numbered in request order.
+            key: The idempotency key of the request; remote legs get keys derived from it.
+            attempt: Number of earlier failed attempts of the request with this key.
+
+        Raises:
+            TransferFailed naming the leg that failed.
+        """
+        if key:
+            base = hashlib.sha1(key.encode("utf-8")).hexdigest() + (f"-{attempt}" if attempt else "")
+        else:
+            base = uuid.uuid4().hex
+        local = [leg for leg in legs if leg.local]
+        remote_out = [leg for leg in legs if not leg.local and leg.amount < 0]
+        remote_in = [leg for leg in legs if not leg.local and leg.amount >= 0]
+        applied = []
+        local_applied = False
+
+        try:
+            for leg in remote_out:
+                self.remote(leg, f"{base}.{leg.number}")
+                applied.append(leg)
+
+            if local:
+                try:
+                    self.apply_local(local)
+                except ValueError as e:
+                    index = getattr(e, "leg", None)
+                    raise TransferFailed(str(e), local[index] if index is not None else None)
+                local_applied = True
+
+            for leg in remote_in:
+                self.remote(leg, f"{base}.{leg.number}")
+                applied.append(leg)
+        except TransferFailed:
+            for leg in reversed(applied):
+                if not leg.local and leg.amount >= 0:
+                    self.compensate_remote(leg, base)
+            if local_applied:
+                self.compensate_local(local)
+            for leg in reversed(applied):
+                if not leg.local and leg.amount < 0:
+                    self.compensate_remote(leg, base)
+            raise
+
+    def remote(self, leg: Leg, leg_key: str, amount: float = None):
+        """
+        Sends a remote leg (or its reversal with `amount`) and resends it while the answer is lost.
+        Resending stops as soon as the bank is unavailable.
+
+        Raises:
+            TransferFailed if the remote bank rejected the leg, could not be reached or never answered.
+        """
+        amount = leg.amount if amount is None else amount
+        command = 'AD' if amount >= 0 else 'AW'
+        error = None
+        for _ in range(self.retries + 1):
+            try:
+                response = self.proxy(command, leg.account_info, str(abs(amount)), leg.bank_code, leg_key)
+            except BankUnavailable as e:
+                if error is None:
+                    raise TransferFailed(str(e), leg)
+                break
+            except ValueError as e:
+                error = e
+                continue
+            reason = BankProtocol.error_message(response)
+            if reason is not None:
+                raise TransferFailed(reason, leg)
+            return
+
+        logger.error(f"No answer from {leg.bank_code} for {command} {leg.account_info} (key {leg_key}): {error}")
+        raise TransferFailed(f"Bank {leg.bank_code} did not answer, the leg needs manual settlement (key {leg_key})",
+                             leg)
+
+    def compensate_remote(self, leg: Leg, base: str):
+        try:
+            self.remote(leg, f"{base}.{leg.number}.reversal", -leg.amount)
+            logger.info(f"Reversed leg {leg.number} on {leg.account_info}")
+        except TransferFailed as e:
+            logger.error(f"Reversal of leg {leg.number} on {leg.account_info} failed: {e}")
+
+    def compensate_local(self, legs: List[Leg]):
+        try:
+            self.reverse_local(legs)
+            logger.info(f"Reversed {len(legs)} local legs")
+        except ValueError as e:
+            logger.error(f"Reversal of local legs failed: {e}")
@@ -1,18 +1,96 @@
 from network import p2p
 from network.p2p import P2PNetwork
-from db.database import DataBase
+from network.framing import LineBuffer
+from network.breaker import CircuitBreaker
+from network.remote_cache import SingleFlight, TTLCache
+from db.database import DataBase, PostingError
+from db.group_commit import GroupCommitWriter
+from db.account_cache import BalanceCache
+from db.backup import BackupManager
+from db.bulk import BulkTransfer
+from db.models import BankAccount
+from db.memory_store import MemoryAccountStore
+from db.locks import AccountLocks, BusyRetry
+from db.limits import DailyLimits, LimitExceeded
+import gzip
+import json
+import logging
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
+
+def make_node(test: unittest.TestCase, port: int, **options) -> P2PNetwork:
+    """
+    Creates a node whose database and config file live in a temporary directory,
+    so tests never write to the bank.db and config.ini of the working tree.
+    """
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    node = P2PNetwork(host="127.0.0.1", port=port, db_path=os.path.join(directory.name, "bank.db"),
+                      config_path=os.path.join(directory.name, "config.ini"), **options)
+    test.addCleanup(node.db.close)
+    if node.accounts is not node.db:
+        test.addCleanup(node.accounts.close)
+    if node.identity.persist_thread:
+        test.addCleanup(node.identity.persist_thread.join, 5)
+    return node
+
+
 class TestP2PNetwork(unittest.TestCase):
 
     def setUp(self):
-        self.p2p = P2PNetwork(host="127.0.0.1", port=5000)
-        self.db = DataBase()
+        self.p2p = make_node(self, 5000)
+        self.db = DataBase(self.p2p.db.db_path)
+        self.addCleanup(self.db.close)
 
     def test_get_bank_code(self):
         bank_code = self.p2p.get_bank_code()
         self.assertEqual(bank_code, self.p2p.bank_code)
 
+    def test_identity_resolution(self):
+        identity = self.p2p.identity
+        self.assertEqual(self.p2p.get_local_ip(), identity.code)
+
+        identity.host = "10.1.2.3"
+        self.assertEqual(identity.resolve(), "10.1.2.3")
+        identity.mode, identity.configured_code = "static", "10.9.9.9"
+        self.assertEqual(identity.resolve(), "10.9.9.9")
+
+    def test_identity_keeps_config_format(self):
+        path = self.p2p.identity.config_path
+        with open(path, "w", newline="") as f:
+            f.write("[bank]\r\n; the node's address\r\ncode = 10.0.0.1\r\ncode_mode = auto\r\n\r\n[p2p]\r\nport = 5000")
+        self.p2p.identity.persist("10.0.0.2")
+        with open(path, newline="") as f:
+            self.assertEqual(f.read(), "[bank]\r\n; the node's address\r\ncode = 10.0.0.2\r\ncode_mode = auto\r\n"
+                                       "\r\n[p2p]\r\nport = 5000")
+
+        with open(path, "w") as f:
+            f.write("[p2p]\nport = 5000\n")
+        self.p2p.identity.persist("10.0.0.2")
+        with open(path) as f:
+            self.assertEqual(f.read(), "[p2p]\nport = 5000\n[bank]\ncode = 10.0.0.2\n")
+
+    def test_connection_pool(self):
+        reused = self.db.pool_stats()["reused"]
+        with self.db.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        with self.db.connection():
+            pass
+
+        stats = self.db.pool_stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], reused + 2)
+        self.assertEqual(stats["in_use"], 0)
+
     def test_create_account(self):
         account_info = self.p2p.create_account()
         account_number_str, bank_code = account_info.split('/', 1)
@@ -66,6 +144,97 @@ class TestP2PNetwork(unittest.TestCase):
             self.p2p.get_balance(f"{account_number_str}/{bank_code}", "-5")
             self.p2p.get_balance(f"{account_number_str}/{bank_code}", "10000000")
 
+    def test_concurrent_postings(self):
+        # hundreds of postings on one account; the daily limits have their own test
+        self.p2p.limits = DailyLimits()
+        account_info = self.p2p.create_account("1000")
+        successes = []
+
+        def worker():
+            for _ in range(25):
+                try:
+                    self.p2p.withdraw(account_info, "10")
+                    successes.append(1)
+                except ValueError as e:
+                    self.assertEqual(str(e), "Insufficient funds")
+                self.p2p.deposit(account_info, "1")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = 1000 - 10 * len(successes) + 8 * 25
+        self.assertGreaterEqual(expected, 0)
+        self.assertAlmostEqual(float(self.p2p.get_balance(account_info)), expected)
+
+        account_number = int(account_info.split('/', 1)[0])
+        with self.db.connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM transactions WHERE account_number = ?",
+                                 (account_number,)).fetchone()[0]
+        self.assertEqual(count, 1 + len(successes) + 8 * 25)
+
+    def test_daily_limits(self):
+        self.p2p.limits = DailyLimits(max_transactions=3, max_amount=500)
+        account_info = self.p2p.create_account()
+        self.p2p.deposit(account_info, "300")
+        self.p2p.withdraw(account_info, "100")
+        with self.assertRaises(LimitExceeded):
+            self.p2p.deposit(account_info, "200")
+        self.assertEqual(self.p2p.process_command(f"AD {account_info} 200").strip(),
+                         "ER Daily amount limit of $500.00 exceeded ($100.00 left)")
+        self.p2p.withdraw(account_info, "100")
+        with self.assertRaisesRegex(ValueError, "Daily transaction limit of 3 reached"):
+            self.p2p.withdraw(account_info, "1")
+        self.assertEqual(float(self.p2p.get_balance(account_info)), 100.0)
+
+        # a restarted node counts the postings of the last 24 hours again
+        limits = DailyLimits(max_transactions=3)
+        limits.rebuild(self.p2p.accounts.iter_postings_since(limits.since(), DailyLimits.TRANSACTION_TYPES))
+        account_number, bank_code = account_info.split('/', 1)
+        with self.assertRaises(LimitExceeded):
+            limits.check(int(account_number), bank_code, 1)
+
+    def test_idempotency_keys(self):
+        account_info = self.p2p.create_account("100")
+        key = f"test-{time.time_ns()}"
+
+        responses = [self.p2p.process_command(f"AW {account_info} 30 key={key}") for _ in range(3)]
+        self.assertEqual(responses, ["AW\n"] * 3)
+        self.assertEqual(float(self.p2p.get_balance(account_info)), 70.0)
+        self.assertIn("different request", self.p2p.process_command(f"AW {account_info} 31 key={key}"))
+        self.assertEqual(self.p2p.process_command(f"AW {account_info} 1 key=bad/key"), "ER Invalid idempotency key\n")
+        self.assertIn("does not accept", self.p2p.process_command(f"AB {account_info} key={key}"))
+
+        # failed requests are not remembered, their retry runs again
+        failing = f"test-{time.time_ns()}"
+        self.assertIn("Insufficient funds", self.p2p.process_command(f"AW {account_info} 100 key={failing}"))
+        self.p2p.deposit(account_info, "30")
+        self.assertEqual(self.p2p.process_command(f"AW {account_info} 100 key={failing}"), "AW\n")
+
+        # keys survive a restart
+        self.p2p.idempotency.load()
+        self.assertEqual(self.p2p.process_command(f"AW {account_info} 30 key={key}"), "AW\n")
+        self.assertEqual(float(self.p2p.get_balance(account_info)), 0.0)
+
+    def test_transfer_and_batch(self):
+        source, target = self.p2p.create_account("100"), self.p2p.create_account()
+
+        self.assertEqual(self.p2p.process_command(f"AT {source} {target} 60"), "AT\n")
+        self.assertIn("Insufficient funds", self.p2p.process_command(f"AT {source} {target} 60"))
+        self.assertEqual((float(self.p2p.get_balance(source)), float(self.p2p.get_balance(target))), (40.0, 60.0))
+
+        response = self.p2p.process_command(f"AP {target}=-10 {source}=10 {target}=-51")
+        self.assertEqual(response, f"ER Batch posting failed at posting 3 ({target}): Insufficient funds\n")
+        self.assertEqual(self.p2p.process_command(f"AP {target}=-10 {source}=10 {target}=-50"), "AP 3\n")
+        self.assertEqual((float(self.p2p.get_balance(source)), float(self.p2p.get_balance(target))), (50.0, 0.0))
+        self.assertIn("Invalid posting 1", self.p2p.process_command(f"AP {source}"))
+
+        lines = self.p2p.process_command(f"AH {target}").splitlines()
+        self.assertEqual([json.loads(line)["transaction_type"] for line in lines[:-1]],
+                         ["TRANSFER_IN", "WITHDRAWAL", "WITHDRAWAL"])
+
     def test_get_balance(self):
         account_info = self.p2p.create_account()
         account_number_str, bank_code = account_info.split('/', 1)
@@ -82,6 +251,7 @@ class TestP2PNetwork(unittest.TestCase):
             self.p2p.get_balance(f"{0}.{bank_code}")
 
     def test_bank_amount(self):
+        self.p2p.create_account("100")
         conn = self.db.get_connection()
         cursor = conn.cursor()
         cursor.execute("""SELECT SUM(balance) FROM accounts""")
@@ -99,6 +269,54 @@ class TestP2PNetwork(unittest.TestCase):
 
         self.assertEqual(self.p2p.bank_number_of_clients(), count)
 
+    def test_history(self):
+        account_info = self.p2p.create_account("10")
+        for amount in ("1", "2", "3"):
+            self.p2p.deposit(account_info, amount)
+        self.p2p.withdraw(account_info, "4")
+
+        lines = self.p2p.process_command(f"AH {account_info} 0 3").splitlines()
+        postings = [json.loads(line) for line in lines[:-1]]
+        self.assertEqual([p["transaction_type"] for p in postings], ["INITIAL_DEPOSIT", "DEPOSIT", "DEPOSIT"])
+        trailer = json.loads(lines[-1][3:])
+        self.assertEqual(trailer, {"count": 3, "next": postings[-1]["id"]})
+
+        lines = self.p2p.process_command(f"AH {account_info} {trailer['next']} 3").splitlines()
+        self.assertEqual([json.loads(line)["amount"] for line in lines[:-1]], [3.0, 4.0])
+        self.assertEqual(json.loads(lines[-1][3:]), {"count": 2, "next": None})
+
+        self.assertIn("Invalid history request", self.p2p.process_command(f"AH {account_info} 0 0"))
+        self.assertIn("Invalid bank code", self.p2p.process_command("AH 99999/10.0.0.1"))
+
+        with self.db.connection() as conn:
+            plan = conn.execute("""
+                EXPLAIN QUERY PLAN SELECT id FROM transactions
+                WHERE account_number = ? AND bank_code = ? AND id > ? ORDER BY id LIMIT 10
+            """, (1, "x", 0)).fetchall()
+        self.assertIn("idx_transactions_account", plan[0][3])
+
+    def test_list_accounts(self):
+        first = int(self.p2p.create_account().split('/')[0])
+        second = int(self.p2p.create_account().split('/')[0])
+        with self.db.connection() as conn:
+            conn.execute("UPDATE accounts SET is_active = 0 WHERE account_number = ?", (first,))
+            conn.commit()
+
+        lines = self.p2p.process_command(f"AL all {first - 1} 1").splitlines()
+        self.assertEqual(json.loads(lines[0])["account_number"], first)
+        self.assertEqual(json.loads(lines[1][3:]), {"count": 1, "next": first})
+
+        lines = self.p2p.process_command(f"AL active {first - 1} 1").splitlines()
+        account = json.loads(lines[0])
+        self.assertGreater(account["account_number"], first)
+        self.assertEqual(account["is_active"], 1)
+
+        numbers = [account.account_number for account in self.db.iter_accounts(after=first - 1)]
+        self.assertIn(second, numbers)
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(list(self.db.iter_accounts(active_only=True))), self.p2p.bank_number_of_clients())
+        self.assertIn("Invalid account list request", self.p2p.process_command("AL active x"))
+
     def test_remove_account(self):
         account_info = self.p2p.create_account()
         account_number_str, bank_code = account_info.split('/', 1)
@@ -118,5 +336,947 @@ class TestP2PNetwork(unittest.TestCase):
             self.p2p.remove_account(f"{row_account_number_str}.{0}")
 
 
+class TestServerEngines(unittest.TestCase):
+
+    def start_node(self, engine, port):
+        node = make_node(self, port, engine=engine)
+        thread = threading.Thread(target=node.start_server, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(node.stop_server)
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                return node, socket.create_connection(("127.0.0.1", port), timeout=5)
+            except OSError:
+                time.sleep(0.05)
+        self.fail(f"{engine} server did not start")
+
+    def exchange(self, client, command):
+        client.sendall(command.encode("utf-8"))
+        return client.recv(1024).decode("utf-8")
+
+    def check_wire_behavior(self, engine, port):
+        node, client = self.start_node(engine, port)
+        with client:
+            self.assertEqual(self.exchange(client, "BC\n"), f"BC {node.bank_code}\n")
+            self.assertEqual(self.exchange(client, "XX\n"), "ER Unknown command\n")
+            account_info = self.exchange(client, "AC\n").split()[1]
+            self.assertEqual(self.exchange(client, f"AB {account_info}\n"), "AB 0.0\n")
+
+    def check_pipelining(self, engine, port):
+        node, client = self.start_node(engine, port)
+        with client:
+            client.sendall(b"BC\nXX\nB")
+            client.sendall(b"C\n")
+            expected = f"BC {node.bank_code}\nER Unknown command\nBC {node.bank_code}\n"
+            received = b""
+            while received.count(b"\n") < 3:
+                received += client.recv(1024)
+            self.assertEqual(received.decode("utf-8"), expected)
+
+    def test_threads_engine(self):
+        self.check_wire_behavior("threads", 65531)
+
+    def test_asyncio_engine(self):
+        self.check_wire_behavior("asyncio", 65532)
+
+    def test_pipelined_commands(self):
+        self.check_pipelining("threads", 65535)
+        self.check_pipelining("asyncio", 65530)
+
+    def test_reject_when_busy(self):
+        for engine, port in (("threads", 65533), ("asyncio", 65534)):
+            with self.subTest(engine=engine):
+                node = make_node(self, port, engine=engine)
+                node.thread_pool_size = 1
+                node.max_clients = 1
+                node.overload_policy = "reject"
+                thread = threading.Thread(target=node.start_server, daemon=True)
+                thread.start()
+                self.addCleanup(thread.join, 5)
+                self.addCleanup(node.stop_server)
+
+                deadline = time.monotonic() + 5
+                while not node.is_running and time.monotonic() < deadline:
+                    time.sleep(0.05)
+
+                with socket.create_connection(("127.0.0.1", port), timeout=5) as first:
+                    self.assertEqual(self.exchange(first, "BC\n"), f"BC {node.bank_code}\n")
+                    with socket.create_connection(("127.0.0.1", port), timeout=5) as second:
+                        self.assertEqual(second.recv(1024).decode("utf-8"), "ER Server busy\n")
+
+                stats = node.get_scheduler_stats()
+                self.assertEqual(stats["rejected"], 1)
+                self.assertEqual(stats["accepted"], 1)
+
+
+class TestProxyForwarding(unittest.TestCase):
+
+    def setUp(self):
+        self.remote_port = 65529
+        self.remote = make_node(self, self.remote_port)
+        self.remote.bank_code = f"127.0.0.1:{self.remote_port}"
+        thread = threading.Thread(target=self.remote.start_server, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(self.remote.stop_server)
+
+        deadline = time.monotonic() + 5
+        while not self.remote.is_running and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.local = make_node(self, 5000)
+        self.addCleanup(self.local.remote_pool.close_all)
+
+    def test_pooled_connection_is_reused(self):
+        account_info = self.remote.create_account("250")
+
+        self.assertEqual(self.local.get_balance(account_info), "AB 250.0")
+        self.local.deposit(account_info, "50")
+        self.assertEqual(self.local.get_balance(account_info), "AB 300.0")
+
+        stats = self.local.remote_pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 2)
+
+    def test_remote_balance_cache(self):
+        self.local.remote_balance_cache = TTLCache(max_entries=10, ttl=60)
+        account_info = self.remote.create_account("100")
+
+        self.assertEqual(self.local.get_balance(account_info), "AB 100.0")
+        self.assertEqual(self.local.get_balance(account_info), "AB 100.0")
+        self.local.withdraw(account_info, "40")
+        self.assertEqual(self.local.get_balance(account_info), "AB 60.0")
+
+        stats = self.local.remote_balance_cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+
+    def test_idempotency_key_is_forwarded(self):
+        account_info = self.remote.create_account("250")
+        key = f"proxy-{time.time_ns()}"
+
+        self.assertEqual(self.local.process_command(f"AD {account_info} 50 key={key}"), "AD AD\n")
+        # the answer was lost on the way back: a retry through another node must not deposit again
+        self.local.idempotency.entries.clear()
+        self.assertEqual(self.local.process_command(f"AD {account_info} 50 key={key}"), "AD AD\n")
+        self.assertEqual(self.local.get_balance(account_info), "AB 300.0")
+        self.assertEqual(self.remote.idempotency.stats()["replayed"], 1)
+
+    def test_failed_proxied_posting_is_not_remembered(self):
+        account_info = self.remote.create_account("10")
+        key = f"proxy-{time.time_ns()}"
+
+        self.assertEqual(self.local.process_command(f"AW {account_info} 50 key={key}"), "ER Insufficient funds\n")
+        self.assertEqual(self.local.idempotency.stats()["keys"], 0)
+        # once the cause is gone, the retry with the same key runs again
+        self.remote.deposit(account_info, "40")
+        self.assertEqual(self.local.process_command(f"AW {account_info} 50 key={key}"), "AW AW\n")
+        self.assertEqual(self.local.get_balance(account_info), "AB 0.0")
+
+    def test_cross_bank_transfer(self):
+        local_account = self.local.create_account("100")
+        remote_account = self.remote.create_account()
+
+        self.local.transfer(local_account, remote_account, "30")
+        self.assertEqual(self.local.get_balance(remote_account), "AB 30.0")
+
+        # the remote leg fails, so the local withdrawal is reversed
+        missing = f"99999/{self.remote.bank_code}"
+        with self.assertRaisesRegex(ValueError, "Account not found"):
+            self.local.transfer(local_account, missing, "50")
+        self.assertEqual(float(self.local.get_balance(local_account)), 70.0)
+        history = [json.loads(line) for line in self.local.process_command(f"AH {local_account}").splitlines()[:-1]]
+        self.assertEqual([p["transaction_type"] for p in history][-2:], ["TRANSFER_OUT", "REVERSAL"])
+
+    def test_retried_transfer_sends_new_remote_legs(self):
+        remote_account = self.remote.create_account("100")
+        local_account = self.local.create_account()
+        key = f"transfer-{time.time_ns()}"
+
+        # the remote withdrawal succeeds, the local deposit fails and the withdrawal is reversed
+        self.local.limits = DailyLimits(max_amount=10)
+        self.assertIn("Daily amount limit", self.local.process_command(f"AT {remote_account} {local_account} 30 key={key}"))
+        self.assertEqual(self.local.get_balance(remote_account), "AB 100.0")
+
+        # the retry must withdraw again instead of replaying the reversed withdrawal's answer
+        self.local.limits = DailyLimits()
+        self.assertEqual(self.local.process_command(f"AT {remote_account} {local_account} 30 key={key}"), "AT\n")
+        self.assertEqual(self.local.process_command(f"AT {remote_account} {local_account} 30 key={key}"), "AT\n")
+        self.assertEqual(self.local.get_balance(remote_account), "AB 70.0")
+        self.assertEqual(float(self.local.get_balance(local_account)), 30.0)
+
+    def test_reversed_legs_are_released_from_daily_limits(self):
+        local_account = self.local.create_account("100")
+        self.local.limits = DailyLimits(max_transactions=1)
+
+        with self.assertRaisesRegex(ValueError, "Account not found"):
+            self.local.transfer(local_account, f"99999/{self.remote.bank_code}", "30")
+        self.local.withdraw(local_account, "10")
+        self.assertEqual(float(self.local.get_balance(local_account)), 90.0)
+
+    def test_transfer_to_unreachable_bank_is_not_resent(self):
+        local_account = self.local.create_account("100")
+        dead_account = "10001/127.0.0.1:65528"
+
+        with self.assertRaisesRegex(ValueError, "Cannot connect") as error:
+            self.local.transfer(local_account, dead_account, "30")
+        self.assertNotIn("manual settlement", str(error.exception))
+        self.assertEqual(self.local.remote_pool.stats()["failed_connects"], 1)
+        self.assertEqual(float(self.local.get_balance(local_account)), 100.0)
+
+        breaker = self.local.breakers.get("127.0.0.1:65528")
+        breaker.state, breaker.opened_at = CircuitBreaker.OPEN, time.monotonic()
+        with self.assertRaisesRegex(ValueError, "unavailable"):
+            self.local.transfer(local_account, dead_account, "30")
+        self.assertEqual(self.local.remote_pool.stats()["failed_connects"], 1)
+
+    def test_unreachable_bank_opens_circuit(self):
+        dead_bank = "127.0.0.1:65528"
+        self.local.add_known_bank(dead_bank, "127.0.0.1", 65528)
+
+        for _ in range(3):
+            with self.assertRaisesRegex(ValueError, "Cannot connect"):
+                self.local.get_balance(f"10001/{dead_bank}")
+        with self.assertRaisesRegex(ValueError, "unavailable"):
+            self.local.get_balance(f"10001/{dead_bank}")
+
+        banks = {bank["bank_code"]: bank for bank in self.local.get_known_banks()}
+        self.assertEqual(banks[dead_bank]["is_active"], 0)
+        self.assertEqual(self.local.breakers.get(dead_bank).stats()["rejected"], 1)
+
+    def test_failed_probe_reopens_circuit(self):
+        account_info = self.remote.create_account("10")
+        breaker = self.local.breakers.get(self.remote.bank_code)
+        breaker.state, breaker.opened_at = CircuitBreaker.OPEN, 0.0
+
+        request = self.local.remote_pool.request
+
+        def garbled(*args, **kwargs):
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+        # the probe fails with an error other than socket.error
+        self.local.remote_pool.request = garbled
+        with self.assertRaisesRegex(ValueError, "Proxy operation failed"):
+            self.local.get_balance(account_info)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.probe_in_flight)
+
+        self.local.remote_pool.request = request
+        breaker.opened_at = 0.0
+        self.assertEqual(self.local.get_balance(account_info), "AB 10.0")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestGroupCommit(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = DataBase(os.path.join(self.directory.name, "group.db"))
+        self.db.writer = GroupCommitWriter(self.db.get_connection, batch_size=32, max_wait_ms=5)
+        self.db.writer.start()
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_postings_are_committed_in_groups(self):
+        account_number = self.db.open_account("127.0.0.1", 100)
+        failures = []
+
+        def worker():
+            for _ in range(20):
+                self.db.apply_posting(account_number, "127.0.0.1", 1, 'DEPOSIT', 'Group deposit')
+                try:
+                    self.db.apply_posting(account_number, "127.0.0.1", -1000, 'WITHDRAWAL', 'Too much')
+                except PostingError as e:
+                    failures.append(e.reason)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [PostingError.INSUFFICIENT_FUNDS] * 160)
+        with self.db.connection() as conn:
+            balance = conn.execute("SELECT balance FROM accounts WHERE account_number = ?",
+                                   (account_number,)).fetchone()[0]
+            count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        self.assertEqual(balance, 260)
+        self.assertEqual(count, 161)
+
+        stats = self.db.writer.stats()
+        self.assertEqual(stats["postings"], 321)
+        self.assertLess(stats["batches"], stats["postings"])
+
+
+class TestAccountNumberAllocator(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "numbers.db")
+        self.db = DataBase(self.path)
+        self.db.allocator.block_size = 5
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_concurrent_creation_gets_unique_numbers(self):
+        numbers = []
+
+        def worker():
+            for _ in range(10):
+                numbers.append(self.db.open_account("127.0.0.1"))
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(numbers), list(range(10001, 10061)))
+        self.assertEqual(self.db.allocator.stats()["blocks_reserved"], 12)
+
+    def test_reuse_and_restart(self):
+        first, second, third = (self.db.open_account("127.0.0.1") for _ in range(3))
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM accounts WHERE account_number = ?", (second,))
+            conn.commit()
+        self.db.allocator.release(second)
+        self.assertEqual(self.db.open_account("127.0.0.1"), second)
+
+        restarted = DataBase(self.path)
+        self.addCleanup(restarted.close)
+        # 10004 and 10005 were reserved by the first instance but never used
+        self.assertEqual(restarted.allocator.stats()["free"], 2)
+        self.assertEqual(restarted.open_account("127.0.0.1"), 10004)
+
+        # a number taken behind the allocator's back is skipped
+        self.assertEqual(self.db.open_account("127.0.0.1"), 10005)
+
+
+class TestBankAggregates(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = DataBase(os.path.join(self.directory.name, "aggregates.db"))
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_aggregates_follow_writes(self):
+        first = self.db.open_account("127.0.0.1", 100)
+        second = self.db.open_account("127.0.0.1", 50)
+        self.db.open_account("10.0.0.2")
+        self.db.apply_posting(first, "127.0.0.1", 25, 'DEPOSIT', 'Deposit')
+        self.db.apply_posting(second, "127.0.0.1", -50, 'WITHDRAWAL', 'Withdrawal')
+
+        stats = self.db.get_bank_statistics("127.0.0.1")
+        self.assertEqual(stats["total_accounts"], 2)
+        self.assertEqual(stats["active_accounts"], 2)
+        self.assertAlmostEqual(stats["total_balance"], 125)
+        self.assertAlmostEqual(stats["avg_balance"], 62.5)
+        self.assertEqual((stats["min_balance"], stats["max_balance"]), (0, 125))
+        self.assertEqual(stats["total_transactions"], 4)
+        self.assertEqual(self.db.aggregates.totals(), {"account_count": 3, "active_count": 3, "total_balance": 125})
+        self.assertEqual(self.db.aggregates.verify(), [])
+
+    def test_verify_repairs_drift(self):
+        self.db.open_account("127.0.0.1", 10)
+        with self.db.connection() as conn:
+            conn.execute("UPDATE bank_aggregates SET account_count = 7")
+            conn.commit()
+
+        mismatches = self.db.aggregates.verify(repair=True)
+        self.assertEqual(mismatches[0]["stored"]["account_count"], 7)
+        self.assertEqual(mismatches[0]["actual"]["account_count"], 1)
+        self.assertEqual(self.db.aggregates.verify(), [])
+
+    def test_verify_command(self):
+        self.db.open_account("127.0.0.1", 10)
+        with self.db.connection() as conn:
+            conn.execute("UPDATE bank_aggregates SET total_balance = 99")
+            conn.commit()
+
+        command = [sys.executable, "-m", "db.aggregates", "verify", "--db", self.db.db_path]
+        result = subprocess.run(command, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("inconsistent, run with --repair", result.stderr)
+        self.assertEqual(subprocess.run(command + ["--repair"], capture_output=True).returncode, 0)
+        self.assertEqual(self.db.aggregates.verify(), [])
+
+
+class TestBalanceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.db")
+        self.db = DataBase(self.path)
+        self.db.balances = BalanceCache(max_entries=2)
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_write_through(self):
+        account_number = self.db.open_account("127.0.0.1", 100)
+        self.db.apply_posting(account_number, "127.0.0.1", 25, 'DEPOSIT', 'Deposit')
+        self.assertEqual(self.db.get_balance(account_number, "127.0.0.1"), 125.0)
+        self.assertEqual(self.db.balances.stats()["hits"], 1)
+
+        with self.db.connection() as conn:
+            conn.execute("DELETE FROM transactions")
+            conn.execute("DELETE FROM accounts")
+            conn.commit()
+        self.db.account_removed(account_number, "127.0.0.1")
+        self.assertIsNone(self.db.get_balance(account_number, "127.0.0.1"))
+
+    def test_uncommitted_balance_is_not_served(self):
+        account_number = self.db.open_account("127.0.0.1", 100)
+        seen = []
+        post = self.db.post
+
+        def observed_post(conn, *args):
+            balance = post(conn, *args)
+            seen.append(self.db.get_balance(account_number, "127.0.0.1"))
+            return balance
+
+        self.db.post = observed_post
+        with self.assertRaises(PostingError):
+            self.db.apply_postings([(account_number, "127.0.0.1", 50, 'DEPOSIT', 'Deposit'),
+                                    (account_number, "127.0.0.1", -500, 'WITHDRAWAL', 'Withdrawal')])
+        self.assertEqual(seen, [100.0])
+        self.assertEqual(self.db.get_balance(account_number, "127.0.0.1"), 100.0)
+
+        self.db.apply_postings([(account_number, "127.0.0.1", 50, 'DEPOSIT', 'Deposit')])
+        self.assertEqual(seen, [100.0, 100.0])
+        self.assertEqual(self.db.balances.get((account_number, "127.0.0.1")), 150.0)
+
+    def test_lru_and_stale_reads(self):
+        cache = self.db.balances
+        token = cache.token()
+        cache.put(("a", 1), 10.0)
+        cache.load(("a", 1), 5.0, token)
+        self.assertEqual(cache.get(("a", 1)), 10.0)
+
+        cache.put(("b", 1), 20.0)
+        cache.get(("a", 1))
+        cache.put(("c", 1), 30.0)
+        self.assertIsNone(cache.get(("b", 1)))
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_warm_up(self):
+        numbers = [self.db.open_account("127.0.0.1", 10 * i) for i in range(1, 4)]
+        with self.db.connection() as conn:
+            conn.execute("UPDATE accounts SET updated_at = datetime('now', '-1 day') WHERE account_number = ?",
+                         (numbers[2],))
+            conn.commit()
+
+        self.db.balances = BalanceCache(max_entries=2)
+        self.db.warm_up(5)
+        self.assertEqual(sorted(self.db.balances.entries), [(numbers[0], "127.0.0.1"), (numbers[1], "127.0.0.1")])
+
+
+class TestTransactionArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = DataBase(os.path.join(self.directory.name, "archive.db"))
+        self.db.archive.segment_size = 2
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_history_reads_across_archive(self):
+        account_number = self.db.open_account("127.0.0.1", 10)
+        for amount in (1, 2, 3):
+            self.db.apply_posting(account_number, "127.0.0.1", amount, 'DEPOSIT', 'Deposit')
+        with self.db.connection() as conn:
+            conn.execute("UPDATE transactions SET timestamp = '2020-01-01 00:00:00' WHERE amount IN (10, 1, 2)")
+            conn.commit()
+
+        self.assertEqual(self.db.archive.archive_once(), 3)
+        self.assertEqual(self.db.archive.stats()["segments"], 2)
+        with self.db.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0], 1)
+
+        history = list(self.db.iter_history(account_number, "127.0.0.1", limit=10))
+        self.assertEqual([p["amount"] for p in history], [10, 1, 2, 3])
+        page = list(self.db.iter_history(account_number, "127.0.0.1", history[1]["id"], 2))
+        self.assertEqual([p["amount"] for p in page], [2, 3])
+
+        self.assertEqual(self.db.get_bank_statistics("127.0.0.1")["total_transactions"], 4)
+        self.assertEqual(self.db.aggregates.verify(), [])
+
+        reloaded = DataBase(os.path.join(self.directory.name, "archive.db"))
+        self.addCleanup(reloaded.close)
+        self.assertEqual(reloaded.archive.count("127.0.0.1"), 3)
+
+
+class TestBackupManager(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "live.db")
+        self.db = DataBase(self.path)
+        self.account_number = self.db.open_account("127.0.0.1", 100)
+        self.manager = BackupManager(self.path, os.path.join(self.directory.name, "backups"),
+                                     max_files=2, pages_per_step=1, step_sleep_ms=0)
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_backup_rotate_and_restore(self):
+        stop = threading.Event()
+
+        def writer():
+            while not stop.is_set():
+                self.db.apply_posting(self.account_number, "127.0.0.1", 1, 'DEPOSIT', 'During backup')
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            paths = [self.manager.backup() for _ in range(3)]
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertEqual(self.manager.list_backups(), paths[:0:-1])
+        stats = self.manager.stats()
+        self.assertEqual(stats["backups"], 3)
+        self.assertGreater(stats["last_pages"], 1)
+        self.assertIsNone(stats["in_progress"])
+
+        target = os.path.join(self.directory.name, "restored.db")
+        BackupManager.restore(paths[-1], target)
+        restored = DataBase(target)
+        self.addCleanup(restored.close)
+        self.assertIsNotNone(restored.get_balance(self.account_number, "127.0.0.1"))
+
+        with open(paths[-1], "r+b") as f:
+            f.seek(10)
+            f.write(b"corrupt")
+        with self.assertRaises(ValueError):
+            BackupManager.verify(paths[-1])
+
+    def test_memory_engine_is_not_backed_up(self):
+        # removed after the node's store is closed, unlike self.directory
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for option, value in (("engine", "memory"), ("memory_path", os.path.join(directory.name, "node.mem"))):
+            self.addCleanup(p2p.config.set, "database", option, p2p.config.get("database", option, fallback=""))
+            p2p.config.set("database", option, value)
+        self.addCleanup(p2p.config.set, "backup", "enable_backup", p2p.config.get("backup", "enable_backup"))
+        p2p.config.set("backup", "enable_backup", "true")
+
+        node = make_node(self, 5000)
+        self.assertIsInstance(node.accounts, MemoryAccountStore)
+        self.assertIsNone(node.backups)
+
+
+class TestBulkTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = DataBase(os.path.join(self.directory.name, "source.db"))
+        self.target = DataBase(os.path.join(self.directory.name, "target.db"))
+
+    def tearDown(self):
+        self.source.close()
+        self.target.close()
+        self.directory.cleanup()
+
+    def test_export_and_import(self):
+        numbers = [self.source.open_account("10.0.0.1", balance) for balance in (0, 10, 20.5)]
+        path = os.path.join(self.directory.name, "accounts.csv")
+        self.assertEqual(BulkTransfer(self.source).export_accounts(path)["rows"], 3)
+
+        report = BulkTransfer(self.target, batch_size=2).import_accounts(path, "10.0.0.2", keep_numbers=True)
+        self.assertEqual((report["rows"], report["rejected"]), (3, 0))
+        self.assertEqual(self.target.get_balance(numbers[2], "10.0.0.2"), 20.5)
+        self.assertEqual(self.target.get_bank_statistics("10.0.0.2")["total_transactions"], 2)
+        self.assertEqual(self.target.aggregates.verify(), [])
+
+        jsonl = os.path.join(self.directory.name, "more.jsonl")
+        with open(jsonl, "w") as f:
+            f.write('{"balance": 5}\n{"balance": -1}\nnot json\n{"balance": "abc"}\n{}\n')
+        report = BulkTransfer(self.target).import_accounts(jsonl, "10.0.0.2")
+        self.assertEqual(report["rows"], 2)
+        self.assertEqual([e["record"] for e in report["errors"]], [2, 3, 4])
+        self.assertEqual(report["errors"][0]["error"], "Initial balance cannot be negative")
+        self.assertEqual(self.target.open_account("10.0.0.2"), 10006)
+
+        with self.target.connection() as conn:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue(set(BulkTransfer.SECONDARY_INDEXES) <= indexes)
+
+
+class AccountStoreContract:
+    """Behaviour every AccountStore engine must share; subclasses provide make_store."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_accounts_and_postings(self):
+        number = self.store.open_account("10.0.0.1", 100)
+        self.assertTrue(self.store.account_exists(number, "10.0.0.1"))
+        self.assertEqual(self.store.apply_posting(number, "10.0.0.1", 50, 'DEPOSIT', 'Test'), 150.0)
+        self.assertEqual(self.store.apply_posting(number, "10.0.0.1", -150, 'WITHDRAWAL', 'Test'), 0.0)
+        self.assertEqual(self.store.get_balance(number, "10.0.0.1"), 0.0)
+        self.assertIsNone(self.store.get_balance(number + 1, "10.0.0.1"))
+
+        for amount, reason in ((-1, PostingError.INSUFFICIENT_FUNDS), (1, None)):
+            if reason:
+                with self.assertRaises(PostingError) as error:
+                    self.store.apply_posting(number, "10.0.0.1", amount, 'WITHDRAWAL', 'Test')
+                self.assertEqual(error.exception.reason, reason)
+        with self.assertRaises(PostingError) as error:
+            self.store.apply_posting(number + 1, "10.0.0.1", 1, 'DEPOSIT', 'Test')
+        self.assertEqual(error.exception.reason, PostingError.NOT_FOUND)
+
+        history = list(self.store.iter_history(number, "10.0.0.1"))
+        self.assertEqual([(p['transaction_type'], p['amount']) for p in history],
+                         [('INITIAL_DEPOSIT', 100.0), ('DEPOSIT', 50.0), ('WITHDRAWAL', 150.0)])
+        page = list(self.store.iter_history(number, "10.0.0.1", after_id=history[0]['id'], limit=1))
+        self.assertEqual(page[0]['id'], history[1]['id'])
+
+        other = self.store.open_account("10.0.0.1", 5)
+        self.assertEqual([a.account_number for a in self.store.iter_accounts(after=number)], [other])
+        self.assertEqual(self.store.totals(), {'account_count': 2, 'active_count': 2, 'total_balance': 5.0})
+        stats = self.store.account_statistics("10.0.0.1")
+        self.assertEqual((stats['total_accounts'], stats['total_transactions'], stats['max_balance']), (2, 4, 5.0))
+
+    def test_apply_postings(self):
+        first, second = self.store.open_account("10.0.0.1", 10), self.store.open_account("10.0.0.1")
+        self.assertEqual(self.store.apply_postings([(first, "10.0.0.1", -10, 'TRANSFER_OUT', 'Test'),
+                                                   (second, "10.0.0.1", 10, 'TRANSFER_IN', 'Test')]), [0.0, 10.0])
+        with self.assertRaises(PostingError) as error:
+            self.store.apply_postings([(second, "10.0.0.1", -5, 'WITHDRAWAL', 'Test'),
+                                       (first, "10.0.0.1", 5, 'DEPOSIT', 'Test'),
+                                       (second, "10.0.0.1", -6, 'WITHDRAWAL', 'Test')])
+        self.assertEqual((error.exception.reason, error.exception.leg), (PostingError.INSUFFICIENT_FUNDS, 2))
+        self.assertEqual((self.store.get_balance(first, "10.0.0.1"), self.store.get_balance(second, "10.0.0.1")),
+                         (0.0, 10.0))
+        self.assertEqual(self.store.account_statistics("10.0.0.1")['total_transactions'], 3)
+
+    def test_remove_account(self):
+        number = self.store.open_account("10.0.0.1", 10)
+        with self.assertRaises(PostingError) as error:
+            self.store.remove_account(number, "10.0.0.1")
+        self.assertEqual(error.exception.reason, PostingError.HAS_FUNDS)
+        self.store.apply_posting(number, "10.0.0.1", -10, 'WITHDRAWAL', 'Test')
+        self.store.remove_account(number, "10.0.0.1")
+        with self.assertRaises(PostingError) as error:
+            self.store.remove_account(number, "10.0.0.1")
+        self.assertEqual(error.exception.reason, PostingError.NOT_FOUND)
+        with self.assertRaises(PostingError) as error:
+            self.store.apply_posting(number, "10.0.0.1", 5, 'DEPOSIT', 'Test')
+        self.assertEqual(error.exception.reason, PostingError.INACTIVE)
+        self.assertIsNone(self.store.get_balance(number, "10.0.0.1"))
+        self.assertEqual(self.store.totals(), {'account_count': 1, 'active_count': 0, 'total_balance': 0.0})
+
+        # the closed account keeps its postings and its number
+        self.assertTrue(self.store.account_exists(number, "10.0.0.1"))
+        self.assertEqual([p['transaction_type'] for p in self.store.iter_history(number, "10.0.0.1")],
+                         ['INITIAL_DEPOSIT', 'WITHDRAWAL'])
+        self.assertNotEqual(self.store.open_account("10.0.0.1"), number)
+
+    def test_concurrent_postings(self):
+        number = self.store.open_account("10.0.0.1", 100)
+
+        def withdraw():
+            for _ in range(20):
+                try:
+                    self.store.apply_posting(number, "10.0.0.1", -1, 'WITHDRAWAL', 'Test')
+                except PostingError:
+                    pass
+
+        threads = [threading.Thread(target=withdraw) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.store.get_balance(number, "10.0.0.1"), 0.0)
+        self.assertEqual(self.store.account_statistics("10.0.0.1")['total_transactions'], 101)
+
+
+class TestSqliteAccountStore(AccountStoreContract, unittest.TestCase):
+
+    def make_store(self):
+        return DataBase(os.path.join(self.directory.name, "store.db"))
+
+
+class TestMemoryAccountStore(AccountStoreContract, unittest.TestCase):
+
+    def make_store(self, snapshot_every=10000):
+        return MemoryAccountStore(os.path.join(self.directory.name, "store.mem"), snapshot_every, fsync=False)
+
+    def test_restart_replays_snapshot_and_journal(self):
+        self.store.close()
+        self.store = self.make_store(snapshot_every=3)
+        numbers = [self.store.open_account("10.0.0.1", 10) for _ in range(4)]
+        self.store.apply_posting(numbers[0], "10.0.0.1", 5, 'DEPOSIT', 'Test')
+        self.store.apply_posting(numbers[1], "10.0.0.1", -10, 'WITHDRAWAL', 'Test')
+        self.store.remove_account(numbers[1], "10.0.0.1")
+        self.assertEqual(self.store.snapshots, 2)
+        # each snapshot writes only the postings made since the previous one and drops them from memory
+        for segment in self.store.segments:
+            with open(os.path.join(self.directory.name, segment["file"])) as f:
+                self.assertEqual(len(f.readlines()), segment["count"])
+        self.assertEqual([segment["count"] for segment in self.store.segments], [3, 3])
+        self.assertEqual(self.store.storage_stats()["memory_store"]["postings_in_memory"], 0)
+        self.store.journal.close()
+
+        # a crash in the middle of a journal write leaves a torn last line
+        with open(self.store.journal_path, "ab") as f:
+            f.write(b'{"op":"post","n":')
+        self.store = self.make_store()
+        self.assertEqual(self.store.get_balance(numbers[0], "10.0.0.1"), 15.0)
+        self.assertIsNone(self.store.get_balance(numbers[1], "10.0.0.1"))
+        self.assertEqual(self.store.totals(), {'account_count': 4, 'active_count': 3, 'total_balance': 35.0})
+        self.assertEqual(len(list(self.store.iter_history(numbers[0], "10.0.0.1"))), 2)
+        self.assertEqual(len(list(self.store.iter_history(numbers[1], "10.0.0.1"))), 2)
+        self.assertEqual(self.store.open_account("10.0.0.1"), numbers[3] + 1)
+
+        # the history continues from the segments into the postings still in memory
+        self.store.apply_posting(numbers[0], "10.0.0.1", 1, 'DEPOSIT', 'Test')
+        history = list(self.store.iter_history(numbers[0], "10.0.0.1"))
+        self.assertEqual([p['amount'] for p in history], [10.0, 5.0, 1.0])
+        page = list(self.store.iter_history(numbers[0], "10.0.0.1", after_id=history[0]['id'], limit=1))
+        self.assertEqual(page, history[1:2])
+        since = list(self.store.iter_postings_since("2000-01-01 00:00:00", ('DEPOSIT', 'WITHDRAWAL')))
+        self.assertEqual([amount for _, _, amount, _ in since], [5.0, 10.0, 1.0])
+        stats = self.store.account_statistics("10.0.0.1")
+        self.assertEqual((stats['min_balance'], stats['max_balance'], stats['total_transactions']), (0.0, 16.0, 7))
+
+    def test_failed_journal_write_is_not_applied(self):
+        number = self.store.open_account("10.0.0.1", 10)
+        journal = self.store.journal
+        real_file = journal.file
+
+        class FailingFile:
+            def write(self, data):
+                real_file.write(bytes(data[:5]))
+                raise OSError("disk full")
+
+            def __getattr__(self, name):
+                return getattr(real_file, name)
+
+        journal.file = FailingFile()
+        with self.assertRaises(sqlite3.OperationalError):
+            self.store.apply_posting(number, "10.0.0.1", 5, 'DEPOSIT', 'Test')
+        self.assertEqual(self.store.get_balance(number, "10.0.0.1"), 10.0)
+        self.assertEqual(journal.stats()['failures'], 1)
+
+        # the error is not sticky: the next write goes through
+        journal.file = real_file
+        self.assertEqual(self.store.apply_posting(number, "10.0.0.1", 7, 'DEPOSIT', 'Test'), 17.0)
+        self.assertEqual(len(list(self.store.iter_history(number, "10.0.0.1"))), 2)
+
+        self.store.journal.close()
+        self.store = self.make_store()
+        self.assertEqual(self.store.get_balance(number, "10.0.0.1"), 17.0)
+
+
+class TestAccountLocks(unittest.TestCase):
+
+    def test_same_account_is_serialized(self):
+        locks = AccountLocks(stripes=4)
+        inside, overlaps = [0], []
+
+        def work():
+            for _ in range(50):
+                with locks.hold(10001, "10.0.0.1"):
+                    inside[0] += 1
+                    overlaps.append(inside[0])
+                    time.sleep(0.0001)
+                    inside[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(overlaps), 1)
+        stats = locks.stats()
+        self.assertEqual(stats["acquisitions"], 200)
+        self.assertGreater(stats["contended"], 0)
+
+    def test_busy_retry(self):
+        retry = BusyRetry(attempts=3, base_delay_ms=1)
+        failures = [2]
+
+        def work():
+            if failures[0]:
+                failures[0] -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return "done"
+
+        self.assertEqual(retry.run(work), "done")
+        with self.assertRaises(sqlite3.OperationalError):
+            retry.run(lambda: (_ for _ in ()).throw(sqlite3.OperationalError("database is locked")))
+        with self.assertRaises(sqlite3.OperationalError):
+            retry.run(lambda: (_ for _ in ()).throw(sqlite3.OperationalError("no such table: x")))
+        self.assertEqual(retry.stats(), {'retries': 5, 'recovered': 1, 'exhausted': 1})
+
+    def test_posting_waits_for_locked_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        db = DataBase(os.path.join(directory.name, "locked.db"))
+        self.addCleanup(db.close)
+        number = db.open_account("10.0.0.1", 10)
+        db.busy_retry.base_delay = 0.05
+
+        blocker = sqlite3.connect(db.db_path, isolation_level=None, check_same_thread=False)
+        blocker.execute("PRAGMA busy_timeout = 0")
+        blocker.execute("BEGIN EXCLUSIVE")
+        with db.connection() as conn:
+            conn.execute("PRAGMA busy_timeout = 0")
+        threading.Timer(0.1, blocker.execute, ("COMMIT",)).start()
+
+        self.assertEqual(db.apply_posting(number, "10.0.0.1", 5, 'DEPOSIT', 'Test'), 15.0)
+        self.assertGreater(db.busy_retry.stats()["retries"], 0)
+        blocker.close()
+
+
+class TestBankAccount(unittest.TestCase):
+
+    def test_row_factory_and_serialization(self):
+        conn = sqlite3.connect(":memory:")
+        self.addCleanup(conn.close)
+        cursor = conn.cursor()
+        cursor.row_factory = BankAccount.from_row
+        account = cursor.execute(f"SELECT {BankAccount.SELECT} FROM (SELECT 10001 AS account_number, "
+                                 "'10.0.0.1' AS bank_code, 12.5 AS balance, 1 AS is_active, "
+                                 "'2026-01-01 10:00:00' AS created_at, NULL AS updated_at)").fetchone()
+
+        self.assertFalse(hasattr(account, "__dict__"))
+        self.assertEqual(json.loads(account.to_json()), account.to_dict())
+        self.assertEqual(account.updated_at, "2026-01-01 10:00:00")
+        self.assertEqual(json.loads(BankAccount(10002, 'b"\\').to_json())["bank_code"], 'b"\\')
+        self.assertEqual(len({account, BankAccount(*account.to_dict().values())}), 1)
+
+        # comparing records does not fill in their unset timestamps
+        first, second = BankAccount(10003, "10.0.0.1"), BankAccount(10003, "10.0.0.1")
+        self.assertEqual(first, second)
+        self.assertIsNone(first._created_at)
+        self.assertNotEqual(first, BankAccount(10003, "10.0.0.1", 5.0))
+
+        for balance in (float("inf"), float("nan")):
+            with self.assertRaises(ValueError):
+                BankAccount(10004, "10.0.0.1", balance).to_json()
+
+
+class TestLogging(unittest.TestCase):
+
+    def test_setup_is_idempotent(self):
+        from core import logger as core_logger
+        handlers = [h for h in logging.getLogger().handlers if isinstance(h, core_logger.DroppingQueueHandler)]
+        core_logger.setup_core_logging()
+        self.assertEqual([h for h in logging.getLogger().handlers
+                          if isinstance(h, core_logger.DroppingQueueHandler)], handlers)
+        self.assertEqual(len(handlers), 1)
+
+    def test_rotation_compresses_old_files(self):
+        from core.logger import CompressingRotatingFileHandler
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "bank_core.log")
+        handler = CompressingRotatingFileHandler(path, max_bytes=200, backup_count=2)
+        self.addCleanup(handler.close)
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "x" * 60, None, None)
+
+        for _ in range(20):
+            handler.emit(record)
+        self.assertEqual(sorted(os.listdir(directory.name)), ["bank_core.log", "bank_core.log.1.gz", "bank_core.log.2.gz"])
+        with gzip.open(path + ".1.gz", "rt") as f:
+            self.assertIn("x" * 60, f.read())
+
+        # the first record of a new day starts a new file
+        handler.day = handler.day.replace(year=2000)
+        handler.emit(record)
+        with open(path) as f:
+            self.assertEqual(f.read().count("x" * 60), 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_half_open_closed(self):
+        transitions = []
+        breaker = CircuitBreaker("bank", failure_rate=0.5, window_size=4, min_calls=2, open_seconds=0.1,
+                                 on_state_change=lambda name, old, new: transitions.append(new))
+
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(transitions, ["open", "half-open", "open", "half-open", "closed"])
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_are_coalesced(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow_lookup():
+            calls.append(1)
+            release.wait(5)
+            return "AB 10.0"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do("key", slow_lookup))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while flights.stats()["coalesced"] < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["AB 10.0"] * 5)
+
+
+class TestLineBuffer(unittest.TestCase):
+
+    def test_split_and_pipelined_commands(self):
+        lines = LineBuffer()
+        self.assertEqual(lines.feed(b"AB 10001/"), [])
+        self.assertEqual(lines.feed(b"127.0.0.1\r\n\nBC\nBN"), ["AB 10001/127.0.0.1", "BC"])
+        self.assertEqual(lines.feed(b"\n"), ["BN"])
+        self.assertEqual(lines.flush(), [])
+
+    def test_command_too_long(self):
+        lines = LineBuffer(max_line_length=8)
+        with self.assertRaises(ValueError):
+            lines.feed(b"AD 10001/127.0.0.1")
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file